@@ -0,0 +1,216 @@
+"""
+Asyncio version of HTTPClient.
+
+Independent requests are issued concurrently on one keep-alive connection pool, and
+the client can share its event loop with the glove (see GloveSerialListener.attach).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import asyncio
+import base64
+import time
+from uuid import uuid4
+
+import aiohttp
+
+from metrics import LatencyHistogram
+from vehicle_api import (DEFAULT_TIMEOUT, ENDPOINT_TIMEOUTS, FAULT_OVERRIDE_OFF, PHONE_COMMS_FAULTS,
+                         PilotRefused, api_version_at_least, authentication_request,
+                         custom_comms_request, endpoint_name, pilot_status_request, udp_link_address)
+
+
+class AsyncHTTPClient(object):
+    """
+    Asyncio HTTP client for communicating with a Skydio drone.
+
+    Create it with `await AsyncHTTPClient.connect(...)`, which authenticates, and close it
+    with `await client.close()`.
+
+    Args:
+        baseurl (str): The url of the vehicle.
+
+        client_id (str): A unique id for this remote user. Defaults to a new uuid.
+
+        stream_settings (dict): Configuration for receiving an RTP video stream.
+
+        timeouts (dict): Per-endpoint overrides of ENDPOINT_TIMEOUTS, in seconds.
+
+        pool_size (int): Maximum number of concurrent connections to the vehicle.
+    """
+
+    def __init__(self, baseurl, client_id=None, stream_settings=None, timeouts=None, pool_size=8):
+        self.client_id = client_id or str(uuid4())
+        self.baseurl = baseurl
+        self.access_token = None
+        self.session_id = None
+        self.access_level = None
+        self.stream_settings = stream_settings
+        self.timeouts = dict(ENDPOINT_TIMEOUTS, **(timeouts or {}))
+        self.latency = {}
+        self._config = None
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size),
+            headers={'Accept': 'application/json'})
+
+    @classmethod
+    async def connect(cls, baseurl, pilot=False, token=None, **kwargs):
+        """ Create a client and authenticate. Raises RuntimeError if pilot access is refused. """
+        client = cls(baseurl, **kwargs)
+        try:
+            await client.authenticate(pilot, token)
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    async def close(self):
+        await self.session.close()
+
+    async def authenticate(self, pilot=False, token=None):
+        """ Request an access token from the vehicle. If using a sim, a token is required. """
+        request = authentication_request(self.client_id, pilot, token)
+        response = await self.request_json('authentication', request)
+        self.access_level = response.get('accessLevel')
+        if pilot and self.access_level != 'PILOT':
+            raise PilotRefused('Did not successfully auth as pilot')
+        self.access_token = response.get('accessToken')
+        self.session.headers['Authorization'] = 'Bearer {}'.format(self.access_token)
+
+    async def request_json(self, endpoint, json_data=None, timeout=None):
+        """ Send a GET or POST request to the vehicle and get a parsed JSON response.
+
+        Args:
+            endpoint (str): the path to request.
+            json_data (dict): an optional JSON dictionary to send.
+            timeout (float): number of seconds to wait for a response.
+                Defaults to the timeout configured for the endpoint.
+
+        Raises:
+            aiohttp.ClientResponseError: if the server responds with 4XX or 5XX status code
+            asyncio.TimeoutError: if the vehicle does not answer in time.
+
+        Returns:
+            dict: the servers JSON response
+        """
+        url = '{}/api/{}'.format(self.baseurl, endpoint)
+        name = endpoint_name(endpoint)
+        if timeout is None:
+            timeout = self.timeouts.get(name, DEFAULT_TIMEOUT)
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+        start = time.time()
+        if json_data is not None:
+            request = self.session.post(url, json=json_data, timeout=client_timeout)
+        else:
+            request = self.session.get(url, timeout=client_timeout)
+        async with request as res:
+            res.raise_for_status()
+            if res.content_type == 'application/json':
+                reply = (await res.json())['data']
+            else:
+                reply = await res.read()
+        self.endpoint_latency(name).record(time.time() - start)
+        return reply
+
+    def endpoint_latency(self, name):
+        """ Return the round trip LatencyHistogram for an endpoint. """
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency.setdefault(name, LatencyHistogram(name))
+        return histogram
+
+    def latency_report(self):
+        return '\n'.join(self.latency[name].format() for name in sorted(self.latency))
+
+    async def send_custom_comms(self, skill_key, data, no_response=False):
+        """
+        Send custom bytes to the vehicle and optionally return a response
+
+        Returns:
+            dict: a dict with metadata for the response and a 'data' field, encoded by the Skill.
+        """
+        rpc_response = await self.request_json('custom_comms',
+                                               custom_comms_request(skill_key, data, no_response))
+        if rpc_response and 'data' in rpc_response:
+            rpc_response['data'] = base64.b64decode(rpc_response['data'])
+        return rpc_response
+
+    async def update_pilot_status(self):
+        """ Ping the vehicle to keep session alive and get status back. """
+        args = pilot_status_request(self.session_id, self.stream_settings)
+        response = await self.request_json('status', args)
+        self.session_id = response['sessionId']
+        self._config = response.get('config', self._config)
+        return response
+
+    async def keep_alive(self, period=2.0):
+        """ Periodically poll the status endpoint to stay the active pilot. Run as a task. """
+        while True:
+            await self.update_pilot_status()
+            await asyncio.sleep(period)
+
+    async def get_config(self, refresh=False):
+        """ Return the vehicle config, reusing the one from the last status response. """
+        if self._config is None or refresh:
+            self._config = (await self.request_json('status'))['config']
+        return self._config
+
+    async def check_min_api_version(self, major=18.0, minor=5.0):
+        return api_version_at_least(await self.get_config(), major, minor)
+
+    async def get_udp_link_address(self):
+        """ Get the dynamic port and hostname for the udp link. """
+        return udp_link_address(await self.get_config(), self.baseurl)
+
+    async def get_blocking_faults(self):
+        faults = (await self.request_json('active_faults')).get('faults', {})
+        return [f['name'] for f in faults.values() if f['relevant']]
+
+    async def disable_faults(self):
+        """ Tell the vehicle to ignore missing phone info. All overrides are sent at once. """
+        await asyncio.gather(*[
+            self.request_json('set_fault_override/{}'.format(fault_id), FAULT_OVERRIDE_OFF)
+            for fault_id in PHONE_COMMS_FAULTS.values()
+        ])
+
+    async def async_command(self, command):
+        return await self.request_json('async_command', {'command': command})
+
+    async def takeoff(self, poll_period=5.0):
+        """ Request takeoff and wait until flying. Cancel the task to stop waiting. """
+        if self.access_level != 'PILOT':
+            raise RuntimeError('Cannot takeoff: not pilot')
+        await asyncio.gather(self.update_pilot_status(), self.disable_faults())
+        while True:
+            phase = (await self.update_pilot_status()).get('flightPhase')
+            if phase == 'READY_FOR_GROUND_TAKEOFF':
+                await self.async_command('ground_takeoff')
+            elif phase == 'FLYING':
+                return
+            await asyncio.sleep(poll_period)
+
+    async def land(self, poll_period=1.0):
+        """ Land the vehicle and wait until it is no longer flying. """
+        if self.access_level != 'PILOT':
+            raise RuntimeError('Cannot land: not pilot')
+        phase = 'FLYING'
+        while phase == 'FLYING':
+            await self.async_command('land')
+            await asyncio.sleep(poll_period)
+            phase = (await self.update_pilot_status()).get('flightPhase') or phase
+
+    async def set_skill(self, skill_key):
+        """ Request a specific skill to be active. """
+        if self.access_level != 'PILOT':
+            raise RuntimeError('Cannot switch skills: not pilot')
+        await self.request_json('set_skill/{}'.format(skill_key), {'args': {}})
+
+    async def set_run_mode(self, mode_name, set_default=False):
+        action = 'SET_DEFAULT' if set_default else 'TERMINATE_AND_START'
+        return await self.request_json('runmode', {
+            'run_mode_name': mode_name,
+            'action': action,
+        })
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Compare custom_comms throughput of one request per message against CustomCommsBatcher.
+
+Usage:
+    python benchmarks/bench_custom_comms.py [--messages N] [--producers N] [--latency S]
+
+Several producer threads send RemoteControl move messages to fake_vehicle.FakeVehicle,
+which answers batches the way RemoteControl.handle_batch does. Each path is measured
+with responses (the caller waits for the skill's answer) and with no_response.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comms_batch import BATCH_MAGIC, CustomCommsBatcher, pack_batch, unpack_batch
+from fake_vehicle import FakeVehicle
+from http_client import HTTPClient
+from metrics import LatencyHistogram
+
+SKILL_KEY = 'remote.RemoteControl'
+
+
+def handle_rpc(skill_key, data):
+    """ Answer like the skill: one response per message, batches with a batch. """
+    if data[:2] == BATCH_MAGIC:
+        return pack_batch([handle_rpc(skill_key, message) for message in unpack_batch(data)])
+    json.loads(data.decode('utf-8'))
+    return b'{"ok": true}'
+
+
+def move_message(index):
+    return json.dumps({'move': [0.5, 0.0, 0.1 * (index % 10), 0.0, 0.0]}).encode('utf-8')
+
+
+def run_producers(producers, messages, send):
+    """ Call send(index) from each producer thread. Returns the elapsed time. """
+    per_producer = messages // producers
+    threads = [threading.Thread(target=lambda first=first: [send(index) for index in
+                                                          range(first, first + per_producer)])
+               for first in range(0, per_producer * producers, per_producer)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - start
+
+
+def bench_per_call(client, producers, messages, no_response):
+    latency = LatencyHistogram('per call')
+
+    def send(index):
+        start = time.monotonic()
+        reply = client.send_custom_comms(SKILL_KEY, move_message(index), no_response=no_response)
+        assert reply is not None
+        latency.record(time.monotonic() - start)
+
+    return run_producers(producers, messages, send), latency, None
+
+
+def bench_batched(client, producers, messages, no_response, max_delay):
+    latency = LatencyHistogram('batched')
+    batcher = CustomCommsBatcher(client, SKILL_KEY, max_delay=max_delay).start()
+    futures = []
+
+    def send(index):
+        start = time.monotonic()
+        future = batcher.send(move_message(index), no_response=no_response)
+        future.add_done_callback(lambda _: latency.record(time.monotonic() - start))
+        futures.append(future)
+
+    elapsed = run_producers(producers, messages, lambda index: send(index))
+    start = time.monotonic()
+    for future in futures:
+        future.result()
+    elapsed += time.monotonic() - start
+    batcher.stop()
+    return elapsed, latency, batcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000, help='messages per run')
+    parser.add_argument('--producers', type=int, default=4, help='threads sending messages')
+    parser.add_argument('--latency', type=float, default=0.005, help='vehicle response latency in seconds')
+    parser.add_argument('--max-delay', type=float, default=0.005, help='batching window in seconds')
+    args = parser.parse_args()
+
+    vehicle = FakeVehicle(comms_handler=handle_rpc, latency=args.latency).start()
+    sys.stdout, stdout = open(os.devnull, 'w'), sys.stdout
+    try:
+        client = HTTPClient(vehicle.url, pilot=True)
+    finally:
+        sys.stdout = stdout
+
+    print('{} messages from {} producers, vehicle latency {:.0f}ms'.format(
+        args.messages, args.producers, 1000 * args.latency))
+    for no_response in (False, True):
+        for name in ('per call', 'batched'):
+            requests_before = vehicle.requests['custom_comms']
+            if name == 'per call':
+                elapsed, latency, batcher = bench_per_call(client, args.producers, args.messages,
+                                                           no_response)
+            else:
+                elapsed, latency, batcher = bench_batched(client, args.producers, args.messages,
+                                                          no_response, args.max_delay)
+            requests = vehicle.requests['custom_comms'] - requests_before
+            print('{:<9} {:<12} {:>8.0f} messages/s {:>6} requests'.format(
+                name, 'no_response' if no_response else 'response', args.messages / elapsed, requests))
+            print('          ' + latency.format())
+            if batcher:
+                print('          ' + batcher.report().replace('\n', '\n          '))
+    vehicle.stop()
+
+
+if __name__ == '__main__':
+    main()
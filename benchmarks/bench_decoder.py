@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Compare the legacy byte-at-a-time glove parser with glove.FrameDecoder.
+
+Usage:
+    python benchmarks/bench_decoder.py [recording.bin] [--chunk-size N] [--drop-rate P]
+
+Without a recording a synthetic stream of alternating finger and IMU frames is used.
+With --drop-rate, bytes are deleted at random first, like a lossy RFCOMM link, and the
+decoder's valid, corrupt and resync counts are reported.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import FrameDecoder, FRAME_ID_IMU, FRAME_ID_SENSOR, FRAME_START, FRAME_END
+
+
+def synthetic_stream(num_frames, seed=0):
+    """ Build a byte stream that looks like a glove in bluetooth mode. """
+    rng = random.Random(seed)
+    out = bytearray()
+    for i in range(num_frames):
+        if i % 2:
+            payload = [rng.randint(0, 127) for _ in range(12)]
+            out += bytearray([FRAME_START, FRAME_ID_IMU, 12] + payload + [FRAME_END])
+        else:
+            payload = [rng.randint(0, 127) for _ in range(11)]
+            out += bytearray([FRAME_START, FRAME_ID_SENSOR, 11] + payload + [FRAME_END])
+    return bytes(out)
+
+
+def drop_bytes(stream, rate, seed=0):
+    """ Delete each byte with probability `rate`. """
+    rng = random.Random(seed)
+    return bytes(bytearray(b for b in bytearray(stream) if rng.random() >= rate))
+
+
+class LegacyParser(object):
+    """ The original GloveSerialListener.parse loop, kept here as the baseline. """
+
+    def __init__(self):
+        self.data = []
+        self.frames = 0
+
+    def parse(self, byte_to_parse):
+        b = int.from_bytes(byte_to_parse, byteorder='big')
+        if b == 240:
+            self.data = []
+        elif b == 247:
+            self.data.append(b)
+            self.frames += 1
+        else:
+            self.data.append(b)
+
+
+def run_legacy(stream):
+    source = io.BytesIO(stream)
+    parser = LegacyParser()
+    while True:
+        b = source.read(1)
+        if not b:
+            break
+        parser.parse(b)
+    return parser.frames
+
+
+def run_decoder(stream, chunk_size, decoder):
+    source = io.BytesIO(stream)
+    frames = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        frames += len(decoder.feed(chunk))
+    return frames
+
+
+def measure(name, func, *args):
+    wall = time.time()
+    cpu = time.process_time()
+    frames = func(*args)
+    cpu = time.process_time() - cpu
+    wall = time.time() - wall
+    print('{:<10} {:>9} frames {:>12.0f} frames/s {:>8.2f} us cpu/frame'.format(
+        name, frames, frames / wall, 1e6 * cpu / frames))
+    return cpu / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('recording', nargs='?', help='raw byte stream captured from the glove')
+    parser.add_argument('--chunk-size', type=int, default=64, help='bytes per serial read')
+    parser.add_argument('--frames', type=int, default=200000, help='synthetic stream length')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='fraction of bytes to lose')
+    args = parser.parse_args()
+
+    if args.recording:
+        with open(args.recording, 'rb') as recording:
+            stream = recording.read()
+    else:
+        stream = synthetic_stream(args.frames)
+    if args.drop_rate:
+        stream = drop_bytes(stream, args.drop_rate)
+    print('{} bytes, chunk size {}'.format(len(stream), args.chunk_size))
+
+    legacy = measure('legacy', run_legacy, stream)
+    decoder = FrameDecoder()
+    decoder_cpu = measure('decoder', run_decoder, stream, args.chunk_size, decoder)
+    print('speedup {:.1f}x cpu per frame'.format(legacy / decoder_cpu))
+    print('decoder: valid={} corrupt={} resyncs={}'.format(decoder.valid, decoder.corrupt, decoder.resyncs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Compare the old per-byte image conversion with imaging.decode_image on synthetic frames.
+
+Usage:
+    python benchmarks/bench_image_decode.py [--width W] [--height H] [--repeat N]
+
+UYVY conversion needs opencv; without it only RGB frames are measured.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from imaging import (BYTES_PER_PIXEL, PIXELFORMAT_RGB, PIXELFORMAT_YUV, decode_image,
+                     read_into)
+
+
+def legacy_decode(image_data, width, height, bytes_per_pixel):
+    """ The conversion save_image used to do, adapted so it runs on Python 3 bytes. """
+    num_bytes = width * height * bytes_per_pixel
+    input_array = np.array([np.uint8(c) for c in image_data[:num_bytes]])
+    input_array.shape = (height, width, bytes_per_pixel)
+    return input_array
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return 1000 * (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--legacy-rows', type=int, default=32,
+                        help='rows converted by the slow legacy path, scaled up to a full frame')
+    args = parser.parse_args()
+
+    try:
+        import cv2  # noqa: F401
+        formats = [('rgb', PIXELFORMAT_RGB), ('uyvy', PIXELFORMAT_YUV)]
+    except ImportError:
+        print('opencv not available, skipping UYVY')
+        formats = [('rgb', PIXELFORMAT_RGB)]
+
+    rng = np.random.RandomState(0)
+    for name, pixfmt in formats:
+        bytes_per_pixel = BYTES_PER_PIXEL[pixfmt]
+        num_bytes = args.width * args.height * bytes_per_pixel
+        raw = rng.randint(0, 256, size=num_bytes).astype(np.uint8).tobytes()
+
+        legacy_ms = timed(legacy_decode, raw, args.width, args.legacy_rows, bytes_per_pixel)
+        legacy_ms *= float(args.height) / args.legacy_rows
+
+        buf = bytearray(num_bytes)
+        read_ms = []
+        decode_ms = []
+        for _ in range(args.repeat):
+            read_ms.append(timed(read_into, io.BytesIO(raw), buf, num_bytes))
+            decode_ms.append(timed(decode_image, buf, args.width, args.height, pixfmt))
+
+        print('{} {}x{} ({} bytes)'.format(name, args.width, args.height, num_bytes))
+        print('  legacy conversion   {:10.1f} ms (extrapolated)'.format(legacy_ms))
+        print('  read into buffer    {:10.2f} ms median'.format(np.median(read_ms)))
+        print('  frombuffer decode   {:10.2f} ms median'.format(np.median(decode_ms)))
+        print('  speedup             {:10.0f}x'.format(legacy_ms / np.median(decode_ms)))
+
+
+if __name__ == '__main__':
+    main()
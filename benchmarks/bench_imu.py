@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Measure IMU decoding throughput of imu.OrientationStream.
+
+Usage:
+    python benchmarks/bench_imu.py [--frames N] [--batch N]
+
+Frames are fed in batches the size of a typical serial read, as the listener delivers them.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import FRAME_ID_IMU
+from imu import OrientationStream, encode_quaternions
+
+
+def synthetic_frames(num_frames, rate=100.0, seed=0):
+    """ IMU frames of a hand turning at a random, slowly changing angular rate. """
+    rng = np.random.RandomState(seed)
+    angles = np.cumsum(rng.normal(0, 0.02, size=(num_frames, 3)), axis=0) / rate
+    half = angles / 2
+    quaternions = np.concatenate([np.cos(np.linalg.norm(half, axis=1, keepdims=True)),
+                                  np.sin(half)], axis=1)
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    header = bytes(bytearray([FRAME_ID_IMU, 12]))
+    return [header + payload.tobytes() for payload in encode_quaternions(quaternions)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=200000, help='number of frames to decode')
+    parser.add_argument('--batch', type=int, default=4, help='frames per update')
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.frames)
+    stream = OrientationStream()
+    start = time.time()
+    cpu = time.process_time()
+    for index in range(0, len(frames), args.batch):
+        stream.update(frames[index:index + args.batch], [index * 0.01] * args.batch)
+    elapsed = time.time() - start
+    cpu = time.process_time() - cpu
+
+    print('{} frames in batches of {}: {:.3f}s, {:.0f} frames/s'.format(
+        args.frames, args.batch, elapsed, args.frames / elapsed))
+    print('cpu per frame: {:.1f}us, {:.2%} of a core at 100 Hz'.format(
+        1e6 * cpu / args.frames, 100 * cpu / args.frames))
+    print('latest roll/pitch/yaw (deg):', np.round(np.degrees(stream.latest()[2]), 2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Measure what the metrics cost: updates on the hot path and snapshots for the exporters.
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations N] [--sessions N]
+
+Snapshots are taken of a registry holding the collectors of `--sessions` glove
+listeners, gesture loops and HTTP clients, as session_manager.py registers them.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_vehicle import FakeVehicle
+from gestures import GestureLoop
+from glove import GloveSerialListener, FRAME_ID_SENSOR
+from glove_emulator import finger_frame
+from http_client import HTTPClient
+from metrics import MetricsRegistry
+
+
+class IdlePort(object):
+    """ Stands in for an open serial port that never has data. """
+    is_open = True
+
+
+def per_call(statement, iterations, **namespace):
+    return timeit.timeit(statement, globals=namespace, number=iterations) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000, help='updates to time')
+    parser.add_argument('--sessions', type=int, default=4, help='sessions in the registry')
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter('frames_total')
+    histogram = registry.histogram('latency_seconds')
+    print('counter.inc():      {:.0f}ns'.format(1e9 * per_call('counter.inc()', args.iterations,
+                                                                counter=counter)))
+    print('histogram.record(): {:.0f}ns'.format(1e9 * per_call('histogram.record(0.0004)', args.iterations,
+                                                                histogram=histogram)))
+
+    vehicle = FakeVehicle().start()
+    sys.stdout, stdout = open(os.devnull, 'w'), sys.stdout
+    try:
+        for index in range(args.sessions):
+            labels = {'session': 'glove{}'.format(index)}
+            client = HTTPClient(vehicle.url, pilot=True)
+            client.get_status()
+            client.set_skill('pano')
+            client.register_metrics(registry, **labels)
+            listener = GloveSerialListener(None, device=IdlePort())
+            listener.register_metrics(registry, device='/dev/rfcomm{}'.format(index), **labels)
+            gesture_loop = GestureLoop(listener.rings[FRAME_ID_SENSOR], lambda pose: None)
+            gesture_loop.register_metrics(registry, **labels)
+            listener.handle_frames([finger_frame('fist')[1:-1]] * 10)
+            gesture_loop.poll()
+    finally:
+        sys.stdout = stdout
+    vehicle.stop()
+
+    snapshots = max(1, args.iterations // 1000)
+    start = time.perf_counter()
+    for _ in range(snapshots):
+        text = registry.prometheus_text()
+    text_time = (time.perf_counter() - start) / snapshots
+    start = time.perf_counter()
+    for _ in range(snapshots):
+        registry.snapshot()
+    json_time = (time.perf_counter() - start) / snapshots
+    print('{} sessions, {} series: prometheus text {:.2f}ms ({} bytes), snapshot {:.2f}ms'.format(
+        args.sessions, sum(1 for line in text.splitlines() if not line.startswith('#')),
+        1000 * text_time, len(text), 1000 * json_time))
+
+
+if __name__ == '__main__':
+    main()
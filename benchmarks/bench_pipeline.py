@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Run the gesture-to-command pipeline of http_client.py against a simulated glove and vehicle.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--rate HZ] [--duration S] [--latency S] [--jitter S]
+
+The GloveEmulator and FakeVehicle run in a child process so the CPU usage reported is
+that of the pipeline alone: the glove listener, gesture loop, dispatcher, status loop
+and HTTPClient. End-to-end latency is measured from the first frame of a pose leaving
+the emulator to the matching command reaching the fake vehicle.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_vehicle import FakeVehicle
+from gestures import GestureLoop, GestureStateMachine
+from glove import GloveSerialListener, FRAME_ID_SENSOR
+from glove_emulator import GloveEmulator
+from http_client import HTTPClient, make_dispatcher, pose_commands, pose_dispatch, start_update_loop
+from metrics import LatencyHistogram
+
+# Vehicle command each pose's command ends up sending.
+POSE_VEHICLE_COMMANDS = {
+    'thumbsup': 'ground_takeoff',
+    'fist': 'land',
+    'peace': 'set_skill/security_bot',
+    'hookem': 'set_skill/pano',
+}
+
+
+def run_stand_ins(vehicle, emulator, conn):
+    """ Child process: serve the vehicle and the glove until told to stop. """
+    vehicle.start()
+    emulator.start()
+    conn.recv()
+    emulator.stop()
+    vehicle.stop()
+    conn.send({
+        'pose_starts': emulator.pose_starts,
+        'command_log': vehicle.command_log,
+        'frames_sent': emulator.frames_sent,
+        'overruns': emulator.overruns,
+        'requests': dict(vehicle.requests),
+    })
+
+
+def end_to_end_latency(pose_starts, command_log):
+    """ Match each pose to the first command for it that reached the vehicle afterwards. """
+    histograms = {}
+    missed = collections.Counter()
+    for index, (started, pose) in enumerate(pose_starts):
+        command = POSE_VEHICLE_COMMANDS.get(pose)
+        if command is None:
+            continue
+        # The command must arrive before the pose comes round again.
+        until = next((t for t, later in pose_starts[index + 1:] if later == pose), float('inf'))
+        arrival = next((t for t, logged in command_log if logged == command and started <= t < until),
+                       None)
+        if arrival is None:
+            missed[pose] += 1
+            continue
+        histogram = histograms.setdefault(pose, LatencyHistogram('{} -> {}'.format(pose, command)))
+        histogram.record(arrival - started)
+    return histograms, missed
+
+
+def quiet(*args, **kwargs):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=float, default=100.0, help='finger frames per second')
+    parser.add_argument('--imu-rate', type=float, default=100.0, help='IMU frames per second')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--latency', type=float, default=0.02, help='vehicle response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='vehicle latency jitter in seconds')
+    args = parser.parse_args()
+
+    vehicle = FakeVehicle(latency=args.latency, jitter=args.jitter)
+    emulator = GloveEmulator(rate=args.rate, imu_rate=args.imu_rate)
+    conn, child_conn = multiprocessing.Pipe()
+    stand_ins = multiprocessing.get_context('fork').Process(
+        target=run_stand_ins, args=(vehicle, emulator, child_conn))
+    stand_ins.start()
+    vehicle.server.server_close()
+
+    sys.stdout, stdout = open(os.devnull, 'w'), sys.stdout
+    try:
+        client = HTTPClient(vehicle.url, pilot=True)
+    finally:
+        sys.stdout = stdout
+    start_update_loop(client)
+    listener = GloveSerialListener(emulator.port)
+    listener.setDaemon(True)
+    dispatcher = make_dispatcher(on_phase=quiet, on_done=quiet)
+    dispatcher.start()
+    gesture_loop = GestureLoop(listener.rings[FRAME_ID_SENSOR],
+                               pose_dispatch(dispatcher, pose_commands(client)),
+                               gestures=GestureStateMachine(cooldown=0.5), wait_timeout=0.1)
+    gesture_thread = threading.Thread(target=gesture_loop.run)
+    gesture_thread.setDaemon(True)
+
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        cpu = time.process_time()
+        start = time.time()
+        listener.start()
+        gesture_thread.start()
+        time.sleep(args.duration)
+        gesture_loop.stop()
+        gesture_thread.join()
+        dispatcher.stop()
+        elapsed = time.time() - start
+        cpu = time.process_time() - cpu
+    finally:
+        sys.stdout = stdout
+
+    conn.send('stop')
+    results = conn.recv()
+    stand_ins.join()
+
+    decoded = sum(ring.seq for ring in listener.rings.values())
+    print('glove: sent {} frames, decoded {} ({:.0f} frames/s), {} overruns, {} dropped by rings'.format(
+        results['frames_sent'], decoded, decoded / elapsed, results['overruns'],
+        sum(ring.dropped for ring in listener.rings.values())))
+    print('cpu: {:.2f}s in {:.2f}s ({:.1%} of one core)'.format(cpu, elapsed, cpu / elapsed))
+    print(gesture_loop.report())
+    histograms, missed = end_to_end_latency(results['pose_starts'], results['command_log'])
+    for pose in sorted(histograms):
+        print(histograms[pose].format())
+    if missed:
+        print('poses without a vehicle command: {}'.format(dict(missed)))
+    print(client.latency_report())
+    print('vehicle requests: {}'.format(results['requests']))
+
+
+if __name__ == '__main__':
+    main()
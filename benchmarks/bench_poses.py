@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Measure bulk pose classification throughput over random finger frames.
+
+Usage:
+    python benchmarks/bench_poses.py [--frames N]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poses import FINGER_FRAME_SIZE, NO_POSE, PoseClassifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=1000000, help='number of frames to classify')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    frames = rng.randint(0, 128, size=(args.frames, FINGER_FRAME_SIZE)).astype(np.uint8)
+    frames[:, 0] = 1
+    frames[:, 1] = 11
+
+    classifier = PoseClassifier.from_file()
+    start = time.time()
+    indices = classifier.classify_array(frames)
+    elapsed = time.time() - start
+
+    print('{} frames in {:.3f}s, {:.0f} frames/s'.format(args.frames, elapsed, args.frames / elapsed))
+    counts = collections.Counter(indices.tolist())
+    for index, count in sorted(counts.items()):
+        name = classifier.names[index] if index != NO_POSE else '(none)'
+        print('  {:<10} {}'.format(name, count))
+
+
+if __name__ == '__main__':
+    main()
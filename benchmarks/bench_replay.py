@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Replay a glove recording through GloveSerialListener as fast as it will go.
+
+Usage:
+    python benchmarks/bench_replay.py [recording.hedo] [--speed X] [--frames N]
+
+Without a recording a synthetic session of alternating finger and IMU frames at 100 Hz
+is recorded to a temporary file first. --speed replays at a multiple of real time
+instead of unthrottled.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import GloveSerialListener, FRAME_ID_IMU, FRAME_ID_SENSOR
+from poses import FINGER_FRAME_SIZE, NO_POSE, PoseClassifier
+from recorder import ReplaySerial, SessionRecorder, SessionRecording
+
+
+def record_synthetic(path, num_frames, rate=100.0, seed=0):
+    rng = np.random.RandomState(seed)
+    with SessionRecorder(path) as recorder:
+        for i in range(num_frames):
+            if i % 2:
+                frame = bytes(bytearray([FRAME_ID_IMU, 12])) + rng.randint(0, 128, 12).astype(np.uint8).tobytes()
+            else:
+                frame = bytes(bytearray([FRAME_ID_SENSOR, 11])) + rng.randint(0, 128, 11).astype(np.uint8).tobytes()
+            recorder.record([frame], i / rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('recording', nargs='?', help='file written by recorder.SessionRecorder')
+    parser.add_argument('--speed', type=float, default=None, help='playback speed, default unthrottled')
+    parser.add_argument('--frames', type=int, default=200000, help='synthetic frames to record')
+    args = parser.parse_args()
+
+    path = args.recording
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.hedo')
+        os.close(handle)
+        record_synthetic(path, args.frames)
+
+    recording = SessionRecording(path)
+    print('{}: {} frames, {:.1f}s recorded'.format(path, len(recording), recording.duration))
+
+    decoded = collections.Counter()
+    device = ReplaySerial(recording, speed=args.speed, timeout=0 if args.speed is None else 0.05)
+    listener = GloveSerialListener(path, device=device,
+                                   on_frames=lambda frames: decoded.update(frame[0] for frame in frames))
+    listener.start_streaming()
+    start = time.time()
+    cpu = time.process_time()
+    while not listener.glove.done:
+        listener.read_available()
+    elapsed = time.time() - start
+    cpu = time.process_time() - cpu
+
+    total = sum(decoded.values())
+    print('replayed {} frames in {:.3f}s ({:.0f} frames/s, {:.0f}x real time, {:.0%} cpu)'.format(
+        total, elapsed, total / elapsed, recording.duration / elapsed, cpu / elapsed))
+    if total != len(recording):
+        print('MISMATCH: recording has {} frames'.format(len(recording)))
+
+    fingers = recording.select(FRAME_ID_SENSOR)['frame'][:, :FINGER_FRAME_SIZE]
+    classifier = PoseClassifier.from_file()
+    counts = collections.Counter(classifier.classify_array(fingers).tolist())
+    for index, count in sorted(counts.items()):
+        name = classifier.names[index] if index != NO_POSE else '(none)'
+        print('  {:<10} {}'.format(name, count))
+
+    if args.recording is None:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Measure how SessionManager scales with the number of glove/vehicle pairs.
+
+Usage:
+    python benchmarks/bench_sessions.py [--sessions N [N ...]] [--rate HZ] [--duration S]
+
+For each session count, that many GloveEmulators and FakeVehicles run in a child
+process and one SessionManager drives them all. CPU is that of the manager's process.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_pipeline import end_to_end_latency
+from fake_vehicle import FakeVehicle
+from gestures import GestureStateMachine
+from glove_emulator import GloveEmulator
+from metrics import LatencyHistogram
+from session_manager import GloveSession, SessionManager
+
+
+def run_stand_ins(pairs, conn):
+    """ Child process: serve every vehicle and glove until told to stop. """
+    for vehicle, emulator in pairs:
+        vehicle.start()
+        emulator.start()
+    conn.recv()
+    results = []
+    for vehicle, emulator in pairs:
+        emulator.stop()
+        vehicle.stop()
+        results.append((emulator.pose_starts, vehicle.command_log, emulator.frames_sent))
+    conn.send(results)
+
+
+def run(count, args):
+    pairs = [(FakeVehicle(latency=args.latency, jitter=args.jitter),
+              GloveEmulator(rate=args.rate, imu_rate=args.rate)) for _ in range(count)]
+    conn, child_conn = multiprocessing.Pipe()
+    stand_ins = multiprocessing.get_context('fork').Process(target=run_stand_ins,
+                                                            args=(pairs, child_conn))
+    stand_ins.start()
+    for vehicle, _ in pairs:
+        vehicle.server.server_close()
+
+    sessions = [GloveSession('glove{}'.format(index), emulator.port, vehicle.url,
+                             gestures=GestureStateMachine(cooldown=0.5))
+                for index, (vehicle, emulator) in enumerate(pairs)]
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        manager = SessionManager(sessions).start()
+        cpu = time.process_time()
+        start = time.time()
+        time.sleep(args.duration)
+        elapsed = time.time() - start
+        cpu = time.process_time() - cpu
+        manager.stop()
+    finally:
+        sys.stdout = stdout
+
+    conn.send('stop')
+    results = conn.recv()
+    stand_ins.join()
+
+    end_to_end = LatencyHistogram('pose to vehicle command')
+    for pose_starts, command_log, _ in results:
+        histograms, _ = end_to_end_latency(pose_starts, command_log)
+        for histogram in histograms.values():
+            end_to_end.merge(histogram)
+    frames = sum(session.frames for session in sessions)
+    print('{} sessions: {:.0f} frames/s, cpu {:.1%} of one core, {:.2f}ms cpu per 1000 frames'.format(
+        count, frames / elapsed, cpu / elapsed, 1000 * 1000 * cpu / max(frames, 1)))
+    print('  ' + manager.loop_latency.format())
+    print('  ' + end_to_end.format())
+    for health in manager.health():
+        print('  {name}: {frames_per_second:.0f} frames/s, classify p99 {p99:.2f}ms, '
+              'status errors {status_errors}'.format(p99=health['classify']['p99_ms'], **health))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='session counts to measure')
+    parser.add_argument('--rate', type=float, default=100.0, help='finger and IMU frames per second per glove')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per session count')
+    parser.add_argument('--latency', type=float, default=0.02, help='vehicle response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='vehicle latency jitter in seconds')
+    args = parser.parse_args()
+
+    for count in args.sessions:
+        run(count, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Measure how long `python -m hedo` takes from launch until it is ready for the first command.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--latency S] [--glove-delay S]
+
+Each run starts a fresh interpreter against a new FakeVehicle and GloveEmulator, once
+with the vehicle authentication and glove handshake one after the other and once with
+them in parallel as hedo/cli.py does. Reported per stage, in milliseconds:
+    interpreter: launch until the first line of the script runs.
+    import hedo: importing the command line module.
+    import http_client, auth: importing the HTTP client and authenticating as pilot.
+    import glove, open glove, first frame: opening the glove and waiting for its first frame.
+    ready: start_up() as a whole, i.e. time to the first possible command after imports.
+    total: launch until ready.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+STAGES = ('interpreter', 'import hedo', 'import http_client', 'auth', 'import glove', 'open glove',
+          'first frame', 'ready', 'total')
+
+
+def child(args):
+    """ Run in the fresh interpreter: start up once and print the timings as json. """
+    started = time.monotonic()
+    from hedo import cli
+    imported = time.monotonic()
+
+    cli_args = cli.parse_args(['--url', args.url, '--device', args.device])
+    sys.stdout, stdout = open(os.devnull, 'w'), sys.stdout
+    try:
+        _, listener, timings = cli.start_up(cli_args, parallel=not args.sequential)
+        ready = time.monotonic()
+        listener.close(timeout=1)
+    finally:
+        sys.stdout = stdout
+    timings['import hedo'] = imported - started
+    print(json.dumps({'started': started, 'ready': ready, 'timings': timings}))
+
+
+def run_once(latency, glove_delay, sequential):
+    from fake_vehicle import FakeVehicle
+    from glove_emulator import GloveEmulator
+
+    vehicle = FakeVehicle(latency=latency).start()
+    emulator = GloveEmulator(response_delay=glove_delay).start()
+    command = [sys.executable, os.path.abspath(__file__), '--child',
+               '--url', vehicle.url, '--device', emulator.port]
+    if sequential:
+        command.append('--sequential')
+    try:
+        launched = time.monotonic()
+        output = subprocess.check_output(command, cwd=ROOT)
+    finally:
+        emulator.stop()
+        vehicle.stop()
+    # CLOCK_MONOTONIC is shared between processes, so the child's stamps line up with ours.
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    timings = result['timings']
+    timings['interpreter'] = result['started'] - launched
+    timings['total'] = result['ready'] - launched
+    return timings
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='launches of each startup order')
+    parser.add_argument('--latency', type=float, default=0.2, help='vehicle response latency in seconds')
+    parser.add_argument('--glove-delay', type=float, default=0.3,
+                        help='seconds the glove takes to answer the data-on command')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--device', help=argparse.SUPPRESS)
+    parser.add_argument('--sequential', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = {}
+    for sequential in (True, False):
+        name = 'sequential' if sequential else 'parallel'
+        results[name] = [run_once(args.latency, args.glove_delay, sequential) for _ in range(args.runs)]
+
+    print('{} runs, vehicle latency {:.0f}ms, glove response delay {:.0f}ms (median / max ms)'.format(
+        args.runs, 1000 * args.latency, 1000 * args.glove_delay))
+    print('{:<20}{:>20}{:>20}'.format('stage', 'sequential', 'parallel'))
+    for stage in STAGES:
+        cells = []
+        for name in ('sequential', 'parallel'):
+            values = [timings[stage] for timings in results[name] if stage in timings]
+            cells.append('{:.0f} / {:.0f}'.format(1000 * percentile(values, 0.5), 1000 * max(values))
+                         if values else '-')
+        print('{:<20}{:>20}{:>20}'.format(stage, *cells))
+
+
+if __name__ == '__main__':
+    main()
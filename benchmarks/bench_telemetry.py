@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Measure what LinkTelemetry costs per frame and check what it detects on a simulated link.
+
+Usage:
+    python benchmarks/bench_telemetry.py [--seconds S] [--rate HZ] [--jitter S] [--outages N]
+
+A stream of finger and IMU frames at `--rate` each is generated with Bluetooth-like
+arrival: reads carry one to three frames, stamps wander by `--jitter`, and `--outages`
+silences of 100 to 400ms are spread over the run while the battery byte drains slowly.
+The stream is fed to LinkTelemetry.update() in reads, as the listener queues them.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import GloveSerialListener
+from glove_emulator import finger_frame, imu_frame
+from link_telemetry import BATTERY_INDEX, LinkTelemetry
+
+
+class IdlePort(object):
+    """ Stands in for an open serial port that never has data. """
+    is_open = True
+
+
+def simulate(seconds, rate, jitter, outages, seed=1):
+    """ Return the reads, as lists of (frame, stamp), and the outages injected. """
+    rng = random.Random(seed)
+    finger = bytearray(finger_frame('fist')[1:-1])
+    imu = imu_frame()[1:-1]
+    outage_starts = sorted(rng.uniform(1.0, seconds - 1.0) for _ in range(outages))
+    reads = []
+    stamp = 0.0
+    next_outage = 0
+    while stamp < seconds:
+        if next_outage < len(outage_starts) and stamp >= outage_starts[next_outage]:
+            stamp += rng.uniform(0.1, 0.4)
+            next_outage += 1
+        count = rng.choice((1, 1, 2, 3))
+        stamp += count / rate
+        arrival = stamp + rng.uniform(0.0, jitter)
+        # About one battery step per minute.
+        finger[BATTERY_INDEX] = max(0, 100 - int(stamp / 60.0))
+        reads.append([(bytes(finger), arrival), (imu, arrival)] * count)
+    return reads, len(outage_starts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=600.0, help='simulated run length')
+    parser.add_argument('--rate', type=float, default=100.0, help='frames per second of each type')
+    parser.add_argument('--jitter', type=float, default=0.004, help='arrival jitter in seconds')
+    parser.add_argument('--outages', type=int, default=5, help='silences to inject')
+    args = parser.parse_args()
+
+    reads, outages = simulate(args.seconds, args.rate, args.jitter, args.outages)
+    frames = sum(len(read) for read in reads)
+    telemetry = LinkTelemetry(GloveSerialListener(None, device=IdlePort()))
+
+    start = time.perf_counter()
+    for read in reads:
+        telemetry.update(read)
+    elapsed = time.perf_counter() - start
+
+    end = reads[-1][-1][1]
+    print('{} frames in {} reads over {:.0f}s: {:.2f}us per frame, {:.1f}us per read'.format(
+        frames, len(reads), args.seconds, 1e6 * elapsed / frames, 1e6 * elapsed / len(reads)))
+    print('outages injected: {}'.format(outages))
+    snapshot = telemetry.snapshot(end)
+    print('state at the end: {} {}'.format(snapshot['state'], ', '.join(snapshot['reasons'])))
+    print('state 1s after the last frame: {}'.format(telemetry.snapshot(end + 1.0)['state']))
+    print('battery: {}'.format(snapshot['battery']))
+    for name, summary in sorted(snapshot['frames'].items()):
+        print('  {}: {rate}/s jitter={jitter_ms}ms gaps={gaps} longest={longest_gap_ms}ms'.format(
+            name, **summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Compare motion command throughput and latency over UDP datagrams and HTTP custom_comms.
+
+Both paths run over loopback: the UDP path against a socket that decodes motion
+datagrams, the HTTP path against fake_vehicle.FakeVehicle decoding the JSON move
+message the way RemoteControl.handle_rpc does.
+
+Usage:
+    python benchmarks/bench_udp_control.py [--commands N]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_vehicle import FakeVehicle
+from metrics import LatencyHistogram
+from udp_control import MotionCommandSender, unpack_motion_command
+
+
+def bench_udp(commands):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(0.5)
+    latency = LatencyHistogram('udp latency')
+    received = []
+
+    def receive():
+        while len(received) < commands:
+            try:
+                datagram = receiver.recv(64)
+            except socket.timeout:
+                return
+            _, seq, utime, _ = unpack_motion_command(datagram)
+            latency.record(time.monotonic() - utime / 1e6)
+            received.append(seq)
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    sender = MotionCommandSender(receiver.getsockname())
+    start = time.time()
+    for i in range(commands):
+        sender.send(0.5, 0.0, 0.1 * (i % 10), 0.0, 0.0)
+        if i % 64 == 63:
+            # Let the receiver keep up instead of overflowing the socket buffer.
+            time.sleep(0)
+    thread.join()
+    elapsed = time.time() - start
+    sender.close()
+    receiver.close()
+    return len(received), elapsed, latency
+
+
+def bench_http(commands):
+    latency = LatencyHistogram('http latency')
+
+    def handle_rpc(skill_key, data):
+        message = json.loads(data.decode('utf-8'))
+        latency.record(time.time() - message['utime'] / 1e6)
+        return None
+
+    vehicle = FakeVehicle(comms_handler=handle_rpc).start()
+    session = requests.Session()
+    url = '{}/api/custom_comms'.format(vehicle.url)
+    start = time.time()
+    for i in range(commands):
+        message = json.dumps({'move': [0.5, 0.0, 0.1 * (i % 10), 0.0, 0.0],
+                              'utime': int(time.time() * 1e6)})
+        session.post(url, json={
+            'data': base64.b64encode(message.encode('utf-8')).decode('ascii'),
+            'skill_key': 'remote.RemoteControl',
+            'no_response': True,
+        }).json()
+    elapsed = time.time() - start
+    vehicle.stop()
+    return commands, elapsed, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=5000, help='commands to send per path')
+    args = parser.parse_args()
+
+    for name, bench in (('udp', bench_udp), ('http', bench_http)):
+        received, elapsed, latency = bench(args.commands)
+        print('{:<5} {:>6}/{} delivered {:>10.0f} commands/s'.format(
+            name, received, args.commands, received / elapsed))
+        print('      ' + latency.format())
+
+
+if __name__ == '__main__':
+    main()
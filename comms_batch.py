@@ -0,0 +1,265 @@
+"""
+Batched custom_comms messages for a skill.
+
+Every custom_comms request is a blocking HTTP round trip carrying one base64 payload.
+CustomCommsBatcher instead queues messages and sends many of them in one request, as
+a binary batch: a header followed by each message prefixed with its length, optionally
+zlib compressed. The layout must match BATCH_HEADER in skillset/remote.py, which is
+deployed to the vehicle separately.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import base64
+import collections
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+from metrics import LatencyHistogram
+from vehicle_api import custom_comms_request
+
+# magic, version, flags, message count. Each message follows as a uint32 length and its bytes.
+BATCH_HEADER = struct.Struct('<2sBBH')
+BATCH_LENGTH = struct.Struct('<I')
+BATCH_MAGIC = b'CB'
+BATCH_VERSION = 1
+# Everything after the header is zlib compressed.
+BATCH_FLAG_ZLIB = 1
+
+MAX_BATCH_MESSAGES = 0xFFFF
+
+
+def pack_batch(messages, compress_threshold=None):
+    """
+    Pack a list of bytes into one batch.
+
+    Args:
+        messages (list): The messages, at most MAX_BATCH_MESSAGES of them.
+
+        compress_threshold (int): Compress batches of at least this many bytes, if that
+            makes them smaller. None never compresses.
+    """
+    parts = []
+    for message in messages:
+        parts.append(BATCH_LENGTH.pack(len(message)))
+        parts.append(message)
+    body = b''.join(parts)
+    flags = 0
+    if compress_threshold is not None and len(body) >= compress_threshold:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= BATCH_FLAG_ZLIB
+    return BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, flags, len(messages)) + body
+
+
+def unpack_batch(payload):
+    """
+    Split a batch back into its messages.
+
+    Raises:
+        ValueError: if the payload is not a well formed batch.
+    """
+    if len(payload) < BATCH_HEADER.size:
+        raise ValueError('batch too short')
+    magic, version, flags, count = BATCH_HEADER.unpack_from(payload)
+    if magic != BATCH_MAGIC or version != BATCH_VERSION:
+        raise ValueError('not a batch')
+    body = memoryview(payload)[BATCH_HEADER.size:]
+    if flags & BATCH_FLAG_ZLIB:
+        body = memoryview(zlib.decompress(body))
+
+    messages = []
+    pos = 0
+    for _ in range(count):
+        if pos + BATCH_LENGTH.size > len(body):
+            raise ValueError('batch truncated')
+        length, = BATCH_LENGTH.unpack_from(body, pos)
+        pos += BATCH_LENGTH.size
+        if pos + length > len(body):
+            raise ValueError('batch truncated')
+        messages.append(body[pos:pos + length].tobytes())
+        pos += length
+    return messages
+
+
+class CustomCommsBatcher(object):
+    """
+    Queue custom_comms messages for one skill and send them in batches.
+
+    Messages are collected until `max_messages` or `max_bytes` are queued or the first
+    of them has waited `max_delay` seconds, then sent as one batch (see pack_batch) in a
+    single custom_comms request. One request is in flight at a time, so whatever is sent
+    while it is pending makes up the next batch.
+
+    The skill answers a batch with a batch holding one response per message, in order,
+    which send() hands back through a future. Messages sent with `no_response` don't
+    wait for anything: their future resolves to None once the batch was delivered, and a
+    batch of nothing but such messages asks the vehicle for no response at all.
+
+    Args:
+        client (HTTPClient): Connection to the vehicle.
+
+        skill_key (str): The skill receiving the messages.
+
+        max_messages (int): Most messages in one batch.
+
+        max_bytes (int): Batch size, before compression, at which it is sent right away.
+
+        max_delay (float): Longest time in seconds a message waits for others to join it.
+
+        compress_threshold (int): Batches at least this large are compressed, None for never.
+    """
+
+    def __init__(self, client, skill_key, max_messages=256, max_bytes=64 * 1024, max_delay=0.005,
+                 compress_threshold=512):
+        self.client = client
+        self.skill_key = skill_key
+        self.max_messages = min(max_messages, MAX_BATCH_MESSAGES)
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.compress_threshold = compress_threshold
+
+        self._pending = collections.deque()
+        self._pending_bytes = 0
+        self._first_queued = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+
+        self.batches = 0
+        self.messages = 0
+        self.errors = 0
+        self.bad_replies = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.request_latency = LatencyHistogram('custom_comms batch')
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """ Send whatever is still queued and wait for the worker to exit. """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def send(self, data, no_response=False):
+        """
+        Queue a message for the skill.
+
+        Returns:
+            concurrent.futures.Future: resolves to the skill's response (bytes, or None if it
+                gave none), or to None for `no_response` messages once they were delivered.
+        """
+        future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError('CustomCommsBatcher is stopped')
+            if not self._pending:
+                self._first_queued = time.monotonic()
+                self._cond.notify()
+            self._pending.append((data, no_response, future))
+            self._pending_bytes += len(data)
+            if self._full():
+                self._cond.notify()
+        return future
+
+    def _full(self):
+        return len(self._pending) >= self.max_messages or self._pending_bytes >= self.max_bytes
+
+    def _take(self):
+        """
+        Remove the next batch from the queue. Call with the lock held.
+
+        Messages whose future was cancelled are dropped rather than sent, and the rest
+        can no longer be cancelled, so resolving them later can't fail.
+        """
+        batch = []
+        size = 0
+        pending = self._pending
+        while pending and len(batch) < self.max_messages:
+            length = len(pending[0][0])
+            if batch and size + length > self.max_bytes:
+                break
+            message = pending.popleft()
+            self._pending_bytes -= length
+            if not message[2].set_running_or_notify_cancel():
+                continue
+            batch.append(message)
+            size += length
+        if not pending:
+            self._first_queued = None
+        # Anything left over has already waited long enough and goes out next.
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give the batch until max_delay after its first message to fill up.
+                while not self._stopping and not self._full():
+                    remaining = self._first_queued + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take()
+            if batch:
+                self._post(batch)
+
+    def _post(self, batch):
+        payload = pack_batch([data for data, _, _ in batch], self.compress_threshold)
+        no_response = all(fire_and_forget for _, fire_and_forget, _ in batch)
+        start = time.monotonic()
+        try:
+            reply = self.client.request_json('custom_comms',
+                                             custom_comms_request(self.skill_key, payload, no_response))
+        except Exception as error:  # pylint: disable=broad-except
+            self.errors += 1
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        self.request_latency.record(time.monotonic() - start)
+        self.batches += 1
+        self.messages += len(batch)
+        self.raw_bytes += sum(len(data) for data, _, _ in batch)
+        self.sent_bytes += len(payload)
+
+        # The batch was delivered even if the reply can't be read, so only the messages
+        # waiting for a response fail.
+        responses = []
+        reply_error = None
+        if not no_response and reply and reply.get('data'):
+            try:
+                responses = unpack_batch(base64.b64decode(reply['data']))
+            except (ValueError, TypeError, zlib.error) as error:
+                self.bad_replies += 1
+                reply_error = error
+
+        for index, (_, fire_and_forget, future) in enumerate(batch):
+            if reply_error is not None and not fire_and_forget:
+                future.set_exception(reply_error)
+                continue
+            response = None
+            if not fire_and_forget and index < len(responses) and responses[index]:
+                response = responses[index]
+            future.set_result(response)
+
+    def report(self):
+        mean = self.messages / float(self.batches) if self.batches else 0.0
+        return '\n'.join([
+            'custom_comms batches: sent={} messages={} ({:.1f}/batch) bytes={} on the wire={} errors={} '
+            'bad replies={}'.format(self.batches, self.messages, mean, self.raw_bytes, self.sent_bytes,
+                                   self.errors, self.bad_replies),
+            self.request_latency.format(),
+        ])
@@ -0,0 +1,159 @@
+"""
+Run vehicle commands off the gesture thread.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CommandHandle(object):
+    """
+    A command submitted to the CommandDispatcher.
+
+    The command function is called with its handle, so long running commands can watch
+    `cancelled` and report flight phase changes with `report_phase`.
+
+    Attributes:
+        name (str): The command name used for coalescing and superseding.
+
+        future (Future): Resolves to the command function's return value.
+
+        cancelled (threading.Event): Set when a later command supersedes this one.
+
+        phases (list): (timestamp, flight phase) transitions reported by the command.
+    """
+
+    def __init__(self, name, func, dispatcher):
+        self.name = name
+        self.func = func
+        self.future = Future()
+        self.cancelled = threading.Event()
+        self.phases = []
+        self.submitted = time.time()
+        self._dispatcher = dispatcher
+
+    def report_phase(self, phase):
+        self.phases.append((time.time(), phase))
+        if self._dispatcher.on_phase:
+            self._dispatcher.on_phase(self, phase)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class CommandDispatcher(object):
+    """
+    Execute blocking vehicle commands one at a time on a worker thread.
+
+    Submitting returns immediately with a CommandHandle. A command with the same name as
+    one that is already queued or running is coalesced into it, and a command cancels
+    the queued or running commands it supersedes (e.g. a land cancels the wait for takeoff).
+
+    Args:
+        supersedes (dict): Maps a command name to the names of the commands it cancels.
+
+        on_phase (callable): Called with (handle, phase) whenever a command reports a
+            flight phase transition.
+
+        on_done (callable): Called with the handle of every command that finished, failed
+            or was cancelled.
+    """
+
+    def __init__(self, supersedes=None, on_phase=None, on_done=None):
+        if supersedes is None:
+            supersedes = {'land': ('takeoff',), 'takeoff': ('land',)}
+        self.supersedes = supersedes
+        self.on_phase = on_phase
+        self.on_done = on_done
+
+        self._pending = collections.deque()
+        self._running = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+
+        self.submitted = collections.Counter()
+        self.coalesced = collections.Counter()
+        self.superseded = collections.Counter()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """ Cancel everything that is queued or running and wait for the worker to exit. """
+        with self._cond:
+            self._stopping = True
+            for handle in self._pending:
+                handle.cancelled.set()
+                handle.future.cancel()
+            self._pending.clear()
+            if self._running:
+                self._running.cancelled.set()
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def submit(self, name, func):
+        """
+        Queue `func(handle)` to run on the worker thread. Returns the CommandHandle.
+
+        Raises:
+            RuntimeError: if the dispatcher was stopped, as nothing would ever run it.
+        """
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError('CommandDispatcher is stopped')
+            if self._running and self._running.name == name and not self._running.cancelled.is_set():
+                self.coalesced[name] += 1
+                return self._running
+            for handle in self._pending:
+                if handle.name == name:
+                    self.coalesced[name] += 1
+                    return handle
+
+            superseded = self.supersedes.get(name, ())
+            if self._running and self._running.name in superseded:
+                self.superseded[self._running.name] += 1
+                self._running.cancelled.set()
+            for handle in [h for h in self._pending if h.name in superseded]:
+                self.superseded[handle.name] += 1
+                handle.cancelled.set()
+                handle.future.cancel()
+                self._pending.remove(handle)
+
+            handle = CommandHandle(name, func, self)
+            if self.on_done:
+                handle.future.add_done_callback(lambda _: self.on_done(handle))
+            self.submitted[name] += 1
+            self._pending.append(handle)
+            self._cond.notify()
+            return handle
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                handle = self._pending.popleft()
+                self._running = handle
+
+            if handle.future.set_running_or_notify_cancel():
+                try:
+                    result = handle.func(handle)
+                except Exception as error:  # pylint: disable=broad-except
+                    handle.future.set_exception(error)
+                else:
+                    handle.future.set_result(result)
+
+            with self._cond:
+                self._running = None
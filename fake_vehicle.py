@@ -0,0 +1,200 @@
+"""
+Local stand-in for the vehicle's HTTP api, for exercising the clients without a drone.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import base64
+import collections
+import json
+import random
+import threading
+import time
+
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from vehicle_api import endpoint_name
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeVehicle(object):
+    """
+    Minimal HTTP server that answers the endpoints HTTPClient and AsyncHTTPClient use.
+
+    Flight phases follow the commands it receives: ground_takeoff moves it to FLYING and
+    land back to READY_FOR_GROUND_TAKEOFF. custom_comms payloads are passed to
+    `comms_handler(skill_key, data)` and its return value is sent back, or echoed if no
+    handler is set. A synthetic camera frame is served through the channel metadata and
+    /shm endpoints used by HTTPClient.fetch_image.
+
+    Every response is delayed by `latency` plus a uniformly distributed +-`jitter`, to
+    stand in for the WiFi link. Commands that change what the vehicle does are appended
+    to `command_log` as (monotonic time, command) when they arrive.
+
+    Args:
+        host (str): Interface to listen on.
+
+        port (int): Port to listen on, 0 picks a free one.
+
+        comms_handler (callable): Optional custom_comms handler.
+
+        udp_port (int): Reported as lcmProxyUdpPort in the status config.
+
+        image_size (tuple): (width, height) of the synthetic RGB camera frame.
+
+        latency (float): Seconds each response is delayed.
+
+        jitter (float): Largest random deviation from latency, in seconds.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, comms_handler=None, udp_port=None,
+                 image_size=(640, 480), latency=0.0, jitter=0.0):
+        self.comms_handler = comms_handler
+        self.udp_port = udp_port
+        self.image_size = image_size
+        self.image_count = 0
+        self.latency = latency
+        self.jitter = jitter
+        self.command_log = []
+
+        self.lock = threading.Lock()
+        self.flight_phase = 'READY_FOR_GROUND_TAKEOFF'
+        self.skill = None
+        self.sessions = 0
+        self.requests = collections.Counter()
+
+        vehicle = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Send each response in one write so keep-alive clients aren't stalled by Nagle.
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self._reply(None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                self._reply(json.loads(body.decode('utf-8')) if body else {})
+
+            def _reply(self, request):
+                vehicle.delay()
+                path = self.path.split('?', 1)[0]
+                if path.startswith('/shm/'):
+                    self._send(vehicle.image_pixels(), 'application/octet-stream')
+                    return
+                if not path.startswith('/api/'):
+                    self.send_error(404)
+                    return
+                data = vehicle.handle(path[len('/api/'):], request)
+                self._send(json.dumps({'data': data}).encode('utf-8'), 'application/json')
+
+            def _send(self, payload, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        """ Sleep for the configured link latency. """
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def status(self):
+        return {
+            'sessionId': 'fake-session',
+            'flightPhase': self.flight_phase,
+            'config': {
+                'deployInfo': {'api_version_major': 18.0, 'api_version_minor': 5.0},
+                'lcmProxyUdpHostname': '',
+                'lcmProxyUdpPort': self.udp_port,
+            },
+        }
+
+    def image_pixels(self):
+        """ Raw RGB bytes of the current synthetic frame: a gradient that moves every frame. """
+        width, height = self.image_size
+        with self.lock:
+            self.requests['shm'] += 1
+            shift = self.image_count % 256
+        row = bytearray((3 * (x + shift)) % 256 for x in range(width * 3))
+        return bytes(row) * height
+
+    def handle(self, endpoint, request):
+        """ Produce the 'data' field of the response for an endpoint. """
+        name = endpoint_name(endpoint)
+        with self.lock:
+            self.requests[name] += 1
+            if name == 'authentication':
+                self.sessions += 1
+                level = 'PILOT' if request.get('requested_level', 0) >= 8 else 'OBSERVER'
+                return {'accessToken': 'fake-token-{}'.format(self.sessions), 'accessLevel': level}
+            if name == 'status':
+                return self.status()
+            if name == 'async_command':
+                command = request.get('command')
+                self.command_log.append((time.monotonic(), command))
+                if command == 'ground_takeoff':
+                    self.flight_phase = 'FLYING'
+                elif command == 'land':
+                    self.flight_phase = 'READY_FOR_GROUND_TAKEOFF'
+                return {}
+            if name == 'set_skill':
+                self.skill = endpoint.split('/', 1)[1]
+                self.command_log.append((time.monotonic(), 'set_skill/' + self.skill))
+                return {}
+            if endpoint == 'channel/SUBJECT_CAMERA_RIG_NATIVE':
+                self.image_count += 1
+                width, height = self.image_size
+                return {'json': {'images': [{
+                    'data': '/camera/frame_{}'.format(self.image_count),
+                    'pixelformat': 1002,
+                    'width': width,
+                    'height': height,
+                }]}}
+            if name == 'active_faults':
+                return {'faults': {}}
+            if name in ('set_fault_override', 'runmode'):
+                return {}
+        if name == 'custom_comms':
+            data = base64.b64decode(request['data'])
+            if self.comms_handler:
+                data = self.comms_handler(request['skill_key'], data)
+            if request.get('no_response') or data is None:
+                return {}
+            return {'data': base64.b64encode(data).decode('ascii')}
+        return {}
@@ -0,0 +1,218 @@
+"""
+Fixed-capacity ring of glove frames shared between the serial thread and its consumers.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import threading
+from array import array
+
+
+class FrameRing(object):
+    """
+    Preallocated single-producer ring buffer of frames.
+
+    Every slot carries the sequence number of the frame stored in it. The writer clears
+    it before touching the slot and sets it once the frame is complete, and readers check
+    it before and after copying (a seqlock), so a reader never sees a half-written or
+    recycled frame and the writer never takes a lock.
+
+    Args:
+        capacity (int): Number of frames kept before the oldest is overwritten.
+
+        frame_size (int): Largest frame accepted, in bytes.
+    """
+
+    def __init__(self, capacity=256, frame_size=16):
+        self.capacity = capacity
+        self.frame_size = frame_size
+
+        self._frames = array('B', bytes(capacity * frame_size))
+        self._view = memoryview(self._frames)
+        self._lengths = array('H', [0] * capacity)
+        self._stamps = array('d', [0.0] * capacity)
+        self._slot_seq = array('q', [-1] * capacity)
+        self._head = 0
+
+        # Only used to park consumers waiting for new frames; publish never takes it.
+        self._cond = threading.Condition()
+        self._waiting = 0
+
+        # Frames rejected by the writer. Frames a reader missed because they were overwritten
+        # depend on the reader, so each one counts its own (see since()).
+        self.oversize = 0
+
+    @property
+    def seq(self):
+        """ Sequence number the next published frame will get. """
+        return self._head
+
+    @property
+    def dropped(self):
+        """ Frames that never made it into the ring. """
+        return self.oversize
+
+    def publish(self, frame, stamp=0.0):
+        """ Copy a frame into the ring and return its sequence number, or -1 if it did not fit. """
+        length = len(frame)
+        if length > self.frame_size:
+            self.oversize += 1
+            return -1
+        seq = self._head
+        slot = seq % self.capacity
+        offset = slot * self.frame_size
+
+        self._slot_seq[slot] = -1
+        self._view[offset:offset + length] = frame
+        self._lengths[slot] = length
+        self._stamps[slot] = stamp
+        self._slot_seq[slot] = seq
+
+        self._head = seq + 1
+        return seq
+
+    def notify(self):
+        """ Wake consumers blocked in wait(). Call once after publishing a batch of frames. """
+        if self._waiting:
+            with self._cond:
+                self._cond.notify_all()
+
+    def wait(self, seq, timeout=None):
+        """ Block until the frame with the given sequence number is published. Returns False on timeout. """
+        if self._head > seq:
+            return True
+        with self._cond:
+            self._waiting += 1
+            try:
+                return self._cond.wait_for(lambda: self._head > seq, timeout)
+            finally:
+                self._waiting -= 1
+
+    def read(self, seq):
+        """ Return (frame, stamp) for a sequence number, or None if it is no longer in the ring. """
+        slot = seq % self.capacity
+        if self._slot_seq[slot] != seq:
+            return None
+        offset = slot * self.frame_size
+        frame = self._view[offset:offset + self._lengths[slot]].tobytes()
+        stamp = self._stamps[slot]
+        if self._slot_seq[slot] != seq:
+            # The writer lapped us while copying.
+            return None
+        return frame, stamp
+
+    def latest(self):
+        """ Return (seq, frame, stamp) for the newest frame, or None if nothing was published. """
+        while True:
+            seq = self._head - 1
+            if seq < 0:
+                return None
+            entry = self.read(seq)
+            if entry is not None:
+                return (seq,) + entry
+
+    def since(self, seq):
+        """
+        Collect every frame published at or after a sequence number.
+
+        Frames that were already overwritten are skipped. The reader missed
+        `next_seq - seq - len(entries)` of them.
+
+        Returns:
+            tuple: a list of (seq, frame, stamp) entries and the sequence number to pass next time.
+        """
+        head = self._head
+        entries = []
+        for current in range(max(seq, head - self.capacity), head):
+            entry = self.read(current)
+            if entry is not None:
+                entries.append((current,) + entry)
+        return entries, head
+
+
+# What FrameQueue.put does when the queue is full.
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+
+class FrameQueue(object):
+    """
+    Bounded queue of (frame, stamp) items for a consumer that needs every frame in order.
+
+    Unlike FrameRing, a full queue does what `overflow` says: drop the oldest queued
+    frames, drop the new ones, or block the producer until the consumer catches up.
+    Blocking the glove reader stops it reading the port, so the backlog builds up in the
+    serial driver instead of in memory.
+
+    Args:
+        maxsize (int): Number of frames held.
+
+        overflow (str): One of OVERFLOW_POLICIES.
+    """
+
+    def __init__(self, maxsize=1024, overflow=OVERFLOW_DROP_OLDEST):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy {}'.format(overflow))
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self.closed = False
+
+        self.dropped = 0
+        self.blocked = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put_many(self, items):
+        """ Add (frame, stamp) items. Returns how many were queued. """
+        queued = 0
+        with self._cond:
+            for item in items:
+                if len(self._items) >= self.maxsize:
+                    if self.overflow == OVERFLOW_DROP_OLDEST:
+                        self._items.popleft()
+                        self.dropped += 1
+                    elif self.overflow == OVERFLOW_DROP_NEWEST:
+                        self.dropped += 1
+                        continue
+                    else:
+                        self.blocked += 1
+                        self._cond.notify_all()
+                        self._cond.wait_for(lambda: len(self._items) < self.maxsize or self.closed)
+                        if self.closed:
+                            break
+                self._items.append(item)
+                queued += 1
+            if queued:
+                self._cond.notify_all()
+        return queued
+
+    def put(self, frame, stamp):
+        return self.put_many([(frame, stamp)]) == 1
+
+    def get_many(self, max_items=None, timeout=None):
+        """ Remove and return up to max_items queued items, waiting up to timeout for the first. """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self.closed, timeout):
+                return []
+            count = len(self._items) if max_items is None else min(max_items, len(self._items))
+            items = [self._items.popleft() for _ in range(count)]
+            self._cond.notify_all()
+            return items
+
+    def get(self, timeout=None):
+        """ Return the oldest (frame, stamp), or None on timeout or once closed and empty. """
+        items = self.get_many(1, timeout)
+        return items[0] if items else None
+
+    def close(self):
+        """ Release a blocked producer and any waiting consumer. """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
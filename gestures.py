@@ -0,0 +1,183 @@
+"""
+Turn glove finger frames into gestures and vehicle commands.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import threading
+import time
+
+from metrics import REGISTRY, LatencyHistogram, Sample
+from poses import PoseClassifier
+
+
+class GestureStateMachine(object):
+    """
+    Debounce per-frame pose classifications into single gesture events.
+
+    A pose must be classified on `confirm_frames` consecutive frames before it is held,
+    and a held pose is only released after `release_frames` consecutive frames of
+    something else. Entering the held state fires the gesture once, unless the same
+    gesture fired less than its cooldown ago.
+
+    Args:
+        confirm_frames (int): Consecutive frames needed to accept a pose.
+
+        release_frames (int): Consecutive frames needed to let go of a held pose.
+
+        cooldown (float): Seconds before the same gesture may fire again.
+
+        cooldowns (dict): Per-pose overrides of `cooldown`.
+    """
+
+    def __init__(self, confirm_frames=5, release_frames=10, cooldown=3.0, cooldowns=None):
+        self.confirm_frames = confirm_frames
+        self.release_frames = release_frames
+        self.cooldown = cooldown
+        self.cooldowns = cooldowns or {}
+
+        self.held = None
+        self.candidate = None
+        self.candidate_frames = 0
+        self.last_fired = {}
+
+        # Gestures that fired, frames of a gesture that did not fire again because it was
+        # already held or cooling down, and poses that flickered without being confirmed.
+        self.dispatched = collections.Counter()
+        self.suppressed = collections.Counter()
+        self.unconfirmed = collections.Counter()
+
+    def update(self, pose, now):
+        """ Feed the pose of the next frame. Returns the gesture to dispatch, or None. """
+        if pose == self.candidate:
+            self.candidate_frames += 1
+        else:
+            if self.candidate is not None and self.candidate != self.held \
+                    and self.candidate_frames < self.confirm_frames:
+                self.unconfirmed[self.candidate] += 1
+            self.candidate = pose
+            self.candidate_frames = 1
+
+        if pose == self.held:
+            if pose is not None:
+                self.suppressed[pose] += 1
+            return None
+
+        if self.held is not None:
+            if self.candidate_frames < self.release_frames:
+                # Hysteresis: keep holding through short glitches.
+                self.suppressed[self.held] += 1
+                return None
+            self.held = None
+
+        if pose is None or self.candidate_frames < self.confirm_frames:
+            return None
+
+        self.held = pose
+        cooldown = self.cooldowns.get(pose, self.cooldown)
+        last = self.last_fired.get(pose)
+        if last is not None and now - last < cooldown:
+            self.suppressed[pose] += 1
+            return None
+        self.last_fired[pose] = now
+        self.dispatched[pose] += 1
+        return pose
+
+    def format(self):
+        return 'gestures: dispatched={} suppressed={} unconfirmed={}'.format(
+            dict(self.dispatched), dict(self.suppressed), dict(self.unconfirmed))
+
+
+class GestureLoop(object):
+    """
+    Classify finger frames as soon as the glove listener publishes them.
+
+    The loop sleeps on the FrameRing until a frame arrives, classifies every frame it
+    has not seen yet in one batch and calls `dispatch(pose)` once for each gesture
+    confirmed by the GestureStateMachine.
+    Latency from frame arrival to classification and to dispatch is recorded in histograms.
+
+    Args:
+        frames (FrameRing): Ring of finger frames from GloveSerialListener.
+
+        dispatch (callable): Called with the name of each newly detected pose.
+
+        classifier (PoseClassifier): Defaults to the poses in poses.json.
+
+        gestures (GestureStateMachine): Debouncing settings, defaults to GestureStateMachine().
+
+        wait_timeout (float): Longest time to sleep before checking for a stop request.
+    """
+
+    def __init__(self, frames, dispatch, classifier=None, gestures=None, wait_timeout=1.0):
+        self.frames = frames
+        self.dispatch = dispatch
+        self.classifier = classifier or PoseClassifier.from_file()
+        self.gestures = gestures or GestureStateMachine()
+        self.wait_timeout = wait_timeout
+
+        self.next_seq = frames.seq
+        self.frames_classified = 0
+        # Frames overwritten in the ring before this loop got to them.
+        self.overruns = 0
+        self.classify_latency = LatencyHistogram('arrival to classification')
+        self.dispatch_latency = LatencyHistogram('arrival to dispatch')
+        self._stop = threading.Event()
+
+    def poll(self):
+        """ Classify every pending frame. Returns the number of frames processed. """
+        seq = self.next_seq
+        entries, self.next_seq = self.frames.since(seq)
+        self.overruns += self.next_seq - seq - len(entries)
+        if not entries:
+            return 0
+        poses = self.classifier.classify_frames([frame for _, frame, _ in entries])
+        self.frames_classified += len(entries)
+        now = time.monotonic()
+        for (_, _, stamp), pose in zip(entries, poses):
+            self.classify_latency.record(now - stamp)
+            gesture = self.gestures.update(pose, stamp)
+            if gesture is not None:
+                self.dispatch_latency.record(time.monotonic() - stamp)
+                self.dispatch(gesture)
+        return len(entries)
+
+    def run(self):
+        """ Process frames until stop() is called. """
+        while not self._stop.is_set():
+            if self.frames.wait(self.next_seq, self.wait_timeout):
+                self.poll()
+
+    def stop(self):
+        self._stop.set()
+
+    def register_metrics(self, registry=REGISTRY, **labels):
+        """ Export classification counts and latencies from `registry`. Returns the collector. """
+        return registry.add_collector(lambda: self.collect_metrics(labels))
+
+    def collect_metrics(self, labels):
+        yield Sample('gesture_frames_classified_total', 'counter', 'Finger frames classified', labels,
+                     self.frames_classified)
+        yield Sample('gesture_frames_overrun_total', 'counter',
+                     'Finger frames overwritten before they were classified', labels, self.overruns)
+        yield Sample('gesture_classify_seconds', 'histogram', 'Frame arrival to classification',
+                     labels, self.classify_latency)
+        yield Sample('gesture_dispatch_seconds', 'histogram', 'Frame arrival to gesture dispatch',
+                     labels, self.dispatch_latency)
+        gestures = self.gestures
+        for name, counts, help_text in (
+                ('gestures_dispatched_total', gestures.dispatched, 'Gestures that fired'),
+                ('gestures_suppressed_total', gestures.suppressed,
+                 'Frames of a gesture that was already held or cooling down'),
+                ('gestures_unconfirmed_total', gestures.unconfirmed, 'Poses that flickered without firing')):
+            for pose, count in list(counts.items()):
+                yield Sample(name, 'counter', help_text, dict(labels, pose=pose), count)
+
+    def report(self):
+        return '\n'.join([
+            self.classify_latency.format(),
+            self.dispatch_latency.format(),
+            self.gestures.format(),
+        ])
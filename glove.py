@@ -0,0 +1,411 @@
+"""
+BeBop Commander Glove serial protocol.
+
+The glove streams sysex-style frames: 0xF0, a frame id, a length byte, the payload
+and a closing 0xF7. See test_scripts/readme.md for the byte layout.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import selectors
+import threading
+import time
+
+import serial
+
+from frame_ring import FrameQueue, FrameRing, OVERFLOW_DROP_OLDEST
+from metrics import REGISTRY, Sample
+
+
+FRAME_START = 0xF0
+FRAME_END = 0xF7
+
+FRAME_ID_SENSOR = 1
+FRAME_ID_IMU = 2
+
+# Command sequences understood by the glove.
+CMD_DATA_ON = bytearray([176, 115, 1])
+CMD_USB_MODE = bytearray([176, 118, 1])
+CMD_BLUETOOTH_MODE = bytearray([176, 118, 2])
+
+GLOVE_BAUDRATE = 460800
+
+# [s] How often a port without a file descriptor is polled while it has nothing to read.
+REPLAY_POLL = 0.002
+
+
+# Payload length of each frame id, as sent in the frame's length byte.
+FRAME_LENGTHS = {
+    FRAME_ID_SENSOR: 11,
+    FRAME_ID_IMU: 12,
+}
+
+
+class FrameDecoder(object):
+    """
+    Streaming decoder that splits raw glove bytes into frames.
+
+    Bytes are appended to a reusable buffer and the frame delimiters are located with
+    bytearray.find, so the cost per read is a handful of C-level scans instead of Python
+    work for every byte.
+
+    Each decoded frame is a bytes object holding everything between 0xF0 and 0xF7
+    (frame id, length and payload), so frame[0] is the id and frame[2:] the payload.
+
+    A frame is only passed on if its id is in `frame_lengths` and both its length byte
+    and its actual payload match the length for that id. Payload bytes are 7 bit, so a
+    lost byte can't make a start byte appear out of nowhere: after corrupt data the
+    decoder picks up again at the next 0xF0, and frames after it are kept. Corrupt
+    frames and noise are dropped by moving an offset, without allocating anything.
+
+    Args:
+        frame_lengths (dict): Payload length of each accepted frame id.
+    """
+
+    def __init__(self, frame_lengths=FRAME_LENGTHS):
+        self.frame_lengths = frame_lengths
+        # Start and end bytes, id, length and the longest payload.
+        self.max_frame_size = 4 + max(frame_lengths.values())
+        # Expected payload length by id byte, -1 for ids that are not accepted.
+        self._lengths = [frame_lengths.get(frame_id, -1) for frame_id in range(256)]
+        self._buf = bytearray()
+
+        # Frames passed on, frames dropped by validation, and runs of bytes skipped to get
+        # back in step with the start bytes. A run may span several reads, so _skipping
+        # carries over between calls to feed() and the counts don't depend on chunking.
+        self.valid = 0
+        self.corrupt = 0
+        self.resyncs = 0
+        self._skipping = False
+
+    def _skip(self):
+        if not self._skipping:
+            self._skipping = True
+            self.resyncs += 1
+
+    def feed(self, chunk):
+        """ Add raw bytes to the decoder and return the list of valid frames they completed. """
+        buf = self._buf
+        buf += chunk
+        lengths = self._lengths
+        max_frame_size = self.max_frame_size
+        frames = []
+        pos = 0
+        while True:
+            start = buf.find(FRAME_START, pos)
+            if start < 0:
+                # Nothing but noise, drop it.
+                if pos < len(buf):
+                    self._skip()
+                pos = len(buf)
+                break
+            if start > pos:
+                self._skip()
+            # Only look for the end byte as far as the longest frame could reach, so a
+            # frame is judged the same however the stream was split into reads.
+            end = buf.find(FRAME_END, start + 1, start + max_frame_size)
+            if end < 0:
+                if len(buf) - start < max_frame_size:
+                    # Incomplete frame, keep it for the next read.
+                    pos = start
+                    break
+                # Too long to be a frame: its end byte was lost.
+                self.corrupt += 1
+                self._skip()
+                pos = start + 1
+                continue
+            # A start byte inside the frame means the previous frame was cut short.
+            restart = buf.rfind(FRAME_START, start + 1, end)
+            if restart >= 0:
+                self.corrupt += 1
+                self._skip()
+                start = restart
+            self._skipping = False
+            length = end - start - 3
+            if length >= 0 and lengths[buf[start + 1]] == length == buf[start + 2]:
+                frames.append(bytes(buf[start + 1:end]))
+                self.valid += 1
+            else:
+                self.corrupt += 1
+            pos = end + 1
+        if pos:
+            del buf[:pos]
+        return frames
+
+    def reset(self):
+        """ Drop any partially received frame. """
+        del self._buf[:]
+        self._skipping = False
+
+
+class GloveSerialListener(threading.Thread):
+    """
+    Background thread that reads the glove's serial port and decodes frames.
+
+    The thread sleeps in a selector on the port's file descriptor and only wakes when
+    bytes arrive or stop() is called. Decoded finger and IMU frames are published,
+    stamped with their arrival time, into the FrameRing for their frame id in `rings`,
+    and into every FrameQueue handed out by subscribe().
+
+    If the port cannot be opened or fails while reading, the thread closes it and keeps
+    reopening it with exponential backoff until it succeeds or is stopped.
+
+    Args:
+        port (str): The serial device of the glove, e.g. /dev/rfcomm0.
+
+        bluetooth (bool): Ask the glove to stream over bluetooth instead of USB.
+
+        on_frames (callable): Optionally called with each list of frames decoded from a read.
+
+        device: An open serial port to read instead of opening `port`, such as a
+            recorder.ReplaySerial. The thread ends once a replay raises EOFError.
+
+        recorder (recorder.SessionRecorder): Optionally records every decoded frame.
+
+        reconnect (bool): Reopen the port after errors. If False, errors end the thread and
+            a port that cannot be opened raises from the constructor.
+
+        min_backoff (float): Seconds before the first reconnection attempt.
+
+        max_backoff (float): Longest wait between reconnection attempts.
+    """
+
+    def __init__(self, port, bluetooth=True, on_frames=None, device=None, recorder=None,
+                 reconnect=True, min_backoff=0.5, max_backoff=10.0):
+        threading.Thread.__init__(self)
+
+        self.port = port
+        self.bluetooth = bluetooth
+        self.on_frames = on_frames
+        self.recorder = recorder
+        self.reconnect = reconnect and device is None
+        self._owns_port = device is None
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.decoder = FrameDecoder()
+        self.rings = {
+            FRAME_ID_SENSOR: FrameRing(),
+            FRAME_ID_IMU: FrameRing(),
+        }
+        self.queues = []
+
+        self._stopping = threading.Event()
+        self._wake_read, self._wake_write = os.pipe()
+        self.connects = 0
+        self.errors = 0
+        self.last_error = None
+        self.bytes_read = 0
+
+        self.glove = device
+        if device is None:
+            try:
+                self.open()
+            except (serial.SerialException, OSError) as error:
+                if not self.reconnect:
+                    raise
+                # run() keeps trying.
+                self.last_error = error
+
+    def open(self):
+        """ Open the serial port. """
+        device = serial.Serial()
+        device.baudrate = GLOVE_BAUDRATE
+        device.port = self.port
+        # Reads only happen once the selector reports bytes, so never wait in read().
+        device.timeout = 0
+        device.open()
+        self.glove = device
+        self.decoder.reset()
+        self.connects += 1
+
+    @property
+    def connected(self):
+        return self.glove is not None and self.glove.is_open
+
+    def subscribe(self, maxsize=1024, overflow=OVERFLOW_DROP_OLDEST, frame_ids=None):
+        """
+        Return a FrameQueue that receives every decoded frame from now on.
+
+        Args:
+            maxsize (int): Frames held before the overflow policy applies.
+
+            overflow (str): One of frame_ring.OVERFLOW_POLICIES. OVERFLOW_BLOCK stalls the
+                reader (and with it every other consumer) until the queue has room.
+
+            frame_ids (tuple): Only queue frames with these ids, e.g. (FRAME_ID_IMU,).
+        """
+        frames = FrameQueue(maxsize, overflow)
+        frames.frame_ids = frozenset(frame_ids) if frame_ids is not None else None
+        self.queues.append(frames)
+        return frames
+
+    def handle_frames(self, frames):
+        stamp = time.monotonic()
+        rings = self.rings
+        for frame in frames:
+            ring = rings.get(frame[0])
+            if ring is not None:
+                ring.publish(frame, stamp)
+        for ring in rings.values():
+            ring.notify()
+        # Queues subscribed to the same frame ids share one filtered list.
+        selected = {}
+        for frames_queue in self.queues:
+            ids = frames_queue.frame_ids
+            items = selected.get(ids)
+            if items is None:
+                items = selected[ids] = [(frame, stamp) for frame in frames
+                                         if ids is None or frame[0] in ids]
+            frames_queue.put_many(items)
+        if self.recorder:
+            self.recorder.record(frames, stamp)
+        if self.on_frames:
+            self.on_frames(frames)
+
+    def register_metrics(self, registry=REGISTRY, **labels):
+        """
+        Export the listener's counters from `registry`, labelled with the device unless
+        other labels are given. Returns the collector, for registry.remove_collector().
+        """
+        labels.setdefault('device', self.port)
+        return registry.add_collector(lambda: self.collect_metrics(labels))
+
+    def collect_metrics(self, labels):
+        yield Sample('glove_bytes_total', 'counter', 'Bytes read from the glove', labels, self.bytes_read)
+        for frame_id, ring in self.rings.items():
+            frame_labels = dict(labels, frame_id=str(frame_id))
+            yield Sample('glove_frames_total', 'counter', 'Frames decoded', frame_labels, ring.seq)
+            yield Sample('glove_ring_dropped_total', 'counter', 'Frames too large for their ring',
+                         frame_labels, ring.dropped)
+        yield Sample('glove_queue_dropped_total', 'counter', 'Frames dropped by full subscriber queues',
+                     labels, sum(frames_queue.dropped for frames_queue in self.queues))
+        yield Sample('glove_frames_corrupt_total', 'counter', 'Frames dropped for a bad id or length',
+                     labels, self.decoder.corrupt)
+        yield Sample('glove_resyncs_total', 'counter', 'Times bytes were skipped to find a start byte',
+                     labels, self.decoder.resyncs)
+        yield Sample('glove_connects_total', 'counter', 'Times the serial port was opened', labels,
+                     self.connects)
+        yield Sample('glove_errors_total', 'counter', 'Serial errors that closed the port', labels,
+                     self.errors)
+        yield Sample('glove_connected', 'gauge', 'Whether the serial port is open', labels,
+                     int(self.connected))
+
+    def start_streaming(self):
+        """ Ask the glove to start sending frames. """
+        self.glove.write(CMD_DATA_ON)
+        if self.bluetooth:
+            self.glove.write(CMD_BLUETOOTH_MODE)
+        else:
+            self.glove.write(CMD_USB_MODE)
+
+    def read_available(self):
+        """ Read and decode whatever the driver has buffered. """
+        chunk = self.glove.read(self.glove.in_waiting or 1)
+        if chunk:
+            self.bytes_read += len(chunk)
+            frames = self.decoder.feed(chunk)
+            if frames:
+                self.handle_frames(frames)
+
+    def run(self):
+        backoff = self.min_backoff
+        while not self._stopping.is_set():
+            if not self.connected:
+                try:
+                    self.open()
+                except (serial.SerialException, OSError) as error:
+                    self.last_error = error
+                    if not self.reconnect or self._stopping.wait(backoff):
+                        break
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+            bytes_before = self.bytes_read
+            try:
+                self.start_streaming()
+                self._read_until_stopped()
+            except EOFError:
+                # A replayed recording ran out, there is nothing to reconnect to.
+                break
+            except (serial.SerialException, OSError) as error:
+                self.errors += 1
+                self.last_error = error
+                self._close_port()
+                if not self.reconnect:
+                    break
+                # A port that opens but fails before delivering anything (e.g. an rfcomm
+                # node whose link is down) must not be retried in a tight loop.
+                if self.bytes_read > bytes_before:
+                    backoff = self.min_backoff
+                if self._stopping.wait(backoff):
+                    break
+                backoff = min(backoff * 2, self.max_backoff)
+        self._close_port()
+        for frames_queue in self.queues:
+            frames_queue.close()
+
+    def _read_until_stopped(self):
+        try:
+            fileno = self.glove.fileno()
+        except (AttributeError, ValueError):
+            # Not a real port (e.g. a ReplaySerial): its read() does the waiting, unless
+            # it is non-blocking, then poll rather than spin while nothing is due.
+            while not self._stopping.is_set():
+                bytes_before = self.bytes_read
+                self.read_available()
+                if self.bytes_read == bytes_before:
+                    self._stopping.wait(REPLAY_POLL)
+            return
+
+        selector = selectors.DefaultSelector()
+        selector.register(fileno, selectors.EVENT_READ)
+        selector.register(self._wake_read, selectors.EVENT_READ)
+        try:
+            while not self._stopping.is_set():
+                for key, _ in selector.select():
+                    if key.fd == fileno:
+                        self.read_available()
+        finally:
+            selector.close()
+
+    def _close_port(self):
+        if self.glove is not None and self._owns_port:
+            try:
+                self.glove.close()
+            except (serial.SerialException, OSError):
+                pass
+
+    def stop(self, timeout=None):
+        """ Stop reading, close the port and wait for the thread to exit. """
+        self._stopping.set()
+        for frames_queue in self.queues:
+            frames_queue.close()
+        if self._wake_write is not None:
+            os.write(self._wake_write, b'x')
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        self._close_port()
+        if not self.is_alive() and self._wake_write is not None:
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+            self._wake_read = self._wake_write = None
+
+    close = stop
+
+    def attach(self, loop):
+        """
+        Read the glove from an asyncio event loop instead of starting the thread.
+
+        The port is switched to non-blocking mode and decoded whenever its file
+        descriptor becomes readable, so the glove and AsyncHTTPClient share one loop.
+        """
+        if not self.connected:
+            raise IOError('glove on {} is not open: {}'.format(self.port, self.last_error))
+        self.glove.timeout = 0
+        self.start_streaming()
+        loop.add_reader(self.glove.fileno(), self.read_available)
+
+    def detach(self, loop):
+        loop.remove_reader(self.glove.fileno())
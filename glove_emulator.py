@@ -0,0 +1,149 @@
+"""
+Simulated BeBop glove on a pseudo-terminal, for running the glove pipeline without hardware.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import select
+import threading
+import time
+import tty
+
+from glove import CMD_DATA_ON, FRAME_END, FRAME_ID_IMU, FRAME_ID_SENSOR, FRAME_START
+from imu import encode_quaternions
+
+
+# Finger flex values (thumb, index, middle, ring, pinky) that poses.json classifies as each pose.
+FINGER_POSES = {
+    None: (0, 0, 0, 0, 0),
+    'fist': (60, 160, 160, 160, 160),
+    'thumbsup': (0, 160, 160, 160, 160),
+    'peace': (60, 0, 0, 160, 160),
+    'hookem': (60, 0, 160, 160, 0),
+    'four': (200, 0, 0, 0, 0),
+}
+
+# Open hand and a couple of skill changes, so a run never waits on takeoff or landing.
+DEFAULT_SCRIPT = ((None, 0.5), ('peace', 1.0), (None, 0.5), ('hookem', 1.0))
+
+BATTERY_LEVEL = 100
+
+IMU_IDENTITY = encode_quaternions([[1.0, 0.0, 0.0, 0.0]])[0].tobytes()
+
+
+def finger_frame(pose):
+    """ Wire bytes of a finger frame holding the flex values of a pose. """
+    sensors = []
+    for flex in FINGER_POSES[pose]:
+        # Each finger is the sum of two 7 bit sensors.
+        sensors += [flex // 2, flex - flex // 2]
+    return bytes(bytearray([FRAME_START, FRAME_ID_SENSOR, 11] + sensors + [BATTERY_LEVEL, FRAME_END]))
+
+
+def imu_frame():
+    return bytes(bytearray([FRAME_START, FRAME_ID_IMU, 12])) + IMU_IDENTITY + bytes(bytearray([FRAME_END]))
+
+
+class GloveEmulator(object):
+    """
+    Stream glove frames into a pty that GloveSerialListener can open like the real port.
+
+    Like the glove, nothing is sent until the data-on command arrives. From then on,
+    finger frames follow `script`, a sequence of (pose, seconds) repeated until stopped,
+    and IMU frames are interleaved at their own rate. The monotonic time at which each
+    pose started is appended to `pose_starts`.
+
+    Args:
+        rate (float): Finger frames per second.
+
+        imu_rate (float): IMU frames per second, 0 for none.
+
+        script (tuple): (pose, seconds) pairs, pose being a key of FINGER_POSES.
+
+        response_delay (float): Seconds between the data-on command and the first frame,
+            like a glove waking up its radio.
+    """
+
+    def __init__(self, rate=100.0, imu_rate=100.0, script=DEFAULT_SCRIPT, response_delay=0.0):
+        self.rate = rate
+        self.imu_rate = imu_rate
+        self.script = script
+        self.response_delay = response_delay
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # A reader that falls behind loses frames, as with the real serial link.
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.pose_starts = []
+        self.frames_sent = 0
+        self.overruns = 0
+        self.streaming = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _wait_for_data_on(self):
+        received = bytearray()
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if readable:
+                received += os.read(self.master, 64)
+                if CMD_DATA_ON in received:
+                    self.streaming.set()
+                    return True
+        return False
+
+    def _run(self):
+        if not self._wait_for_data_on() or self._stop.wait(self.response_delay):
+            return
+        frames = dict((pose, finger_frame(pose)) for pose in FINGER_POSES)
+        imu = imu_frame()
+        script_length = sum(seconds for _, seconds in self.script)
+
+        start = time.monotonic()
+        sent = 0
+        imu_sent = 0
+        segment = None
+        while not self._stop.is_set():
+            due = start + sent / self.rate
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            offset = (due - start) % script_length
+            for index, (pose, seconds) in enumerate(self.script):
+                if offset < seconds:
+                    break
+                offset -= seconds
+            cycle = int((due - start) // script_length)
+            if (cycle, index) != segment:
+                segment = (cycle, index)
+                self.pose_starts.append((time.monotonic(), pose))
+
+            out = frames[pose]
+            if self.imu_rate:
+                while imu_sent < (due - start) * self.imu_rate:
+                    out += imu
+                    imu_sent += 1
+            try:
+                os.write(self.master, out)
+            except BlockingIOError:
+                self.overruns += 1
+            except OSError:
+                return
+            sent += 1
+            self.frames_sent = sent + imu_sent
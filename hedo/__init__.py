@@ -0,0 +1,8 @@
+"""
+H.E.D.O. Hyper Enabled Drone Operator: fly a Skydio drone with a BeBop Commander Glove.
+
+Run from the repository root with:
+    python -m hedo --device /dev/rfcomm0 --url http://192.168.10.1
+
+See hedo/cli.py for the modes and options.
+"""
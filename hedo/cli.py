@@ -0,0 +1,286 @@
+"""
+Command line entry point: connect to the vehicle and the glove, then fly.
+
+Usage:
+    python -m hedo [--device DEVICE] [--url URL] [--mode {gestures,control,sessions}]
+
+Modes:
+    gestures: hand poses trigger takeoff, landing and skills, see http_client.py.
+    control: tilting the hand flies the RemoteControl skill, see motion_control.py.
+    sessions: several gloves each drive their own vehicle, see session_manager.py.
+
+Only the standard library is imported up front, each mode imports what it needs. The
+vehicle authentication and the glove handshake run at the same time, so startup takes
+as long as the slower of the two rather than their sum.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import importlib
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_DEVICE = '/dev/rfcomm0'
+DEFAULT_URL = 'http://192.168.10.1'
+DEFAULT_SKILL_KEY = 'remote.RemoteControl'
+MODES = ('gestures', 'control', 'sessions')
+
+# [s] Longest wait for the glove's first frame before carrying on without it.
+FIRST_FRAME_TIMEOUT = 10.0
+
+# Startup stages in the order they are reported.
+STARTUP_STAGES = ('import http_client', 'auth', 'import glove', 'open glove', 'first frame', 'ready')
+
+
+def timed(timings, name, func, *args, **kwargs):
+    """ Call func and store how long it took in timings[name], in seconds. """
+    start = time.monotonic()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timings[name] = time.monotonic() - start
+
+
+def in_background(func, *args):
+    """ Call func on a daemon thread, so a glove that never answers can't hold up exiting. """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args))
+        except BaseException as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+
+    thread = threading.Thread(target=run)
+    thread.setDaemon(True)
+    thread.start()
+    return future
+
+
+def connect_vehicle(url, timings, token_file=None):
+    """ Import the HTTP client and authenticate with the vehicle as pilot. """
+    http_client = timed(timings, 'import http_client', importlib.import_module, 'http_client')
+    return timed(timings, 'auth', http_client.HTTPClient, url, pilot=True, token_file=token_file,
+                 stream_settings=http_client.stream_settings)
+
+
+def connect_glove(device, timings, bluetooth=True, first_frame_timeout=FIRST_FRAME_TIMEOUT):
+    """
+    Open the glove, ask it to stream and wait for its first finger frame.
+
+    A glove that isn't there yet is not an error: the listener keeps reconnecting, and
+    the modes wait for frames anyway.
+    """
+    glove = timed(timings, 'import glove', importlib.import_module, 'glove')
+    listener = timed(timings, 'open glove', glove.GloveSerialListener, device, bluetooth=bluetooth)
+    listener.setDaemon(True)
+    listener.start()
+    if not timed(timings, 'first frame', listener.rings[glove.FRAME_ID_SENSOR].wait, 0,
+                 first_frame_timeout):
+        print("No frames from the glove on {} yet, carrying on".format(device))
+    return listener
+
+
+def start_up(args, timings=None, parallel=True):
+    """
+    Connect to the vehicle and the glove described by the command line arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed by parse_args().
+
+        timings (dict): Filled with the duration of each of STARTUP_STAGES, in seconds.
+
+        parallel (bool): Do the glove handshake while authenticating, rather than after.
+
+    Returns:
+        tuple: the HTTPClient, the running GloveSerialListener and the timings.
+    """
+    timings = {} if timings is None else timings
+    start = time.monotonic()
+    bluetooth = not args.usb
+    if parallel:
+        glove = in_background(connect_glove, args.device, timings, bluetooth, args.glove_timeout)
+        try:
+            client = connect_vehicle(args.url, timings, args.token_file)
+        except BaseException:
+            # Don't leave the glove streaming once its handshake finishes.
+            glove.add_done_callback(lambda future: future.exception() or future.result().close())
+            raise
+        listener = glove.result()
+    else:
+        client = connect_vehicle(args.url, timings, args.token_file)
+        listener = connect_glove(args.device, timings, bluetooth, args.glove_timeout)
+    timings['ready'] = time.monotonic() - start
+    return client, listener, timings
+
+
+def format_timings(timings):
+    return 'startup: ' + ', '.join('{} {:.0f}ms'.format(stage, 1000 * timings[stage])
+                                   for stage in STARTUP_STAGES if stage in timings)
+
+
+def run_gestures(client, listener):
+    """ Dispatch a command for each recognized pose until interrupted. """
+    from gestures import GestureLoop
+    from glove import FRAME_ID_SENSOR
+    from http_client import make_dispatcher, pose_commands, pose_dispatch, start_update_loop
+
+    start_update_loop(client)
+    dispatcher = make_dispatcher()
+    dispatcher.start()
+
+    # Classify each finger frame as it arrives instead of polling.
+    gesture_loop = GestureLoop(listener.rings[FRAME_ID_SENSOR],
+                               pose_dispatch(dispatcher, pose_commands(client)))
+    gesture_loop.register_metrics()
+    try:
+        gesture_loop.run()
+    except KeyboardInterrupt:
+        print(gesture_loop.report())
+        print(client.latency_report())
+    finally:
+        dispatcher.stop(timeout=1)
+
+
+def run_control(client, listener, skill_key=DEFAULT_SKILL_KEY, rate=30.0, report_period=10.0,
+                telemetry=None):
+    """ Fly the RemoteControl skill from the hand's orientation until interrupted. """
+    from glove import FRAME_ID_IMU, FRAME_ID_SENSOR
+    from http_client import start_update_loop
+    from imu import OrientationStream
+    from motion_control import ContinuousControl
+    from udp_control import MotionCommandSender
+
+    client.set_skill(skill_key)
+    start_update_loop(client)
+    control = ContinuousControl(MotionCommandSender.for_vehicle(client),
+                                OrientationStream(listener.rings[FRAME_ID_IMU]),
+                                listener.rings[FRAME_ID_SENSOR], rate=rate)
+    control_thread = threading.Thread(target=control.run)
+    control_thread.start()
+    try:
+        while True:
+            control_thread.join(report_period)
+            if not control_thread.is_alive():
+                print("Control stopped unexpectedly, exiting")
+                break
+            print(control.report())
+            if telemetry:
+                print(telemetry.format())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Stopping sends a zero command, so the vehicle hovers.
+        control.stop()
+        control_thread.join()
+        print(control.report())
+
+
+def start_telemetry(listener, client=None, skill_key=DEFAULT_SKILL_KEY, period=1.0):
+    """ Follow the glove's battery and link quality, sending it to the skill if a client is given. """
+    from comms_batch import CustomCommsBatcher
+    from link_telemetry import LinkTelemetry
+
+    batcher = CustomCommsBatcher(client, skill_key).start() if client else None
+    telemetry = LinkTelemetry(listener, batcher, publish_period=period).start()
+    telemetry.register_metrics()
+    return telemetry
+
+
+def stop_telemetry(telemetry):
+    telemetry.stop(timeout=1)
+    if telemetry.batcher:
+        telemetry.batcher.stop(timeout=1)
+
+
+def start_metrics(args):
+    """ Start the metrics exporters asked for on the command line. Returns them. """
+    if args.metrics_port is None and not args.metrics_json:
+        return []
+    from metrics import JsonDumper, MetricsServer
+
+    exporters = []
+    if args.metrics_port is not None:
+        exporters.append(MetricsServer(port=args.metrics_port).start())
+        print("Serving metrics on port {}".format(exporters[-1].port))
+    if args.metrics_json:
+        exporters.append(JsonDumper(args.metrics_json, period=args.metrics_period).start())
+    return exporters
+
+
+def stop_metrics(exporters):
+    for exporter in exporters:
+        exporter.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='hedo', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--device', default=DEFAULT_DEVICE, help='serial device of the glove')
+    parser.add_argument('--url', default=DEFAULT_URL, help='vehicle url')
+    parser.add_argument('--mode', choices=MODES, default='gestures', help='how the glove flies the vehicle')
+    parser.add_argument('--usb', action='store_true', help='the glove is connected over USB')
+    parser.add_argument('--token-file', help='file holding the auth token, needed for the simulator')
+    parser.add_argument('--glove-timeout', type=float, default=FIRST_FRAME_TIMEOUT,
+                        help='seconds to wait for the first glove frame at startup')
+    parser.add_argument('--skill-key', default=DEFAULT_SKILL_KEY,
+                        help='key of the RemoteControl skill, for control mode')
+    parser.add_argument('--rate', type=float, default=30.0,
+                        help='commands per second, for control mode')
+    parser.add_argument('--pair', action='append', metavar='DEVICE=URL',
+                        help='a glove and the vehicle it controls, for sessions mode (repeat for each)')
+    parser.add_argument('--report-period', type=float, default=10.0,
+                        help='seconds between reports, for control and sessions modes')
+    parser.add_argument('--metrics-port', type=int,
+                        help='serve metrics at /metrics (Prometheus) and /metrics.json on this port')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                        help='append a JSON metrics snapshot to this file periodically')
+    parser.add_argument('--metrics-period', type=float, default=5.0,
+                        help='seconds between JSON metrics snapshots')
+    parser.add_argument('--telemetry-period', type=float, default=1.0,
+                        help='seconds between glove battery and link reports to the skill, for control mode')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    exporters = start_metrics(args)
+
+    if args.mode == 'sessions':
+        from session_manager import parse_pair, run_sessions
+        try:
+            pairs = [parse_pair(pair) for pair in args.pair or ['{}={}'.format(args.device, args.url)]]
+        except argparse.ArgumentTypeError as error:
+            sys.exit('hedo: {}'.format(error))
+        try:
+            run_sessions(pairs, bluetooth=not args.usb, report_period=args.report_period)
+        finally:
+            stop_metrics(exporters)
+        return
+
+    #Create Client
+    from vehicle_api import PilotRefused
+    try:
+        client, listener, timings = start_up(args)
+    except(IOError, OSError, PilotRefused):
+        print("Failed to connect to drone! Exiting...")
+        sys.exit(1)
+    print(format_timings(timings))
+    client.register_metrics()
+    listener.register_metrics()
+    # Only the RemoteControl skill of control mode takes the telemetry.
+    telemetry = start_telemetry(listener, client if args.mode == 'control' else None, args.skill_key,
+                                args.telemetry_period)
+
+    try:
+        if args.mode == 'control':
+            run_control(client, listener, args.skill_key, args.rate, args.report_period, telemetry)
+        else:
+            run_gestures(client, listener)
+    finally:
+        stop_telemetry(telemetry)
+        listener.close(timeout=1)
+        stop_metrics(exporters)
@@ -12,22 +12,24 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import base64
+import collections
 import json
 import os
 import requests
 import sys
 import threading
 import time
-import serial
-import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from uuid import uuid4
 
-try:
-    # Python 3
-    from urllib.parse import urlparse
-except ImportError:
-    # Python 2
-    from urlparse import urlparse
+# The glove, gesture and imaging modules pull in serial and numpy, so they are imported
+# where they are used and a client that only sends commands starts quickly.
+from dispatcher import CommandDispatcher
+from metrics import REGISTRY, LatencyHistogram, Sample
+from vehicle_api import (DEFAULT_TIMEOUT, ENDPOINT_TIMEOUTS, FAULT_OVERRIDE_OFF, PHONE_COMMS_FAULTS,
+                         PilotRefused, api_version_at_least, authentication_request,
+                         custom_comms_request, endpoint_name, pilot_status_request, udp_link_address, StatusCache)
 
 
 def fmt_out(fmt, *args, **kwargs):
@@ -69,40 +71,63 @@ class HTTPClient(object):
 
         stream_settings (dict): Configuration for receiving an RTP video stream.
             This feature is coming soon to R1 and will not work in the simulator.
+
+        timeouts (dict): Per-endpoint overrides of ENDPOINT_TIMEOUTS, in seconds.
+
+        retries (int): Number of times to retry a request that could not connect.
+            Requests that reached the vehicle are never resent.
+
+        pool_size (int): Number of keep-alive connections to hold open to the vehicle.
+
+        status_max_age (float): Seconds a cached status response may be reused by get_status.
     """
 
-    def __init__(self, baseurl, client_id=None, pilot=False, token_file=None, stream_settings=None):
+    def __init__(self, baseurl, client_id=None, pilot=False, token_file=None, stream_settings=None,
+                 timeouts=None, retries=2, pool_size=4, status_max_age=1.0):
         self.client_id = client_id or str(uuid4())
         self.baseurl = baseurl
         self.access_token = None
         self.session_id = None
         self.access_level = None
         self.stream_settings = stream_settings
+        self.timeouts = dict(ENDPOINT_TIMEOUTS, **(timeouts or {}))
+        self.latency = {}
+        # Failed requests per endpoint, and failed pings of the status loop.
+        self.errors = collections.Counter()
+        self.status_loop_errors = 0
+        self.status_cache = StatusCache(self._fetch_pilot_status, status_max_age)
+        self._image_buffer = None
+
+        # Reuse connections to the vehicle instead of opening one per request.
+        retry = Retry(total=retries, connect=retries, read=0, redirect=0, status=0,
+                      backoff_factor=0.05)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json', 'Connection': 'keep-alive'})
+
         self._authenticate(pilot, token_file)
 
     def _authenticate(self, pilot=False, token_file=None):
         """ Request an access token from the vehicle. If using a sim, a token_file is required. """
-        request = {
-            'client_id': self.client_id,
-            'requested_level': (8 if pilot else 4),
-            'commandeer': True,
-        }
-
+        token = None
         if token_file:
             if not os.path.exists(token_file):
                 fmt_err("Token file does not exist: {}\n", token_file)
-                sys.exit(1)
+                raise IOError('Token file does not exist: {}'.format(token_file))
 
             with open(token_file, 'r') as tokenf:
                 token = tokenf.read()
-                request['credentials'] = token.strip()
 
+        request = authentication_request(self.client_id, pilot, token)
         response = self.request_json('authentication', request)
         self.access_level = response.get('accessLevel')
         if pilot and self.access_level != 'PILOT':
             fmt_err("Did not successfully auth as pilot\n")
-            sys.exit(1)
+            raise PilotRefused('Did not successfully auth as pilot')
         self.access_token = response.get('accessToken')
+        self.session.headers['Authorization'] = 'Bearer {}'.format(self.access_token)
         fmt_out("Received access token:\n{}\n", self.access_token)
 
     def update_skillsets(self, user_email, api_url=None):
@@ -130,13 +155,14 @@ class HTTPClient(object):
                                               vehicle_access_token=self.access_token,
                                               cloud_url=api_url)
 
-    def request_json(self, endpoint, json_data=None, timeout=20):
+    def request_json(self, endpoint, json_data=None, timeout=None):
         """ Send a GET or POST request to the vehicle and get a parsed JSON response.
 
         Args:
             endpoint (str): the path to request.
             json_data (dict): an optional JSON dictionary to send.
-            timeout (int): number of seconds to wait for a response.
+            timeout (float): number of seconds to wait for a response.
+                Defaults to the timeout configured for the endpoint.
 
         Raises:
             HTTPError: if the server responds with 4XX or 5XX status code
@@ -147,19 +173,26 @@ class HTTPClient(object):
             dict: the servers JSON response
         """
         url = '{}/api/{}'.format(self.baseurl, endpoint)
-        headers = {'Accept': 'application/json'}
-        if self.access_token:
-            headers['Authorization'] = 'Bearer {}'.format(self.access_token)
-        if json_data is not None:
-            headers['Content-Type'] = 'application/json'
-            res = requests.post(url, json=json_data, headers=headers)
-        else:
-            res = requests.get(url, headers=headers)
+        name = endpoint_name(endpoint)
+        if timeout is None:
+            timeout = self.timeouts.get(name, DEFAULT_TIMEOUT)
+
+        start = time.time()
+        try:
+            if json_data is not None:
+                res = self.session.post(url, json=json_data, timeout=timeout)
+            else:
+                res = self.session.get(url, timeout=timeout)
+        except requests.RequestException:
+            self.errors[name] += 1
+            raise
+        self.endpoint_latency(name).record(time.time() - start)
 
         try:
             res.raise_for_status()
         except requests.HTTPError as err:
-            print(err.message)
+            self.errors[name] += 1
+            print(err)
             raise
 
         if res.headers['Content-Type'] == 'application/json':
@@ -171,6 +204,38 @@ class HTTPClient(object):
             return reply['data']
         return res
 
+    def endpoint_latency(self, name):
+        """ Return the round trip LatencyHistogram for an endpoint. """
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency.setdefault(name, LatencyHistogram(name))
+        return histogram
+
+    def latency_report(self):
+        return '\n'.join(self.latency[name].format() for name in sorted(self.latency))
+
+    def register_metrics(self, registry=REGISTRY, **labels):
+        """ Export request latencies, errors and status freshness from `registry`. Returns the collector. """
+        return registry.add_collector(lambda: self.collect_metrics(labels))
+
+    def collect_metrics(self, labels):
+        for name, histogram in list(self.latency.items()):
+            yield Sample('vehicle_request_seconds', 'histogram', 'Round trip of vehicle requests',
+                         dict(labels, endpoint=name), histogram)
+        for name, count in list(self.errors.items()):
+            yield Sample('vehicle_request_errors_total', 'counter', 'Vehicle requests that failed',
+                         dict(labels, endpoint=name), count)
+        cache = self.status_cache
+        yield Sample('vehicle_status_fetches_total', 'counter', 'Status requests sent to the vehicle',
+                     labels, cache.fetches)
+        yield Sample('vehicle_status_cache_hits_total', 'counter', 'Status reads answered from the cache',
+                     labels, cache.hits)
+        yield Sample('vehicle_status_loop_errors_total', 'counter', 'Keep-alive status pings that failed',
+                     labels, self.status_loop_errors)
+        if cache.updated is not None:
+            yield Sample('vehicle_status_age_seconds', 'gauge', 'Age of the latest status response',
+                         labels, time.monotonic() - cache.updated)
+
     def send_custom_comms(self, skill_key, data, no_response=False):
         """
         Send custom bytes to the vehicle and optionally return a response
@@ -184,15 +249,10 @@ class HTTPClient(object):
             dict: a dict with metadata for the response and a 'data' field, encoded by the Skill.
         """
 
-        rpc_request = {
-            'data': base64.b64encode(data),
-            'skill_key': skill_key,
-            'no_response': no_response,  # this key is option and defaults to False
-        }
-
         # Post rpc to the server as json.
         try:
-            rpc_response = self.request_json('custom_comms', rpc_request)
+            rpc_response = self.request_json('custom_comms',
+                                             custom_comms_request(skill_key, data, no_response))
         except Exception as error:  # pylint: disable=broad-except
             fmt_err('Comms Error: {}\n', error)
             return None
@@ -203,48 +263,64 @@ class HTTPClient(object):
                 rpc_response['data'] = base64.b64decode(rpc_response['data'])
         return rpc_response
 
+    def _fetch_pilot_status(self):
+        args = pilot_status_request(self.session_id, self.stream_settings)
+        response = self.request_json('status', args)
+        self.session_id = response['sessionId']
+        return response
+
     def update_pilot_status(self):
         """ Ping the vehicle to keep session alive and get status back.
 
         The session will expire after 10 seconds of inactivity from the pilot.
         If the session expires, the video stream will stop.
         """
-        args = {
-            'inForeground': True,
-            'mediaMode': 'FLIGHT_CONTROL',
-            'recordingMode': 'VIDEO_4K_30FPS',
-            'takeoffType': 'GROUND_TAKEOFF',
-            'wouldAcceptPilot': True,
-        }
-        if self.session_id:
-            args['sessionId'] = self.session_id
-        if self.stream_settings:
-            args['streamSettings'] = self.stream_settings
-        response = self.request_json('status', args)
-        self.session_id = response['sessionId']
-        return response
+        return self.status_cache.get(max_age=0)
+
+    def get_status(self, max_age=None):
+        """ Get the vehicle status, reusing a response younger than max_age seconds.
+
+        Concurrent callers share a single request to the vehicle.
+        """
+        return self.status_cache.get(max_age)
+
+    def subscribe_flight_phase(self, callback):
+        """ Call `callback(phase)` whenever the flight phase changes. Returns an unsubscribe function. """
+        return self.status_cache.subscribe(callback)
+
+    def takeoff(self, cancel=None, on_phase=None):
+        """ Request takeoff. Blocks until flying.
+
+        Args:
+            cancel (threading.Event): Stop waiting for takeoff as soon as this is set.
+            on_phase (callable): Called with each new flight phase while waiting.
 
-    def takeoff(self):
-        """ Request takeoff. Blocks until flying. """
+        Returns:
+            bool: True once flying, False if cancelled or not pilot.
+        """
         if self.access_level != 'PILOT':
             fmt_err('Cannot takeoff: not pilot\n')
-            return
+            return False
+        cancel = cancel or threading.Event()
 
         self.update_pilot_status()
         self.disable_faults()
 
-        while True:
-            time.sleep(5)  # downsample to prevent spamming the endpoint
-            phase = self.update_pilot_status().get('flightPhase')
+        last_phase = None
+        while not cancel.wait(5):  # downsample to prevent spamming the endpoint
+            phase = self.get_status().get('flightPhase')
             if not phase:
                 continue
+            if on_phase and phase != last_phase:
+                on_phase(phase)
+            last_phase = phase
             #fmt_out('flight phase = {}\n', phase)
             if phase == 'READY_FOR_GROUND_TAKEOFF':
                 fmt_out('Publishing ground takeoff\n')
                 self.request_json('async_command', {'command': 'ground_takeoff'})
             elif phase == 'FLYING':
                 fmt_out('Flying.\n')
-                return
+                return True
             elif phase == 'REST':
                 fmt_out('on standby\n')
             elif phase == 'FLIGHT_PROCESSES_CHECK':
@@ -257,22 +333,36 @@ class HTTPClient(object):
             else:
                 # print the active faults, remove after debug
                 fmt_out('Faults = {}\n', ','.join(self.get_blocking_faults()))
+        return False
+
+    def land(self, cancel=None, on_phase=None):
+        """ Land the vehicle. Blocks until on the ground.
 
-    def land(self):
-        """ Land the vehicle. Blocks until on the ground. """
+        Args:
+            cancel (threading.Event): Stop re-sending the land command as soon as this is set.
+            on_phase (callable): Called with each new flight phase while waiting.
+
+        Returns:
+            bool: True once landed, False if cancelled or not pilot.
+        """
         if self.access_level != 'PILOT':
             fmt_err('Cannot land: not pilot\n')
-            return
+            return False
+        cancel = cancel or threading.Event()
 
         phase = 'FLYING'
         while phase == 'FLYING':
             fmt_out('Sending LAND\n')
             self.request_json('async_command', {'command': 'land'})
-            time.sleep(1)
+            if cancel.wait(1):
+                return False
             new_phase = self.update_pilot_status().get('flightPhase')
             if not new_phase:
                 continue
+            if on_phase and new_phase != phase:
+                on_phase(new_phase)
             phase = new_phase
+        return True
 
     def set_skill(self, skill_key):
         """ Request a specific skill to be active. """
@@ -289,85 +379,108 @@ class HTTPClient(object):
 
     def disable_faults(self):
         """ Tell the vehicle to ignore missing phone info. """
-        faults = {
-            # These faults occur if phone isn't connected via UDP
-            'LOST_PHONE_COMMS_SHORT': 2,
-            'LOST_PHONE_COMMS_LONG': 3,
-        }
-        for _, fault_id in faults.items():
-            self.request_json('set_fault_override/{}'.format(fault_id),
-                              {'override_on': True, 'fault_active': False})
+        for _, fault_id in PHONE_COMMS_FAULTS.items():
+            self.request_json('set_fault_override/{}'.format(fault_id), FAULT_OVERRIDE_OFF)
 
     def check_min_api_version(self, major=18.0, minor=5.0):
-        info = self.request_json('status')['config']['deployInfo']
-        return info.get('api_version_major') >= major and info.get('api_version_minor') >= minor
+        return api_version_at_least(self.get_status()['config'], major, minor)
 
     def get_udp_link_address(self):
         """ Get the dynamic port and hostname for the udp link. """
-        resp = self.request_json('status')['config']
-        udp_hostname = resp.get('lcmProxyUdpHostname')
-        if not udp_hostname:
-            udp_hostname = urlparse(self.baseurl).netloc.split(':')[0]
-        udp_port = resp.get('lcmProxyUdpPort')
-        return (udp_hostname, udp_port)
+        return udp_link_address(self.get_status()['config'], self.baseurl)
 
-    def save_image(self, filename):
+    def fetch_image_metadata(self):
+        """ Fetch the metadata for the latest color image, or None if there is none. """
+        data = self.request_json('channel/SUBJECT_CAMERA_RIG_NATIVE')
+        images = data['json']['images']
+        if not images:
+            return None
+        return images[0]
+
+    def download_image(self, image, buf=None):
         """
-        Fetch raw image data from the vehicle and and save it as png, using opencv.
+        Download the raw pixel data of an image from the vehicle's shared memory.
+
+        Note that this is not a high-speed image api, as it uses uncompressed
+        image data over HTTP.
+
+        Args:
+            image (dict): Metadata from fetch_image_metadata.
+            buf (bytearray): Optional buffer to download into, reused across calls if given.
+
+        Returns:
+            bytearray: the buffer holding the pixel data.
+        """
+        from imaging import image_num_bytes, read_into
+
+        num_bytes = image_num_bytes(image)
+        if num_bytes is None:
+            raise ValueError('Unsupported pixelformat {}'.format(image['pixelformat']))
+        if buf is None or len(buf) < num_bytes:
+            buf = bytearray(num_bytes)
+        url = '{}/shm{}'.format(self.baseurl, image['data'])
+        res = self.session.get(url, stream=True, timeout=self.timeouts.get('shm', DEFAULT_TIMEOUT))
+        try:
+            res.raise_for_status()
+            read_into(res.raw, buf, num_bytes)
+        finally:
+            res.close()
+        return buf
+
+    def fetch_image(self):
+        """
+        Fetch the latest color image from the vehicle as a BGR numpy array.
 
         If you need to continuously fetch images from the vehicle, consider using RTP instead.
+
+        Returns:
+            tuple: the BGR array (or None if no image is available) and a dict of stage
+                timings in milliseconds.
         """
-        import cv2
-        import numpy
+        from imaging import decode_image, image_num_bytes
 
+        timing = {}
         t1 = time.time()
-        # Fetch the image metadata for the latest color image.
-        data = self.request_json('channel/SUBJECT_CAMERA_RIG_NATIVE')
+        image = self.fetch_image_metadata()
         t2 = time.time()
-        fmt_out('Got metadata in {}ms\n', int(1000 * (t2 - t1)))
-        images = data['json']['images']
-        if not images:
-            return
+        timing['metadata_ms'] = 1000 * (t2 - t1)
+        if image is None:
+            return None, timing
 
-        # Download the raw pixel data from the vehicle's shared memory.
-        # Note that this is not a high-speed image api, as it uses uncompressed
-        # image data over HTTP.
-        image = images[0]
-        image_path = image['data']
-        url = '{}/shm{}'.format(self.baseurl, image_path)
-        try:
-            res = requests.get(url)
-            image_data = res.content
-        except requests.HTTPError as err:
-            fmt_err('Got error for url {} {}\n', image_path, err)
-            return
+        self._image_buffer = self.download_image(image, self._image_buffer)
         t3 = time.time()
-        fmt_out('Got image data in {}ms\n', int(1000 * (t3 - t2)))
-
-        # Convert and save as a PNG
-        pixfmt = image['pixelformat']
-        PIXELFORMAT_YUV = 1009
-        PIXELFORMAT_RGB = 1002
-        if pixfmt == PIXELFORMAT_YUV:
-            bytes_per_pixel = 2
-            conversion_format = cv2.COLOR_YUV2BGR_UYVY
-        elif pixfmt == PIXELFORMAT_RGB:
-            bytes_per_pixel = 3
-            conversion_format = cv2.COLOR_RGB2BGR
-        else:
-            fmt_err('Unsupported pixelformat {}\n', pixfmt)
-            return
-        width = image['width']
-        height = image['height']
-        num_bytes = width * height * bytes_per_pixel
-        input_array = numpy.array([numpy.uint8(ord(c)) for c in image_data[:num_bytes]])
-        input_array.shape = (height, width, bytes_per_pixel)
-        bgr_array = cv2.cvtColor(input_array, conversion_format)
-        cv2.imwrite(filename, bgr_array)
-        t4 = time.time()
-        fmt_out('Saved image in {}ms\n', int(1000 * (t4 - t3)))
+        timing['download_ms'] = 1000 * (t3 - t2)
+        timing['bytes'] = image_num_bytes(image)
+
+        bgr_array = decode_image(self._image_buffer, image['width'], image['height'],
+                                 image['pixelformat'])
+        timing['decode_ms'] = 1000 * (time.time() - t3)
+        return bgr_array, timing
 
-        return filename
+    def save_image(self, filename):
+        """
+        Fetch raw image data from the vehicle and save it as png or jpeg, using opencv.
+
+        The image format follows the extension of filename.
+
+        Returns:
+            numpy.ndarray: the BGR image that was saved, or None on failure.
+        """
+        import cv2
+
+        try:
+            bgr_array, timing = self.fetch_image()
+        except (requests.RequestException, IOError, ValueError) as err:
+            fmt_err('Failed to fetch image: {}\n', err)
+            return None
+        if bgr_array is None:
+            return None
+
+        t1 = time.time()
+        cv2.imwrite(filename, bgr_array)
+        timing['write_ms'] = 1000 * (time.time() - t1)
+        fmt_out('image {}\n', json.dumps(dict(timing, filename=filename), sort_keys=True))
+        return bgr_array
 
     def set_run_mode(self, mode_name, set_default=False):
         if set_default:
@@ -380,142 +493,82 @@ class HTTPClient(object):
         })
         print(resp)
 
-data = []
-
-class GloveSerialListener(threading.Thread):
-    def __init__(self, port):
-        threading.Thread.__init__(self)
-
-        self.glove = serial.Serial()
-        self.glove.baudrate = 460800
-        self.glove.port = '/dev/rfcomm0'
-        self.glove.timeout = 1
-        self.glove.open()
-
-        self.data = []
-        self.data_shared = []
-
-    def parse(self, byte_to_parse):
-        global data
-
-        b = int.from_bytes(byte_to_parse, byteorder='big')
-        #print(b)
-        if b == 240:
-            self.data = []
-        elif b == 247:
-            self.data.append(b)
-
-            #might need some thread saftey here
-            data = self.data
-
-        else:
-            self.data.append(b)
-
-    def run(self):
-
-        global data
-
-        if self.glove.is_open:
-            # data on
-            self.glove.write(bytearray([176, 115, 1]))
-
-            # usb mode
-            #self.glove.write(bytearray([176, 118, 1]))
-
-            # bluetooth mode
-            self.glove.write(bytearray([176, 118, 2]))
-
-            while True:
-                self.parse(self.glove.read())
-
-        else:
-            self.close()
-
 #Setup
 stream_settings = {'source': 'NATIVE', 'port': 55004}
 
-#Create Client
-try:
-    client = HTTPClient('http://192.168.10.1',
-                    pilot=True,
-                    token_file=0,
-                    stream_settings=stream_settings)
-except(OSError):
-    print("Failed to connect to drone! Exiting...")
-    exit()
-
 # Periodically poll the status endpoint to keep ourselves the active pilot.
-def update_loop():
-    while True:
-        client.update_pilot_status()
-        time.sleep(2)
-status_thread = threading.Thread(target=update_loop)
-status_thread.setDaemon(True)
-status_thread.start()
+# Status requests made by commands in the meantime count as pings too.
+def start_update_loop(client, period=2):
+    def update_loop():
+        while True:
+            try:
+                client.get_status(max_age=period)
+            except Exception as error:  # pylint: disable=broad-except
+                # Keep pinging, the link may come back before the session expires.
+                client.status_loop_errors += 1
+                fmt_err('Status error: {}\n', error)
+            time.sleep(period)
+    status_thread = threading.Thread(target=update_loop)
+    status_thread.setDaemon(True)
+    status_thread.start()
+    return status_thread
+
+# Commands triggered by each pose. They run on the dispatcher thread.
+def pose_commands(client):
+    def land(command):
+        print("Landing")
+        return client.land(cancel=command.cancelled, on_phase=command.report_phase)
+
+    def takeoff(command):
+        print("Taking off")
+        return client.takeoff(cancel=command.cancelled, on_phase=command.report_phase)
+
+    def sentry(command):
+        print("Sentry Mode Active")
+        client.set_skill("security_bot")
+
+    def survey(command):
+        print("Scanning area")
+        client.set_skill("pano")
+
+    return {
+        'fist': ('land', land),
+        'thumbsup': ('takeoff', takeoff),
+        'peace': ('sentry', sentry),
+        'hookem': ('survey', survey),
+    }
+
+def report_phase(command, phase):
+    print("{}: flight phase {}".format(command.name, phase))
+
+def report_done(command):
+    if command.future.cancelled():
+        print("{}: cancelled".format(command.name))
+    elif command.future.exception():
+        print("{}: failed: {}".format(command.name, command.future.exception()))
+    else:
+        print("{}: done in {:.1f}s".format(command.name, time.time() - command.submitted))
+
+# Landing cancels anything in progress, taking off cancels a landing.
+def make_dispatcher(on_phase=report_phase, on_done=report_done):
+    return CommandDispatcher(supersedes={
+        'land': ('takeoff', 'sentry', 'survey'),
+        'takeoff': ('land',),
+    }, on_phase=on_phase, on_done=on_done)
+
+def pose_dispatch(dispatcher, commands):
+    """ Return the GestureLoop callback that submits the command for each pose. """
+    def dispatch_pose(pose):
+        print(pose)
+        if pose in commands:
+            name, command = commands[pose]
+            dispatcher.submit(name, command)
+    return dispatch_pose
 
 def main():
-    data_glove_thread = GloveSerialListener('/dev/rfcomm0')
-    data_glove_thread.start()
-
-    while True:
-        time.sleep(1)
-        try:
-            if (data[0] == 1):
-                time.sleep(1)
-                thumb = (data[2] + data[3])
-                index = (data[4] + data[5])
-                middle = (data[6] + data[7])
-                ring = (data[8] + data[9])
-                pinky = (data[10] + data[11])
-                fingers = [thumb,index,middle,ring,pinky]
-                hand = sum([data[2], data[3], data[4], data[5], data[6], data[7], data[8], data[9], data[10], data[11]])
-                #print(fingers,hand)
-                
-                #Define poses here
-                droneidle = True
-
-                #Fist
-                if (thumb >= 30 and index >= 140 and middle >= 140 and ring >= 100 and pinky >= 120):
-                    print("Fist")
-                    droneidle = False
-                    print("Landing")
-                    client.land()
-
-                #Thumbs Up
-                if (thumb <= 20 and index >= 140 and middle >= 140 and ring >= 100 and pinky >= 120):
-                    print("Thumbs Up")
-                    droneidle = False
-                    print("Taking off")
-                    client.takeoff()
-                
-                #Peace
-                if (thumb >= 30 and index <= 20 and middle <= 20 and ring >= 100 and pinky >= 120):
-                    print("Peace")
-                    droneidle = False
-                    print("Sentry Mode Active")
-                    client.set_skill("security_bot")
-                
-                #Hookem
-                if (index <= 20 and middle >= 140 and ring >= 140 and pinky <= 20):
-                    print("Hookem")
-                    droneidle = False
-                    print("Scanning area")
-                    client.set_skill("pano")
-
-                else:
-                    #Do nothing for undefined poses
-                    droneidle = True
-
-        #Add exceptions here
-        except(KeyboardInterrupt):
-            exit()
-        except(AttributeError):
-            print("The drone has been commandeered!")
-            print("Exiting...")
-            exit()
-        except(IndexError):
-            print("Connecting to glove...")
-            time.sleep(5)
-    data_glove_thread.close()
-main()
+    # Kept so `python http_client.py` still flies with the gestures, see hedo/cli.py.
+    from hedo.cli import main as hedo_main
+    hedo_main()
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Decode raw camera frames fetched from the vehicle's shared memory.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+try:
+    # Python 3
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+from metrics import LatencyHistogram
+
+
+PIXELFORMAT_YUV = 1009
+PIXELFORMAT_RGB = 1002
+
+BYTES_PER_PIXEL = {
+    PIXELFORMAT_YUV: 2,
+    PIXELFORMAT_RGB: 3,
+}
+
+# While the vehicle has no new frame, metadata is polled after waiting this long,
+# doubling up to IDLE_POLL_MAX, instead of being requested again right away.
+IDLE_POLL_MIN = 0.01
+IDLE_POLL_MAX = 0.2
+
+
+def image_num_bytes(image):
+    """ Size of the pixel data described by an image metadata dict, or None if unsupported. """
+    bytes_per_pixel = BYTES_PER_PIXEL.get(image['pixelformat'])
+    if bytes_per_pixel is None:
+        return None
+    return image['width'] * image['height'] * bytes_per_pixel
+
+
+def read_into(stream, buf, num_bytes):
+    """ Read exactly num_bytes from a file-like stream into buf without intermediate copies. """
+    view = memoryview(buf)
+    pos = 0
+    while pos < num_bytes:
+        count = stream.readinto(view[pos:num_bytes])
+        if not count:
+            raise IOError('Image data ended after {} of {} bytes'.format(pos, num_bytes))
+        pos += count
+    return pos
+
+
+def decode_image(buf, width, height, pixfmt):
+    """
+    Convert raw UYVY or RGB pixel data into a BGR array.
+
+    The input is wrapped with np.frombuffer rather than copied, so the color conversion
+    is the only pass over the pixels and the result never aliases buf.
+    """
+    bytes_per_pixel = BYTES_PER_PIXEL.get(pixfmt)
+    if bytes_per_pixel is None:
+        raise ValueError('Unsupported pixelformat {}'.format(pixfmt))
+    pixels = np.frombuffer(buf, dtype=np.uint8, count=width * height * bytes_per_pixel)
+    pixels = pixels.reshape(height, width, bytes_per_pixel)
+    if pixfmt == PIXELFORMAT_RGB:
+        return np.ascontiguousarray(pixels[:, :, ::-1])
+
+    import cv2
+    return cv2.cvtColor(pixels, cv2.COLOR_YUV2BGR_UYVY)
+
+
+GrabbedFrame = collections.namedtuple('GrabbedFrame', ['bgr', 'image', 'requested', 'delivered'])
+
+
+class DropOldestQueue(object):
+    """ Bounded queue that discards its oldest item instead of blocking the producer. """
+
+    def __init__(self, maxsize):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """ Return the oldest item, or None if nothing arrives within timeout seconds. """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+
+class FrameGrabber(object):
+    """
+    Continuously grab camera frames from the vehicle over HTTP.
+
+    Fetching the metadata, downloading the pixels and decoding them run on separate
+    threads connected by small queues, so the next metadata request overlaps the
+    current download and decode. Decoded frames are delivered through a DropOldestQueue,
+    so a slow consumer always sees recent frames.
+
+    Args:
+        client (HTTPClient): Connected client whose keep-alive session is used.
+
+        maxsize (int): Number of decoded frames buffered for the consumer.
+
+        buffers (int): Pixel buffers cycled between the download and decode stages.
+
+        max_fps (float): Optional cap on the metadata request rate. Without it, requests
+            still back off while the vehicle has no new frame.
+    """
+
+    def __init__(self, client, maxsize=2, buffers=2, max_fps=None):
+        self.client = client
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.frames = DropOldestQueue(maxsize)
+
+        self._images = queue.Queue(maxsize=1)
+        self._downloaded = queue.Queue(maxsize=buffers)
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(None)
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._fetch_metadata),
+            threading.Thread(target=self._download),
+            threading.Thread(target=self._decode),
+        ]
+        for thread in self._threads:
+            thread.setDaemon(True)
+
+        self.metadata_latency = LatencyHistogram('metadata')
+        self.download_latency = LatencyHistogram('download')
+        self.decode_latency = LatencyHistogram('decode')
+        self.frame_latency = LatencyHistogram('request to delivery')
+        self.delivered = 0
+        self.errors = 0
+        self.started = None
+
+    def start(self):
+        self.started = time.time()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def get(self, timeout=None):
+        """ Return the next GrabbedFrame, or None on timeout. """
+        return self.frames.get(timeout)
+
+    @property
+    def fps(self):
+        if not self.started:
+            return 0.0
+        return self.delivered / max(time.time() - self.started, 1e-9)
+
+    def report(self):
+        return '\n'.join([
+            'frames: delivered={} dropped={} errors={} fps={:.1f}'.format(
+                self.delivered, self.frames.dropped, self.errors, self.fps),
+            self.metadata_latency.format(),
+            self.download_latency.format(),
+            self.decode_latency.format(),
+            self.frame_latency.format(),
+        ])
+
+    def _put(self, stage_queue, item):
+        """ Block on a full queue, but give up when stopping. """
+        while not self._stop.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _take(self, stage_queue):
+        while not self._stop.is_set():
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _fetch_metadata(self):
+        last_path = None
+        requested = 0.0
+        idle_wait = 0.0
+        while not self._stop.is_set():
+            wait = requested + max(self.min_interval, idle_wait) - time.time()
+            if wait > 0 and self._stop.wait(wait):
+                return
+            requested = time.time()
+            try:
+                image = self.client.fetch_image_metadata()
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                self._stop.wait(0.5)
+                continue
+            self.metadata_latency.record(time.time() - requested)
+            if image is None or image['data'] == last_path:
+                # No new frame on the vehicle yet.
+                idle_wait = min(max(idle_wait * 2, IDLE_POLL_MIN), IDLE_POLL_MAX)
+                continue
+            idle_wait = 0.0
+            last_path = image['data']
+            self._put(self._images, (image, requested))
+
+    def _download(self):
+        while not self._stop.is_set():
+            job = self._take(self._images)
+            if job is None:
+                return
+            buf = self._take(self._free)
+            if self._stop.is_set():
+                return
+            image, requested = job
+            start = time.time()
+            try:
+                buf = self.client.download_image(image, buf)
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                self._free.put(buf)
+                continue
+            self.download_latency.record(time.time() - start)
+            self._put(self._downloaded, (image, requested, buf))
+
+    def _decode(self):
+        while not self._stop.is_set():
+            job = self._take(self._downloaded)
+            if job is None:
+                return
+            image, requested, buf = job
+            start = time.time()
+            try:
+                bgr = decode_image(buf, image['width'], image['height'], image['pixelformat'])
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                continue
+            finally:
+                self._free.put(buf)
+            delivered = time.time()
+            self.decode_latency.record(delivered - start)
+            self.frame_latency.record(delivered - requested)
+            self.delivered += 1
+            self.frames.put(GrabbedFrame(bgr, image, requested, delivered))
@@ -0,0 +1,234 @@
+"""
+Orientation from the glove's IMU frames.
+
+Each IMU frame carries a quaternion as W, X, Y and Z components of three 7 bit bytes,
+most significant first, which together form a 21 bit two's complement value. Only the
+direction of the quaternion matters, so components are normalized rather than scaled.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import threading
+
+import numpy as np
+
+
+# Frame id, length and 4 components of 3 bytes.
+IMU_FRAME_SIZE = 14
+QUATERNION_SLICE = slice(2, 14)
+
+COMPONENT_BITS = 21
+COMPONENT_SIGN = 1 << (COMPONENT_BITS - 1)
+COMPONENT_MASK = (1 << COMPONENT_BITS) - 1
+
+
+def frames_to_array(frames):
+    """
+    Stack IMU frames into an (N, IMU_FRAME_SIZE) uint8 array.
+
+    Returns:
+        tuple: the array and a boolean mask of the frames long enough to decode.
+    """
+    joined = b''.join(frames)
+    if len(joined) == len(frames) * IMU_FRAME_SIZE:
+        array = np.frombuffer(joined, dtype=np.uint8).reshape(-1, IMU_FRAME_SIZE)
+        return array, np.ones(len(frames), dtype=bool)
+
+    array = np.zeros((len(frames), IMU_FRAME_SIZE), dtype=np.uint8)
+    valid = np.zeros(len(frames), dtype=bool)
+    for row, frame in enumerate(frames):
+        frame = frame[:IMU_FRAME_SIZE]
+        array[row, :len(frame)] = np.frombuffer(frame, dtype=np.uint8)
+        valid[row] = len(frame) == IMU_FRAME_SIZE
+    return array, valid
+
+
+def decode_quaternions(frames):
+    """
+    Decode an (N, IMU_FRAME_SIZE) array of IMU frames into unit quaternions.
+
+    Returns:
+        tuple: an (N, 4) float array of (w, x, y, z) and a boolean mask of the rows that
+            held a non-zero quaternion. Invalid rows are left as zeros.
+    """
+    payload = np.asarray(frames)[:, QUATERNION_SLICE].astype(np.int32).reshape(-1, 4, 3)
+    raw = (payload[:, :, 0] << 14) | (payload[:, :, 1] << 7) | payload[:, :, 2]
+    raw -= (raw & COMPONENT_SIGN) << 1
+    quaternions = raw.astype(np.float64)
+    norms = np.sqrt(np.einsum('ij,ij->i', quaternions, quaternions))
+    valid = norms > 0
+    quaternions[valid] /= norms[valid, None]
+    return quaternions, valid
+
+
+def encode_quaternions(quaternions, scale=1 << 18):
+    """ The 12 payload bytes of each quaternion in an (N, 4) array, as an (N, 12) uint8 array. """
+    raw = np.round(np.asarray(quaternions, dtype=np.float64) * scale).astype(np.int64) & COMPONENT_MASK
+    payload = np.stack([(raw >> 14) & 0x7F, (raw >> 7) & 0x7F, raw & 0x7F], axis=2)
+    return payload.reshape(-1, 12).astype(np.uint8)
+
+
+def quaternions_to_euler(quaternions):
+    """ Roll, pitch and yaw in radians (Z-Y-X convention) for an (N, 4) array of unit quaternions. """
+    w, x, y, z = quaternions.T
+    euler = np.empty((len(quaternions), 3))
+    euler[:, 0] = np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    euler[:, 1] = np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0))
+    euler[:, 2] = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return euler
+
+
+def relative_rotation_vectors(previous, current):
+    """
+    Rotation vectors (axis times angle, in the body frame) taking each quaternion in
+    `previous` to the one in `current`. Both must be in the same hemisphere.
+    """
+    w0, x0, y0, z0 = previous.T
+    w1, x1, y1, z1 = current.T
+    dw = np.einsum('ij,ij->i', previous, current)
+    # Vector part of conj(previous) * current, with the cross product written out
+    # because np.cross costs more than the rest of the update for small batches.
+    dv = np.empty((len(current), 3))
+    dv[:, 0] = w0 * x1 - w1 * x0 - (y0 * z1 - z0 * y1)
+    dv[:, 1] = w0 * y1 - w1 * y0 - (z0 * x1 - x0 * z1)
+    dv[:, 2] = w0 * z1 - w1 * z0 - (x0 * y1 - y0 * x1)
+    sin_half = np.sqrt(np.einsum('ij,ij->i', dv, dv))
+    angle = 2 * np.arctan2(sin_half, dw)
+    # angle / sin_half tends to 2 for small rotations.
+    scale = np.full(len(dv), 2.0)
+    np.divide(angle, sin_half, out=scale, where=sin_half > 1e-12)
+    return dv * scale[:, None]
+
+
+class OrientationStream(object):
+    """
+    Decode IMU frames into a fixed-size history of orientation and angular rate.
+
+    Frames are decoded a batch at a time. Roll/pitch/yaw and angular rate are computed
+    only for the new samples, the rate from the rotation between consecutive samples,
+    and everything is written into preallocated NumPy rings of `capacity` samples.
+
+    Frames read from the serial port in one go share an arrival time, so the angular rate
+    uses a running estimate of the sample period (arrival span / samples per read)
+    rather than the gaps between stamps.
+
+    Args:
+        frames (FrameRing): Optional ring of IMU frames to poll, e.g.
+            GloveSerialListener.rings[FRAME_ID_IMU].
+
+        capacity (int): Number of samples kept.
+
+        wait_timeout (float): Longest time run() sleeps before checking for a stop request.
+    """
+
+    def __init__(self, frames=None, capacity=1024, wait_timeout=1.0):
+        self.frames = frames
+        self.capacity = capacity
+        self.wait_timeout = wait_timeout
+
+        self.quaternions = np.zeros((capacity, 4))
+        self.euler = np.zeros((capacity, 3))
+        self.rates = np.zeros((capacity, 3))
+        self.stamps = np.zeros(capacity)
+        self.count = 0
+        self.period = None
+
+        self.next_seq = frames.seq if frames is not None else 0
+        self.invalid = 0
+        # Frames overwritten in the ring before poll() got to them.
+        self.overruns = 0
+        self._last_stamp = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def update(self, frames, stamps):
+        """ Add a batch of IMU frames (bytes) with their arrival stamps. Returns samples added. """
+        array, valid = frames_to_array(frames)
+        quaternions, nonzero = decode_quaternions(array)
+        valid &= nonzero
+        self.invalid += len(frames) - int(valid.sum())
+        if not valid.all():
+            quaternions = quaternions[valid]
+            stamps = np.asarray(stamps)[valid]
+        return self.update_quaternions(quaternions, stamps)
+
+    def update_quaternions(self, quaternions, stamps):
+        """ Add a batch of unit quaternions with their arrival stamps. Returns samples added. """
+        n = len(quaternions)
+        if not n:
+            return 0
+        stamps = np.asarray(stamps, dtype=np.float64)
+        self._update_period(stamps, n)
+
+        # q and -q are the same rotation: keep consecutive samples in the same hemisphere
+        # so the history is continuous and the rotation between them is the short one.
+        previous = np.empty((n, 4))
+        previous[1:] = quaternions[:-1]
+        previous[0] = self.quaternions[(self.count - 1) % self.capacity] if self.count \
+            else quaternions[0]
+        flips = np.sign(np.einsum('ij,ij->i', previous, quaternions))
+        flips[flips == 0] = 1
+        signs = np.cumprod(flips)
+        quaternions = quaternions * signs[:, None]
+        previous[1:] = quaternions[:-1]
+
+        rates = relative_rotation_vectors(previous, quaternions)
+        if self.period:
+            rates /= self.period
+        else:
+            rates[:] = 0
+
+        if n > self.capacity:
+            quaternions, stamps, rates = (quaternions[-self.capacity:], stamps[-self.capacity:],
+                                          rates[-self.capacity:])
+            self.count += n - self.capacity
+            n = self.capacity
+        slots = (self.count + np.arange(n)) % self.capacity
+        self.quaternions[slots] = quaternions
+        self.euler[slots] = quaternions_to_euler(quaternions)
+        self.rates[slots] = rates
+        self.stamps[slots] = stamps
+        self.count += n
+        return n
+
+    def _update_period(self, stamps, n):
+        last = stamps[-1]
+        if self._last_stamp is not None and last > self._last_stamp:
+            observed = (last - self._last_stamp) / n
+            self.period = observed if self.period is None else 0.9 * self.period + 0.1 * observed
+        self._last_stamp = last
+
+    def latest(self):
+        """ Return (stamp, quaternion, roll/pitch/yaw, angular rate) of the newest sample, or None. """
+        if not self.count:
+            return None
+        slot = (self.count - 1) % self.capacity
+        return (self.stamps[slot], self.quaternions[slot].copy(), self.euler[slot].copy(),
+                self.rates[slot].copy())
+
+    def history(self, n=None):
+        """ Return (stamps, quaternions, euler, rates) of the last n samples, oldest first. """
+        n = len(self) if n is None else min(n, len(self))
+        slots = (self.count - n + np.arange(n)) % self.capacity
+        return self.stamps[slots], self.quaternions[slots], self.euler[slots], self.rates[slots]
+
+    def poll(self):
+        """ Decode every pending frame from the ring. Returns the number of frames processed. """
+        seq = self.next_seq
+        entries, self.next_seq = self.frames.since(seq)
+        self.overruns += self.next_seq - seq - len(entries)
+        if entries:
+            self.update([frame for _, frame, _ in entries], [stamp for _, _, stamp in entries])
+        return len(entries)
+
+    def run(self):
+        """ Follow the ring until stop() is called. """
+        while not self._stop.is_set():
+            if self.frames.wait(self.next_seq, self.wait_timeout):
+                self.poll()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,297 @@
+"""
+Battery and link quality telemetry from the glove's decoded frames.
+
+Frames from one serial read share an arrival stamp, so arrival statistics are kept per
+read rather than per frame: each read of n frames of a type is expected n sample
+periods after the previous one. Every statistic is a running estimate, so memory stays
+constant however long the glove streams.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+import math
+import threading
+import time
+
+from glove import FRAME_ID_IMU, FRAME_ID_SENSOR
+from metrics import REGISTRY, Sample
+
+# Battery byte of a finger frame, byte 13 of the frame on the wire.
+BATTERY_INDEX = 12
+
+FRAME_TYPE_NAMES = {
+    FRAME_ID_SENSOR: 'finger',
+    FRAME_ID_IMU: 'imu',
+}
+
+LINK_OK = 'ok'
+LINK_DEGRADED = 'degraded'
+LINK_STALLED = 'stalled'
+
+
+class ArrivalStats(object):
+    """
+    Arrival statistics of one frame type.
+
+    Args:
+        rate_window (float): Time constant in seconds of the frame rate average.
+
+        gap_factor (float): A read later than this many expected periods is a gap.
+
+        min_gap (float): Shortest delay in seconds counted as a gap.
+    """
+    __slots__ = ('rate_window', 'gap_factor', 'min_gap', 'frames', 'last_stamp', 'period', 'jitter',
+                 'gaps', 'longest_gap', 'last_gap', '_rate', '_rate_stamp')
+
+    def __init__(self, rate_window=2.0, gap_factor=5.0, min_gap=0.05):
+        self.rate_window = rate_window
+        self.gap_factor = gap_factor
+        self.min_gap = min_gap
+
+        self.frames = 0
+        self.last_stamp = None
+        # Smoothed seconds per frame, and smoothed deviation of reads from it (RFC 3550 style).
+        self.period = None
+        self.jitter = 0.0
+        self.gaps = 0
+        self.longest_gap = 0.0
+        self.last_gap = None
+        self._rate = 0.0
+        self._rate_stamp = None
+
+    def update(self, count, stamp):
+        """ Record `count` frames that arrived together at `stamp`. """
+        self.frames += count
+        # Exponentially decaying frame count: tends to the frame rate for a steady stream.
+        self._rate = self.rate(stamp) + count / self.rate_window
+        self._rate_stamp = stamp
+
+        last = self.last_stamp
+        self.last_stamp = stamp
+        if last is None or stamp <= last:
+            return
+        elapsed = stamp - last
+        if self.period is None:
+            self.period = elapsed / count
+            return
+        expected = self.period * count
+        if elapsed > max(self.gap_factor * expected, self.min_gap):
+            # Keep outages out of the period and jitter estimates.
+            self.gaps += 1
+            self.longest_gap = max(self.longest_gap, elapsed)
+            self.last_gap = stamp
+            return
+        self.jitter += (abs(elapsed - expected) - self.jitter) / 16.0
+        self.period += (elapsed / count - self.period) / 16.0
+
+    def rate(self, now):
+        """ Frames per second, averaged over about rate_window seconds up to now. """
+        if self._rate_stamp is None:
+            return 0.0
+        return self._rate * math.exp(-max(0.0, now - self._rate_stamp) / self.rate_window)
+
+    def summary(self, now):
+        return {
+            'frames': self.frames,
+            'rate': round(self.rate(now), 1),
+            'jitter_ms': round(1000 * self.jitter, 2),
+            'gaps': self.gaps,
+            'longest_gap_ms': round(1000 * self.longest_gap, 1),
+            'silence_ms': round(1000 * (now - self.last_stamp), 1) if self.last_stamp is not None else None,
+        }
+
+
+class LinkTelemetry(object):
+    """
+    Follow the glove's frames and report its battery and how well frames are arriving.
+
+    Frames come from a FrameQueue subscribed from the listener, dropping the oldest if
+    this thread falls behind. The link is reported as stalled when a frame type that was
+    streaming goes quiet for `stall_timeout`, and as degraded for `degraded_hold` seconds
+    after a gap, a corrupt frame, or while jitter is above `jitter_limit`.
+
+    Snapshots are sent to the vehicle at most every `publish_period` seconds, as a
+    {"telemetry": ...} JSON message through a CustomCommsBatcher. A snapshot is skipped
+    rather than queued while the previous one is still in flight.
+
+    Args:
+        listener (GloveSerialListener): Source of frames and of the decoder's error counts.
+
+        batcher (comms_batch.CustomCommsBatcher): Optional channel to the skill.
+
+        publish_period (float): Shortest time in seconds between snapshots sent.
+
+        battery_smoothing (float): Time constant in seconds of the battery level average.
+
+        jitter_limit (float): Jitter in seconds above which the link is degraded.
+
+        stall_timeout (float): Silence in seconds after which the link is stalled.
+
+        degraded_hold (float): Seconds a gap or corrupt frame keeps the link degraded.
+
+        rate_window (float): Time constant in seconds of the frame rate averages.
+    """
+
+    def __init__(self, listener, batcher=None, publish_period=1.0, battery_smoothing=30.0,
+                 jitter_limit=0.02, stall_timeout=0.5, degraded_hold=10.0, rate_window=2.0):
+        self.listener = listener
+        self.batcher = batcher
+        self.publish_period = publish_period
+        self.battery_smoothing = battery_smoothing
+        self.jitter_limit = jitter_limit
+        self.stall_timeout = stall_timeout
+        self.degraded_hold = degraded_hold
+
+        self.frames = listener.subscribe(maxsize=256)
+        self.types = dict((frame_id, ArrivalStats(rate_window)) for frame_id in FRAME_TYPE_NAMES)
+        self.battery = None
+        self._battery_stamp = None
+        self._corrupt = listener.decoder.corrupt
+        self._last_corrupt = None
+
+        self.state = None
+        self.published = 0
+        self.publish_skipped = 0
+        self._in_flight = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.setDaemon(True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def update(self, items):
+        """ Add (frame, stamp) items in arrival order. """
+        counts = {}
+        stamp = None
+        battery = None
+        for frame, frame_stamp in items:
+            if frame_stamp != stamp:
+                self._flush(counts, stamp, battery)
+                stamp = frame_stamp
+                battery = None
+            frame_id = frame[0]
+            counts[frame_id] = counts.get(frame_id, 0) + 1
+            if frame_id == FRAME_ID_SENSOR:
+                battery = frame[BATTERY_INDEX]
+        self._flush(counts, stamp, battery)
+
+    def _flush(self, counts, stamp, battery):
+        for frame_id, count in counts.items():
+            stats = self.types.get(frame_id)
+            if stats is not None:
+                stats.update(count, stamp)
+        counts.clear()
+        if battery is not None:
+            self._update_battery(battery, stamp)
+
+    def _update_battery(self, level, stamp):
+        if self.battery is None:
+            self.battery = float(level)
+        else:
+            weight = 1.0 - math.exp(-max(0.0, stamp - self._battery_stamp) / self.battery_smoothing)
+            self.battery += (level - self.battery) * weight
+        self._battery_stamp = stamp
+
+    def link_state(self, now):
+        """ Return LINK_OK, LINK_DEGRADED or LINK_STALLED and the reasons for it. """
+        stalled = []
+        degraded = []
+        corrupt = self.listener.decoder.corrupt
+        if corrupt != self._corrupt:
+            self._corrupt = corrupt
+            self._last_corrupt = now
+        if self._last_corrupt is not None and now - self._last_corrupt < self.degraded_hold:
+            degraded.append('corrupt frames')
+        for frame_id, stats in sorted(self.types.items()):
+            name = FRAME_TYPE_NAMES[frame_id]
+            if stats.last_stamp is None:
+                continue
+            if now - stats.last_stamp > self.stall_timeout:
+                stalled.append('no {} frames'.format(name))
+            if stats.last_gap is not None and now - stats.last_gap < self.degraded_hold:
+                degraded.append('{} gap'.format(name))
+            if stats.jitter > self.jitter_limit:
+                degraded.append('{} jitter'.format(name))
+        if stalled:
+            return LINK_STALLED, stalled
+        if degraded:
+            return LINK_DEGRADED, degraded
+        return LINK_OK, []
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        state, reasons = self.link_state(now)
+        return {
+            'state': state,
+            'reasons': reasons,
+            'battery': round(self.battery, 1) if self.battery is not None else None,
+            'corrupt': self.listener.decoder.corrupt,
+            'resyncs': self.listener.decoder.resyncs,
+            'frames': dict((FRAME_TYPE_NAMES[frame_id], stats.summary(now))
+                           for frame_id, stats in self.types.items()),
+        }
+
+    def publish(self, snapshot):
+        if self.batcher is None:
+            return
+        if self._in_flight is not None and not self._in_flight.done():
+            self.publish_skipped += 1
+            return
+        message = json.dumps({'telemetry': snapshot}).encode('utf-8')
+        self._in_flight = self.batcher.send(message, no_response=True)
+        self.published += 1
+
+    def run(self):
+        """ Follow the frames until stop() is called, publishing every publish_period. """
+        next_publish = time.monotonic() + self.publish_period
+        while not self._stop.is_set():
+            items = self.frames.get_many(timeout=max(0.0, next_publish - time.monotonic()))
+            if items:
+                self.update(items)
+            elif self.frames.closed:
+                break
+            now = time.monotonic()
+            if now >= next_publish:
+                next_publish = now + self.publish_period
+                snapshot = self.snapshot(now)
+                if snapshot['state'] != self.state:
+                    self.state = snapshot['state']
+                    print("glove link {}{}".format(
+                        self.state, ': ' + ', '.join(snapshot['reasons']) if snapshot['reasons'] else ''))
+                self.publish(snapshot)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.frames.close()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def register_metrics(self, registry=REGISTRY, **labels):
+        """ Export battery, frame rates, jitter and gaps from `registry`. Returns the collector. """
+        return registry.add_collector(lambda: self.collect_metrics(labels))
+
+    def collect_metrics(self, labels):
+        now = time.monotonic()
+        if self.battery is not None:
+            yield Sample('glove_battery', 'gauge', 'Smoothed battery byte of the finger frames', labels,
+                         self.battery)
+        for frame_id, stats in self.types.items():
+            type_labels = dict(labels, frame_type=FRAME_TYPE_NAMES[frame_id])
+            yield Sample('glove_frame_rate', 'gauge', 'Frames per second', type_labels, stats.rate(now))
+            yield Sample('glove_jitter_seconds', 'gauge', 'Smoothed deviation of reads from the frame period',
+                         type_labels, stats.jitter)
+            yield Sample('glove_gaps_total', 'counter', 'Delays of several frame periods', type_labels,
+                         stats.gaps)
+
+    def format(self):
+        snapshot = self.snapshot()
+        lines = ['glove link {state}, battery {battery}, corrupt {corrupt}, resyncs {resyncs}'.format(
+            **snapshot)]
+        for name, summary in sorted(snapshot['frames'].items()):
+            lines.append('  {}: {rate}/s jitter={jitter_ms}ms gaps={gaps} longest={longest_gap_ms}ms'.format(
+                name, **summary))
+        return '\n'.join(lines)
@@ -0,0 +1,378 @@
+"""
+Lightweight latency measurement helpers and a registry to export them.
+
+Components keep their own counters and histograms, which cost an attribute increment
+or a LatencyHistogram.record on the hot path. A MetricsRegistry collects them only when
+a snapshot is taken, and serves snapshots as Prometheus text or JSON.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import json
+import math
+import threading
+import time
+
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class LatencyHistogram(object):
+    """
+    Fixed-bucket latency histogram with logarithmic buckets, in the spirit of HdrHistogram.
+
+    Each power of two above `min_seconds` is split into `sub_buckets` linear buckets, so
+    recording a value is a frexp and an index increment and percentiles are accurate to
+    within 1 / sub_buckets of the value.
+
+    Args:
+        name (str): Label used when printing the histogram.
+
+        min_seconds (float): Values below this land in the first bucket.
+
+        max_seconds (float): Values above this land in the last bucket.
+
+        sub_buckets (int): Buckets per power of two.
+    """
+
+    def __init__(self, name='', min_seconds=1e-6, max_seconds=100.0, sub_buckets=4):
+        self.name = name
+        self.min_seconds = min_seconds
+        self.sub_buckets = sub_buckets
+        octaves = int(math.ceil(math.log(max_seconds / min_seconds, 2)))
+        self.counts = [0] * (octaves * sub_buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """ Add one sample. """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        scaled = seconds / self.min_seconds
+        if scaled < 1.0:
+            index = 0
+        else:
+            mantissa, exponent = math.frexp(scaled)
+            index = (exponent - 1) * self.sub_buckets + int((2.0 * mantissa - 1.0) * self.sub_buckets)
+            if index >= len(self.counts):
+                index = len(self.counts) - 1
+        self.counts[index] += 1
+
+    def bucket_upper_bound(self, index):
+        octave, sub = divmod(index, self.sub_buckets)
+        return self.min_seconds * (2 ** octave) * (1.0 + float(sub + 1) / self.sub_buckets)
+
+    def percentile(self, percent):
+        """ Return the upper bound of the bucket holding the given percentile, in seconds. """
+        if not self.count:
+            return 0.0
+        target = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        """ Add the samples of a histogram with the same bucket layout. """
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def summary(self):
+        """ Return count, mean, p50, p90, p99 and max, with latencies in milliseconds. """
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * mean,
+            'p50_ms': 1000 * self.percentile(50),
+            'p90_ms': 1000 * self.percentile(90),
+            'p99_ms': 1000 * self.percentile(99),
+            'max_ms': 1000 * self.max,
+        }
+
+    def format(self):
+        return '{name}: n={count} mean={mean_ms:.2f}ms p50={p50_ms:.2f}ms p90={p90_ms:.2f}ms ' \
+            'p99={p99_ms:.2f}ms max={max_ms:.2f}ms'.format(name=self.name, **self.summary())
+
+
+class Counter(object):
+    """ A count that only goes up, such as frames decoded. """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(object):
+    """ A value that goes up and down, such as queue depth. """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+# Quantiles exported for every histogram.
+QUANTILES = (0.5, 0.9, 0.99)
+
+# A sample as produced by collectors: (name, kind, help, labels, value), where kind is
+# 'counter', 'gauge' or 'histogram' and value is a number or a LatencyHistogram.
+Sample = collections.namedtuple('Sample', 'name kind help labels value')
+
+
+class MetricsRegistry(object):
+    """
+    The counters, gauges and histograms of a process, by name and labels.
+
+    Metrics come from two places. counter(), gauge() and histogram() create a metric
+    that the caller updates directly. Collectors, added with add_collector(), are called
+    at snapshot time and yield a Sample for each value, so a component's existing
+    attributes can be exported without touching its hot path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = collections.OrderedDict()
+        self._collectors = []
+
+    def _get(self, kind, factory, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        entry = self._metrics.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._metrics.setdefault(key, (kind, help_text, factory()))
+        return entry[2]
+
+    def counter(self, name, help_text='', **labels):
+        """ Return the Counter with this name and labels, creating it if needed. """
+        return self._get('counter', Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', **labels):
+        return self._get('gauge', Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text='', **labels):
+        """ Return the LatencyHistogram with this name and labels, creating it if needed. """
+        return self._get('histogram', lambda: LatencyHistogram(name), name, help_text, labels)
+
+    def add_collector(self, collect):
+        """ Call `collect()` at every snapshot; it yields Samples. Returns collect. """
+        with self._lock:
+            self._collectors.append(collect)
+        return collect
+
+    def remove_collector(self, collect):
+        with self._lock:
+            if collect in self._collectors:
+                self._collectors.remove(collect)
+
+    def samples(self):
+        """ Every current value as a list of Samples. """
+        with self._lock:
+            metrics = list(self._metrics.items())
+            collectors = list(self._collectors)
+        samples = []
+        for (name, labels), (kind, help_text, metric) in metrics:
+            value = metric if kind == 'histogram' else metric.value
+            samples.append(Sample(name, kind, help_text, dict(labels), value))
+        for collect in collectors:
+            samples.extend(collect())
+        return samples
+
+    def snapshot(self):
+        """
+        Return a JSON-serializable dict of every metric: name -> type, help and a list of
+        samples, each with its labels and value. Histograms are summarized as by
+        LatencyHistogram.summary().
+        """
+        snapshot = collections.OrderedDict()
+        for sample in self.samples():
+            family = snapshot.get(sample.name)
+            if family is None:
+                family = snapshot[sample.name] = {'type': sample.kind, 'help': sample.help,
+                                                  'samples': []}
+            value = sample.value.summary() if sample.kind == 'histogram' else sample.value
+            family['samples'].append({'labels': sample.labels, 'value': value})
+        return snapshot
+
+    def prometheus_text(self):
+        """ Every metric in the Prometheus text exposition format. Histograms are exported as summaries. """
+        families = collections.OrderedDict()
+        for sample in self.samples():
+            families.setdefault(sample.name, []).append(sample)
+        lines = []
+        for name, samples in families.items():
+            kind = samples[0].kind
+            if samples[0].help:
+                lines.append('# HELP {} {}'.format(name, samples[0].help))
+            lines.append('# TYPE {} {}'.format(name, 'summary' if kind == 'histogram' else kind))
+            for sample in samples:
+                if kind != 'histogram':
+                    lines.append('{}{} {}'.format(name, format_labels(sample.labels), float(sample.value)))
+                    continue
+                histogram = sample.value
+                for quantile in QUANTILES:
+                    labels = dict(sample.labels, quantile=str(quantile))
+                    lines.append('{}{} {}'.format(name, format_labels(labels),
+                                                  histogram.percentile(100 * quantile)))
+                lines.append('{}_sum{} {}'.format(name, format_labels(sample.labels), histogram.total))
+                lines.append('{}_count{} {}'.format(name, format_labels(sample.labels), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in sorted(labels.items())) + '}'
+
+
+# The registry used unless a component is given another one.
+REGISTRY = MetricsRegistry()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer(object):
+    """
+    Serve a registry over HTTP: /metrics in Prometheus text format and /metrics.json as JSON.
+
+    Args:
+        registry (MetricsRegistry): What to serve.
+
+        port (int): Port to listen on, 0 picks a free one.
+
+        host (str): Interface to listen on.
+    """
+
+    def __init__(self, registry=REGISTRY, port=9102, host=''):
+        self.registry = registry
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body = server.registry.prometheus_text().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body = json.dumps(server.registry.snapshot()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JsonDumper(object):
+    """
+    Append a JSON snapshot of a registry to a file every `period` seconds, one per line.
+
+    Each line holds the time, the snapshot and, for every counter, its rate per second
+    since the previous line, so frame rates can be read straight off the dump.
+
+    Args:
+        path (str): File to append to.
+
+        registry (MetricsRegistry): What to dump.
+
+        period (float): Seconds between snapshots.
+    """
+
+    def __init__(self, path, registry=REGISTRY, period=5.0):
+        self.path = path
+        self.registry = registry
+        self.period = period
+        self._previous = {}
+        self._previous_time = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.setDaemon(True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.dump()
+
+    def run(self):
+        while not self._stop.wait(self.period):
+            self.dump()
+
+    def dump(self):
+        now = time.time()
+        snapshot = self.registry.snapshot()
+        elapsed = now - self._previous_time if self._previous_time is not None else None
+        counts = {}
+        for name, family in snapshot.items():
+            if family['type'] != 'counter':
+                continue
+            for sample in family['samples']:
+                key = (name, tuple(sorted(sample['labels'].items())))
+                counts[key] = sample['value']
+                previous = self._previous.get(key)
+                if elapsed and previous is not None:
+                    sample['rate'] = (sample['value'] - previous) / elapsed
+        self._previous = counts
+        self._previous_time = now
+        with open(self.path, 'a') as dump:
+            dump.write(json.dumps({'time': now, 'metrics': snapshot}) + '\n')
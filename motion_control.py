@@ -0,0 +1,279 @@
+"""
+Continuous control of the RemoteControl skill from the glove's orientation and flex.
+
+While engaged, tilting the hand flies the vehicle: pitch drives forward velocity, roll
+lateral velocity, turning the hand the yaw rate, and curling the fingers climbs. Every
+input is measured from the hand's pose when control was engaged, so the hand held
+still in any comfortable position means hover.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import math
+import threading
+import time
+
+import numpy as np
+
+from metrics import LatencyHistogram
+from poses import SENSOR_SLICE
+
+
+# Axes of the RemoteControl move command.
+AXES = ('velx', 'vely', 'velz', 'yaw_rate', 'pitch_rate')
+
+# Command units per unit of input: m/s per radian of pitch and roll, m/s per unit of hand
+# flex, rad/s per radian of yaw. Gimbal pitch is left alone.
+DEFAULT_GAINS = (-6.0, 6.0, 4.0, 1.5, 0.0)
+# Inputs closer than this to the neutral pose are treated as neutral.
+DEFAULT_DEADBAND = (0.1, 0.1, 0.1, 0.15, 0.0)
+# Largest command on each axis.
+DEFAULT_LIMITS = (4.0, 4.0, 2.0, 1.0, 0.5)
+# Largest change of each command per second.
+DEFAULT_MAX_RATES = (4.0, 4.0, 2.0, 2.0, 1.0)
+
+# Sum of the ten finger sensors of a fully closed hand.
+MAX_HAND_FLEX = 1270.0
+
+# Must stay well below COMMAND_TIMEOUT in skillset/remote.py, or the skill stops the vehicle.
+KEEPALIVE_PERIOD = 0.25
+# Glove data older than this is not flown on: about ten frame periods.
+INPUT_TIMEOUT = 0.1
+
+
+def hand_flex(frame):
+    """ Flex of the whole hand in a finger frame, from 0 (open) to 1 (closed). """
+    return sum(bytearray(frame[SENSOR_SLICE])) / MAX_HAND_FLEX
+
+
+def wrap_angle(angle):
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class ProportionalController(object):
+    """
+    Turn hand orientation and flex into a smoothed, rate limited velocity command.
+
+    Each axis goes through a deadband around the neutral pose, a gain, a limit, first
+    order smoothing with time constant `smoothing` and finally a limit on how fast the
+    command may change.
+
+    Args:
+        gains (tuple): Command per unit of input for each of AXES.
+
+        deadband (tuple): Input offsets ignored on each axis.
+
+        limits (tuple): Largest magnitude of each command.
+
+        max_rates (tuple): Largest change of each command per second.
+
+        smoothing (float): Smoothing time constant in seconds, 0 for none.
+
+        zero_threshold (float): Commands this small snap to zero when the input is neutral.
+    """
+
+    def __init__(self, gains=DEFAULT_GAINS, deadband=DEFAULT_DEADBAND, limits=DEFAULT_LIMITS,
+                 max_rates=DEFAULT_MAX_RATES, smoothing=0.15, zero_threshold=0.01):
+        self.gains = np.array(gains, dtype=np.float64)
+        self.deadband = np.array(deadband, dtype=np.float64)
+        self.limits = np.array(limits, dtype=np.float64)
+        self.max_rates = np.array(max_rates, dtype=np.float64)
+        self.smoothing = smoothing
+        self.zero_threshold = zero_threshold
+
+        self.neutral = None
+        self.command = np.zeros(len(AXES))
+        self._smoothed = np.zeros(len(AXES))
+        self._inputs = np.zeros(len(AXES))
+
+    def engage(self, euler, flex):
+        """ Take the current hand pose as neutral and start from a zero command. """
+        self.neutral = (float(euler[0]), float(euler[1]), float(euler[2]), float(flex))
+        self.command[:] = 0
+        self._smoothed[:] = 0
+
+    def disengage(self):
+        self.neutral = None
+        self.reset()
+
+    def reset(self):
+        """ Start again from a zero command, keeping the neutral pose. """
+        self.command[:] = 0
+        self._smoothed[:] = 0
+
+    def update(self, euler, flex, dt):
+        """ Return the command for the current hand pose, dt seconds after the previous one. """
+        if self.neutral is None:
+            self.engage(euler, flex)
+        roll, pitch, yaw, neutral_flex = self.neutral
+        inputs = self._inputs
+        inputs[0] = euler[1] - pitch
+        inputs[1] = euler[0] - roll
+        inputs[2] = flex - neutral_flex
+        inputs[3] = wrap_angle(euler[2] - yaw)
+
+        target = np.sign(inputs) * np.maximum(np.abs(inputs) - self.deadband, 0.0) * self.gains
+        np.clip(target, -self.limits, self.limits, out=target)
+        if self.smoothing > 0:
+            self._smoothed += (target - self._smoothed) * (1.0 - math.exp(-dt / self.smoothing))
+        else:
+            self._smoothed[:] = target
+        step = self.max_rates * dt
+        self.command += np.clip(self._smoothed - self.command, -step, step)
+        # Smoothing only approaches zero, so finish the job once the hand is back in the deadband.
+        self.command[(target == 0) & (np.abs(self.command) < self.zero_threshold)] = 0.0
+        return self.command
+
+
+class ContinuousControl(object):
+    """
+    Send RemoteControl move commands at a fixed rate while the glove is engaged.
+
+    Every tick computes a new command, but it is only sent if it moved by at least
+    `min_change` on some axis since the last one sent, or if a non-zero command is
+    about to go stale on the vehicle (after `keepalive` seconds). A held hand therefore
+    costs a few datagrams per second, and a hand that is neutral none at all, because
+    the skill already stops the vehicle when commands expire.
+
+    If the newest IMU or finger frame is older than `input_timeout`, the glove has gone
+    quiet: a zero command is sent once and nothing more until fresh frames arrive, so
+    the vehicle never keeps flying on the last hand pose.
+
+    Args:
+        sender (udp_control.MotionCommandSender): Where commands are sent.
+
+        orientation (imu.OrientationStream): Hand orientation, polled every tick.
+
+        fingers (FrameRing): Finger frames from GloveSerialListener.
+
+        controller (ProportionalController): Defaults to ProportionalController().
+
+        rate (float): Ticks per second.
+
+        keepalive (float): Longest time a non-zero command goes without being resent.
+
+        min_change (float): Smallest change on any axis that is worth sending.
+
+        input_timeout (float): Age in seconds of the glove data at which the vehicle is stopped.
+    """
+
+    def __init__(self, sender, orientation, fingers, controller=None, rate=30.0,
+                 keepalive=KEEPALIVE_PERIOD, min_change=0.02, input_timeout=INPUT_TIMEOUT):
+        self.sender = sender
+        self.orientation = orientation
+        self.fingers = fingers
+        self.controller = controller or ProportionalController()
+        self.period = 1.0 / rate
+        self.keepalive = keepalive
+        self.min_change = min_change
+        self.input_timeout = input_timeout
+
+        self.last_sent = np.zeros(len(AXES))
+        self.last_send_time = None
+        self.last_tick = None
+        self._stop = threading.Event()
+
+        self.ticks = 0
+        self.sent = 0
+        self.skipped = 0
+        self.keepalives = 0
+        self.input_timeouts = 0
+        self.input_stale = False
+        self._send_times = collections.deque(maxlen=256)
+        self.tick_lateness = LatencyHistogram('tick lateness')
+        self.compute_latency = LatencyHistogram('command compute')
+
+    @property
+    def send_rate(self):
+        """ Commands sent per second over the last few seconds. """
+        times = self._send_times
+        if len(times) < 2:
+            return 0.0
+        now = time.monotonic()
+        window = max(now - times[0], self.period)
+        return len(times) / window if now - times[-1] < 2 * self.keepalive else 0.0
+
+    def tick(self, now=None):
+        """ Compute the command for the latest glove data and send it if needed. """
+        start = time.monotonic()
+        now = start if now is None else now
+        self.ticks += 1
+        if self.orientation.frames is not None:
+            self.orientation.poll()
+        latest = self.orientation.latest()
+        finger = self.fingers.latest()
+        if latest is None or finger is None:
+            return False
+        if now - min(latest[0], finger[2]) > self.input_timeout:
+            return self.stop_on_stale_input(now)
+        self.input_stale = False
+        dt = self.period if self.last_tick is None else now - self.last_tick
+        self.last_tick = now
+        command = self.controller.update(latest[2], hand_flex(finger[1]), dt)
+
+        changed = np.abs(command - self.last_sent).max() >= self.min_change
+        stale = self.last_sent.any() and (self.last_send_time is None or
+                                          now - self.last_send_time >= self.keepalive)
+        # Always land exactly on zero, even from below min_change.
+        stopping = not command.any() and self.last_sent.any()
+        self.compute_latency.record(time.monotonic() - start)
+        if not (changed or stale or stopping):
+            self.skipped += 1
+            return False
+        if stale and not changed:
+            self.keepalives += 1
+        self.send(command, now)
+        return True
+
+    def stop_on_stale_input(self, now):
+        """ Send a single zero command for glove data that stopped arriving. """
+        self.last_tick = None
+        if not self.input_stale:
+            self.input_stale = True
+            self.input_timeouts += 1
+        if not self.last_sent.any():
+            self.skipped += 1
+            return False
+        self.controller.reset()
+        self.send(self.controller.command, now)
+        return True
+
+    def send(self, command, now):
+        self.sender.send(*command.tolist())
+        self.last_sent[:] = command
+        self.last_send_time = now
+        self.sent += 1
+        self._send_times.append(now)
+
+    def run(self):
+        """ Tick at the configured rate until stop() is called or a tick fails, then stop the vehicle. """
+        next_tick = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now < next_tick:
+                    if self._stop.wait(next_tick - now):
+                        break
+                    now = time.monotonic()
+                self.tick_lateness.record(now - next_tick)
+                self.tick(now)
+                next_tick += self.period
+                if now - next_tick > self.period:
+                    # Fell behind, don't try to catch up with a burst of ticks.
+                    next_tick = now + self.period
+        finally:
+            self.controller.disengage()
+            self.send(self.controller.command, time.monotonic())
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self):
+        return '\n'.join([
+            'control: ticks={} sent={} skipped={} keepalives={} input timeouts={} send rate={:.1f}/s'.format(
+                self.ticks, self.sent, self.skipped, self.keepalives, self.input_timeouts, self.send_rate),
+            self.tick_lateness.format(),
+            self.compute_latency.format(),
+        ])
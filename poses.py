@@ -0,0 +1,117 @@
+"""
+Table driven hand pose classification for glove finger frames.
+
+Poses are described in poses.json as inclusive [min, max] bounds on the flex of each
+finger (the sum of its two sensors) and of the whole hand (the sum of all ten sensors).
+A null bound is open. The first pose in the table whose bounds all hold wins.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+
+
+DEFAULT_POSE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'poses.json')
+
+FEATURES = ('thumb', 'index', 'middle', 'ring', 'pinky', 'hand')
+
+# Frame id, length, 10 finger sensors and the battery byte.
+FINGER_FRAME_SIZE = 13
+SENSOR_SLICE = slice(2, 12)
+
+NO_POSE = -1
+
+
+def frames_to_array(frames):
+    """
+    Stack finger frames into an (N, FINGER_FRAME_SIZE) uint8 array.
+
+    Returns:
+        tuple: the array and a boolean mask of the frames long enough to classify.
+    """
+    joined = b''.join(frames)
+    if len(joined) == len(frames) * FINGER_FRAME_SIZE:
+        array = np.frombuffer(joined, dtype=np.uint8).reshape(-1, FINGER_FRAME_SIZE)
+        return array, np.ones(len(frames), dtype=bool)
+
+    array = np.zeros((len(frames), FINGER_FRAME_SIZE), dtype=np.uint8)
+    valid = np.zeros(len(frames), dtype=bool)
+    for row, frame in enumerate(frames):
+        frame = frame[:FINGER_FRAME_SIZE]
+        array[row, :len(frame)] = np.frombuffer(frame, dtype=np.uint8)
+        valid[row] = len(frame) >= SENSOR_SLICE.stop
+    return array, valid
+
+
+def frame_features(frames):
+    """ Compute thumb, index, middle, ring, pinky and hand flex for an (N, >=12) array of frames. """
+    sensors = np.asarray(frames)[:, SENSOR_SLICE].astype(np.int32)
+    fingers = sensors.reshape(-1, 5, 2).sum(axis=2)
+    hand = fingers.sum(axis=1, keepdims=True)
+    return np.concatenate([fingers, hand], axis=1)
+
+
+class PoseClassifier(object):
+    """
+    Evaluate every pose in a table against batches of finger frames with NumPy.
+
+    Args:
+        poses (list): Pose definitions, each a dict with a 'name' and optional
+            [min, max] bounds keyed by the names in FEATURES.
+
+        chunk_size (int): Frames compared at once, which bounds the temporary memory used
+            when classifying long recordings.
+    """
+
+    def __init__(self, poses, chunk_size=65536):
+        self.names = [pose['name'] for pose in poses]
+        self.chunk_size = chunk_size
+
+        info = np.iinfo(np.int32)
+        self.lower = np.full((len(poses), len(FEATURES)), info.min, dtype=np.int32)
+        self.upper = np.full((len(poses), len(FEATURES)), info.max, dtype=np.int32)
+        for row, pose in enumerate(poses):
+            for column, feature in enumerate(FEATURES):
+                low, high = pose.get(feature) or (None, None)
+                if low is not None:
+                    self.lower[row, column] = low
+                if high is not None:
+                    self.upper[row, column] = high
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_POSE_FILE, **kwargs):
+        """ Load a pose table from a JSON file. """
+        with open(path, 'r') as posef:
+            return cls(json.load(posef), **kwargs)
+
+    def classify_features(self, features):
+        """ Return the index of the matching pose for each row of features, or NO_POSE. """
+        features = np.asarray(features)
+        result = np.full(len(features), NO_POSE, dtype=np.int32)
+        for start in range(0, len(features), self.chunk_size):
+            chunk = features[start:start + self.chunk_size, None, :]
+            matches = ((chunk >= self.lower) & (chunk <= self.upper)).all(axis=2)
+            matched = matches.any(axis=1)
+            first = matches.argmax(axis=1)
+            result[start:start + len(first)] = np.where(matched, first, NO_POSE)
+        return result
+
+    def classify_array(self, frames):
+        """ Classify an (N, >=12) uint8 array of finger frames. Returns pose indices. """
+        return self.classify_features(frame_features(frames))
+
+    def classify_frames(self, frames):
+        """ Classify a list of finger frames. Returns a pose name or None for each frame. """
+        if not frames:
+            return []
+        array, valid = frames_to_array(frames)
+        indices = np.where(valid, self.classify_array(array), NO_POSE)
+        return [self.names[index] if index != NO_POSE else None for index in indices.tolist()]
+
+    def classify(self, frame):
+        """ Classify a single finger frame. """
+        return self.classify_frames([frame])[0]
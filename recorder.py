@@ -0,0 +1,279 @@
+"""
+Record decoded glove frames to disk and replay them.
+
+A recording is a 32 byte header followed by fixed-size records (see RECORD), one per
+frame, each holding the monotonic arrival time and the frame bytes. Fixed records let
+SessionRecording memory-map the file as a NumPy structured array without parsing it,
+and ReplaySerial turns it back into the glove's byte stream for GloveSerialListener.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from glove import FRAME_END, FRAME_START
+
+
+# magic, version, record size, frame size, wall clock and monotonic time at the start
+HEADER = struct.Struct('<8sHHIdd')
+MAGIC = b'HEDOGLV\x00'
+VERSION = 1
+
+# monotonic arrival time, frame length, frame bytes (id, length, payload) zero padded
+RECORD_FRAME_SIZE = 16
+RECORD = struct.Struct('<dB7x{}s'.format(RECORD_FRAME_SIZE))
+RECORD_DTYPE = np.dtype({
+    'names': ['stamp', 'length', 'frame'],
+    'formats': ['<f8', 'u1', ('u1', RECORD_FRAME_SIZE)],
+    'offsets': [0, 8, 16],
+    'itemsize': RECORD.size,
+})
+
+
+class SessionRecorder(object):
+    """
+    Append decoded frames to a recording file.
+
+    Records are packed with pack_into into a preallocated block that is written out
+    whenever it fills up, so recording costs one write per `block_records` frames.
+
+    Args:
+        path (str): File to create.
+
+        block_records (int): Number of records buffered between writes.
+    """
+
+    def __init__(self, path, block_records=1024):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, RECORD_FRAME_SIZE,
+                                     time.time(), time.monotonic()))
+        self._block = bytearray(RECORD.size * block_records)
+        self._view = memoryview(self._block)
+        self._pos = 0
+        self._lock = threading.Lock()
+
+        self.recorded = 0
+        self.oversize = 0
+
+    def record(self, frames, stamp=None):
+        """ Add a list of frames that arrived at monotonic time `stamp`. """
+        if stamp is None:
+            stamp = time.monotonic()
+        with self._lock:
+            if self._file is None:
+                return
+            for frame in frames:
+                if len(frame) > RECORD_FRAME_SIZE:
+                    self.oversize += 1
+                    continue
+                RECORD.pack_into(self._block, self._pos, stamp, len(frame), frame)
+                self._pos += RECORD.size
+                self.recorded += 1
+                if self._pos == len(self._block):
+                    self._write()
+
+    def _write(self):
+        self._file.write(self._view[:self._pos])
+        self._pos = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._write()
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._write()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionRecording(object):
+    """
+    Read-only view of a recording, memory-mapped as a structured array.
+
+    `records` has the fields stamp, length and frame (the padded frame bytes), and the
+    properties below are views into it, so nothing is copied until it is indexed.
+
+    Args:
+        path (str): File written by SessionRecorder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as recording:
+            header = recording.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('{} is not a glove recording'.format(path))
+        magic, version, record_size, frame_size, self.started, self.started_monotonic = \
+            HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size \
+                or frame_size != RECORD_FRAME_SIZE:
+            raise ValueError('{} is not a version {} glove recording'.format(path, VERSION))
+
+        # A recorder that was killed may have left a partial record at the end.
+        count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size,
+                                     shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def stamps(self):
+        return self.records['stamp']
+
+    @property
+    def lengths(self):
+        return self.records['length']
+
+    @property
+    def frames(self):
+        """ (n, 16) uint8 array of frames, laid out like glove.FrameDecoder's output. """
+        return self.records['frame']
+
+    @property
+    def frame_ids(self):
+        return self.records['frame'][:, 0]
+
+    @property
+    def duration(self):
+        if not len(self.records):
+            return 0.0
+        return float(self.stamps[-1] - self.stamps[0])
+
+    def select(self, frame_id):
+        """ Records of one frame type, e.g. glove.FRAME_ID_SENSOR. """
+        return self.records[self.frame_ids == frame_id]
+
+    def frame_bytes(self, index):
+        """ One frame as the bytes object FrameDecoder produced. """
+        record = self.records[index]
+        return record['frame'][:record['length']].tobytes()
+
+    def wire_bytes(self):
+        """
+        Re-encode the recording as the glove's serial byte stream.
+
+        Returns:
+            tuple: (stream, ends) where ends[i] is the stream offset just past record i.
+        """
+        lengths = self.lengths.astype(np.int64)
+        ends = np.cumsum(lengths + 2)
+        stream = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+        # Every byte but the start and end markers is frame data, so the frames, trimmed
+        # to their lengths and laid end to end, fill the rest of the stream in one go.
+        data = np.ones(len(stream), dtype=bool)
+        data[ends - lengths - 2] = False
+        data[ends - 1] = False
+        stream[~data] = np.tile([FRAME_START, FRAME_END], len(ends))
+        stream[data] = self.frames[np.arange(RECORD_FRAME_SIZE) < lengths[:, None]]
+        return stream.tobytes(), ends
+
+
+class ReplaySerial(object):
+    """
+    Serial port stand-in that plays a recording back to GloveSerialListener.
+
+    Frames become readable at their recorded times, scaled by `speed`, counted from the
+    first read. With speed=None the whole recording is readable at once, to push the
+    pipeline as fast as it can go. Bytes written to the port are collected in `written`.
+
+    Like a pyserial port, read() with timeout=0 returns whatever is due without waiting,
+    possibly nothing. Once the whole recording has been read it raises EOFError instead,
+    so a reader knows the replay is over.
+
+    Args:
+        recording (SessionRecording): The recording to play, or a path to one.
+
+        speed (float): Playback speed relative to real time, or None for unthrottled.
+
+        timeout (float): Seconds read() waits for data, like serial.Serial.timeout.
+    """
+
+    def __init__(self, recording, speed=1.0, timeout=1):
+        if not isinstance(recording, SessionRecording):
+            recording = SessionRecording(recording)
+        self.recording = recording
+        self.speed = speed
+        self.timeout = timeout
+        self.port = recording.path
+        self.baudrate = None
+        self.is_open = True
+        self.written = bytearray()
+
+        self._stream, self._ends = recording.wire_bytes()
+        stamps = recording.stamps
+        self._offsets = np.asarray(stamps - stamps[0]) if len(stamps) else np.zeros(0)
+        self._pos = 0
+        self._start = None
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+    @property
+    def done(self):
+        """ True once the whole recording has been read. """
+        return self._pos >= len(self._stream)
+
+    def _elapsed(self):
+        if self._start is None:
+            self._start = time.monotonic()
+        return (time.monotonic() - self._start) * self.speed
+
+    def _available(self):
+        """ Stream offset up to which frames are due. """
+        if self.speed is None:
+            return len(self._stream)
+        due = int(np.searchsorted(self._offsets, self._elapsed(), side='right'))
+        return int(self._ends[due - 1]) if due else 0
+
+    @property
+    def in_waiting(self):
+        return self._available() - self._pos
+
+    def read(self, size=1):
+        if self.done:
+            raise EOFError('end of recording {}'.format(self.port))
+        available = self._available()
+        if available <= self._pos:
+            if self.timeout == 0:
+                return b''
+            deadline = time.monotonic() + (self.timeout if self.timeout is not None else 1e9)
+            while available <= self._pos:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return b''
+                next_due = self._offsets[np.searchsorted(self._ends, self._pos, side='right')]
+                time.sleep(min(max(next_due - self._elapsed(), 0.0) / self.speed, remaining))
+                available = self._available()
+        end = min(self._pos + size, available)
+        data = self._stream[self._pos:end]
+        self._pos = end
+        return data
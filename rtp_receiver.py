@@ -0,0 +1,654 @@
+"""
+Receive the vehicle's RTP/JPEG (RFC 2435) video stream.
+
+The vehicle streams with the JPEG_RTP gstreamer pipeline to the port given in
+HTTPClient's stream_settings. RtpJpegReceiver reassembles the fragments into complete
+JPEG files, and JpegRtpPacketizer produces the same packets from local JPEG files so
+the receiver can be exercised without a vehicle.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import random
+import socket
+import struct
+import threading
+import time
+
+from metrics import LatencyHistogram
+
+
+RTP_HEADER = struct.Struct('!BBHII')
+JPEG_HEADER = struct.Struct('!BBHBBBB')  # type-specific, offset (24 bit), type, Q, width/8, height/8
+RESTART_HEADER = struct.Struct('!HH')
+QUANT_HEADER = struct.Struct('!BBH')
+
+RTP_VERSION = 2
+RTP_PAYLOAD_JPEG = 26
+# Sequence number jumps treated as loss or reordering rather than a new stream (RFC 3550).
+MAX_DROPOUT = 3000
+MAX_MISORDER = 100
+
+# What RtpJpegReceiver._track_sequence makes of a packet's sequence number.
+SEQ_ACCEPT = 0
+SEQ_DUPLICATE = 1
+SEQ_PROBATION = 2
+SEQ_RESTART = 3
+
+# RFC 2435 appendix A: default tables scaled by MakeTables for Q values below 128.
+ZIGZAG = (
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63,
+)
+LUMA_QUANTIZER = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)
+CHROMA_QUANTIZER = (
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99,
+) + (99,) * 32
+
+# RFC 2435 appendix B: the standard Huffman tables every RTP/JPEG frame uses.
+LUM_DC_CODELENS = (0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0)
+LUM_DC_SYMBOLS = tuple(range(12))
+LUM_AC_CODELENS = (0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d)
+LUM_AC_SYMBOLS = (
+    0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+    0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08, 0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+    0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16, 0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+    0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+    0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+    0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+    0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+    0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+    0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+    0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa,
+)
+CHM_DC_CODELENS = (0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0)
+CHM_DC_SYMBOLS = tuple(range(12))
+CHM_AC_CODELENS = (0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77)
+CHM_AC_SYMBOLS = (
+    0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21, 0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+    0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91, 0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+    0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34, 0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+    0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+    0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+    0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+    0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+    0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+    0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+    0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa,
+)
+
+EOI = b'\xff\xd9'
+
+
+def make_quant_tables(q):
+    """ Scale the default tables for a Q factor in 1..99 (RFC 2435 MakeTables). """
+    factor = min(max(q, 1), 99)
+    scale = 5000 // factor if q < 50 else 200 - factor * 2
+    luma = bytearray(64)
+    chroma = bytearray(64)
+    for i in range(64):
+        luma[i] = min(max((LUMA_QUANTIZER[ZIGZAG[i]] * scale + 50) // 100, 1), 255)
+        chroma[i] = min(max((CHROMA_QUANTIZER[ZIGZAG[i]] * scale + 50) // 100, 1), 255)
+    return bytes(luma + chroma)
+
+
+def _huffman_segment(codelens, symbols, table_no, table_class):
+    return (b'\xff\xc4' + struct.pack('!HB', 3 + len(codelens) + len(symbols),
+                                      (table_class << 4) | table_no)
+            + bytes(bytearray(codelens)) + bytes(bytearray(symbols)))
+
+
+HUFFMAN_SEGMENTS = b''.join([
+    _huffman_segment(LUM_DC_CODELENS, LUM_DC_SYMBOLS, 0, 0),
+    _huffman_segment(LUM_AC_CODELENS, LUM_AC_SYMBOLS, 0, 1),
+    _huffman_segment(CHM_DC_CODELENS, CHM_DC_SYMBOLS, 1, 0),
+    _huffman_segment(CHM_AC_CODELENS, CHM_AC_SYMBOLS, 1, 1),
+])
+
+
+def make_jpeg_header(jpeg_type, width, height, quant_tables, dri=0):
+    """ Rebuild the JPEG headers an RTP/JPEG frame was stripped of (RFC 2435 MakeHeaders). """
+    out = bytearray(b'\xff\xd8')
+    for table_no in range(len(quant_tables) // 64):
+        out += b'\xff\xdb' + struct.pack('!HB', 67, table_no)
+        out += quant_tables[64 * table_no:64 * (table_no + 1)]
+    chroma_table = 1 if len(quant_tables) >= 128 else 0
+    sampling = 0x21 if (jpeg_type & 0x3f) == 0 else 0x22
+    out += b'\xff\xc0' + struct.pack('!HBHHB', 17, 8, height, width, 3)
+    out += bytearray([0, sampling, 0, 1, 0x11, chroma_table, 2, 0x11, chroma_table])
+    if dri:
+        out += b'\xff\xdd' + struct.pack('!HH', 4, dri)
+    out += HUFFMAN_SEGMENTS
+    out += b'\xff\xda' + struct.pack('!HB', 12, 3)
+    out += bytearray([0, 0x00, 1, 0x11, 2, 0x11, 0, 63, 0])
+    return bytes(out)
+
+
+def _seq_newer(a, b):
+    """ True if 16 bit sequence number a comes after b. """
+    return 0 < ((a - b) & 0xFFFF) < 0x8000
+
+
+def _ts_newer(a, b):
+    """ True if 32 bit RTP timestamp a comes after b. """
+    return 0 < ((a - b) & 0xFFFFFFFF) < 0x80000000
+
+
+class _Assembly(object):
+    """ Fragments of one frame, collected into a preallocated buffer. """
+
+    def __init__(self, max_frame_bytes):
+        self.buf = bytearray(max_frame_bytes)
+        self.view = memoryview(self.buf)
+        self.reset(None, 0.0)
+
+    def reset(self, timestamp, arrival):
+        self.timestamp = timestamp
+        self.first_arrival = arrival
+        self.offsets = set()
+        self.received = 0
+        self.total = None
+        self.header = None
+
+
+class RtpJpegReceiver(object):
+    """
+    Reassemble RTP/JPEG packets from a UDP port into complete JPEG frames.
+
+    Up to `jitter_frames` frames are assembled at once, so packets that arrive out of
+    order or belong to different frames are placed by their fragment offset. Once a frame
+    completes, older incomplete frames are dropped as lost, and a frame that stays
+    incomplete past `frame_timeout` is dropped too.
+
+    Args:
+        port (int): UDP port to receive on, as given in stream_settings.
+
+        host (str): Interface to bind.
+
+        max_frame_bytes (int): Size of each preallocated reassembly buffer.
+
+        jitter_frames (int): Number of frames that may be incomplete at the same time.
+
+        frame_timeout (float): Seconds before an incomplete frame is given up on.
+    """
+
+    def __init__(self, port=55004, host='0.0.0.0', max_frame_bytes=1 << 20, jitter_frames=3,
+                 frame_timeout=0.5):
+        self.address = (host, port)
+        self.max_frame_bytes = max_frame_bytes
+        self.frame_timeout = frame_timeout
+
+        self._free = [_Assembly(max_frame_bytes) for _ in range(jitter_frames)]
+        self._pending = {}
+        self._output = bytearray(max_frame_bytes + 1024)
+        self._packet = bytearray(65536)
+        self._headers = {}
+        self._last_completed_ts = None
+
+        self._latest = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sock = None
+
+        self.packets = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.late = 0
+        self.invalid = 0
+        self.frames = 0
+        self.frames_dropped = 0
+        self.restarts = 0
+        self._highest_seq = None
+        self._bad_seq = None
+        self._fps_window = []
+        self.reassembly_latency = LatencyHistogram('reassembly')
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self.sock.bind(self.address)
+        self.sock.settimeout(0.2)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.sock:
+            self.sock.close()
+
+    @property
+    def port(self):
+        return self.sock.getsockname()[1] if self.sock else self.address[1]
+
+    def _run(self):
+        view = memoryview(self._packet)
+        while not self._stop.is_set():
+            try:
+                size = self.sock.recv_into(self._packet)
+            except socket.timeout:
+                self._expire(time.time())
+                continue
+            except socket.error:
+                if self._stop.is_set():
+                    return
+                raise
+            self.handle_packet(view[:size], time.time())
+
+    def latest(self):
+        """ Return (jpeg bytes, rtp timestamp, completion time) of the newest frame, or None. """
+        return self._latest
+
+    def wait_frame(self, after=None, timeout=None):
+        """ Wait for a frame newer than the completion time `after`. Returns it, or None on timeout. """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._latest is not None and (after is None or self._latest[2] > after),
+                timeout)
+            latest = self._latest
+        if latest is None or (after is not None and latest[2] <= after):
+            return None
+        return latest
+
+    def stats(self):
+        now = time.time()
+        window = [t for t in self._fps_window if now - t <= 1.0]
+        expected = self.packets + self.lost
+        return {
+            'fps': float(len(window)),
+            'packets': self.packets,
+            'lost': self.lost,
+            'loss_rate': float(self.lost) / expected if expected else 0.0,
+            'reordered': self.reordered,
+            'duplicates': self.duplicates,
+            'late': self.late,
+            'invalid': self.invalid,
+            'frames': self.frames,
+            'frames_dropped': self.frames_dropped,
+            'restarts': self.restarts,
+            'reassembly_ms': self.reassembly_latency.summary(),
+        }
+
+    def _track_sequence(self, seq):
+        """
+        Update loss, reorder and duplicate counts, following RFC 3550 A.1.
+
+        Returns:
+            int: SEQ_ACCEPT, SEQ_DUPLICATE for a packet already seen, SEQ_PROBATION for a
+                jump that may be a stray packet, or SEQ_RESTART once the packet after such
+                a jump confirms that the sender restarted.
+        """
+        if self._highest_seq is None:
+            self._highest_seq = seq
+            return SEQ_ACCEPT
+        delta = (seq - self._highest_seq) & 0xFFFF
+        if delta == 0:
+            self.duplicates += 1
+            return SEQ_DUPLICATE
+        if delta < MAX_DROPOUT:
+            self.lost += delta - 1
+            self._highest_seq = seq
+        elif delta <= 0x10000 - MAX_MISORDER:
+            # Too far from the last sequence number to be loss. Only a new stream if the
+            # next packet follows on from this one, so a stray packet can't flush the frames.
+            if seq != self._bad_seq:
+                self._bad_seq = (seq + 1) & 0xFFFF
+                return SEQ_PROBATION
+            self.restarts += 1
+            self._highest_seq = seq
+            self._bad_seq = None
+            return SEQ_RESTART
+        else:
+            # Arrived after a later packet, which counted it as lost.
+            self.reordered += 1
+            self.lost = max(0, self.lost - 1)
+        self._bad_seq = None
+        return SEQ_ACCEPT
+
+    def _restart(self):
+        for assembly in list(self._pending.values()):
+            self._drop(assembly)
+        self._last_completed_ts = None
+
+    def handle_packet(self, packet, arrival):
+        """ Process one RTP packet. Returns True if it completed a frame. """
+        if len(packet) < RTP_HEADER.size + JPEG_HEADER.size:
+            self.invalid += 1
+            return False
+        flags, marker_pt, seq, timestamp, _ = RTP_HEADER.unpack_from(packet)
+        if flags >> 6 != RTP_VERSION or marker_pt & 0x7f != RTP_PAYLOAD_JPEG:
+            self.invalid += 1
+            return False
+        self.packets += 1
+        sequence = self._track_sequence(seq)
+        if sequence == SEQ_DUPLICATE or sequence == SEQ_PROBATION:
+            return False
+        if sequence == SEQ_RESTART:
+            self._restart()
+
+        end = len(packet)
+        if flags & 0x20:
+            end -= packet[end - 1]
+        pos = RTP_HEADER.size + 4 * (flags & 0x0f)
+        if flags & 0x10:
+            if pos + 4 > end:
+                self.invalid += 1
+                return False
+            _, ext_words = struct.unpack_from('!HH', packet, pos)
+            pos += 4 + 4 * ext_words
+
+        if self._last_completed_ts is not None and not _ts_newer(timestamp, self._last_completed_ts):
+            self.late += 1
+            return False
+
+        # Every header is checked against the end of the payload before it is read, so a
+        # truncated packet is counted as invalid instead of raising struct.error.
+        if pos + JPEG_HEADER.size > end:
+            self.invalid += 1
+            return False
+        type_specific, offset_high, offset_low, jpeg_type, q, width, height = \
+            JPEG_HEADER.unpack_from(packet, pos)
+        pos += JPEG_HEADER.size
+        offset = (offset_high << 16) | offset_low
+
+        dri = 0
+        if 64 <= jpeg_type < 128:
+            if pos + RESTART_HEADER.size > end:
+                self.invalid += 1
+                return False
+            dri, _ = RESTART_HEADER.unpack_from(packet, pos)
+            pos += RESTART_HEADER.size
+        quant_tables = None
+        if offset == 0 and q >= 128:
+            if pos + QUANT_HEADER.size > end:
+                self.invalid += 1
+                return False
+            _, _, length = QUANT_HEADER.unpack_from(packet, pos)
+            pos += QUANT_HEADER.size
+            if pos + length > end:
+                self.invalid += 1
+                return False
+            quant_tables = bytes(packet[pos:pos + length])
+            pos += length
+
+        length = end - pos
+        if length < 0 or offset + length > self.max_frame_bytes:
+            self.invalid += 1
+            return False
+
+        assembly = self._assembly(timestamp, arrival)
+        if assembly is None:
+            return False
+        if offset in assembly.offsets:
+            self.duplicates += 1
+            return False
+        if offset == 0:
+            assembly.header = self._header(jpeg_type, q, width * 8, height * 8, dri, quant_tables)
+
+        assembly.view[offset:offset + length] = packet[pos:end]
+        assembly.offsets.add(offset)
+        assembly.received += length
+        if marker_pt & 0x80:
+            assembly.total = offset + length
+
+        if assembly.total is not None and assembly.received == assembly.total \
+                and assembly.header is not None:
+            self._complete(assembly, arrival)
+            return True
+        return False
+
+    def _header(self, jpeg_type, q, width, height, dri, quant_tables):
+        key = (jpeg_type, q, width, height, dri, quant_tables if q == 255 else None)
+        header = self._headers.get(key)
+        if header is None:
+            if quant_tables is None:
+                quant_tables = make_quant_tables(q)
+            header = make_jpeg_header(jpeg_type, width, height, quant_tables, dri)
+            if q != 255:
+                # Q 255 tables may change every frame, everything else is static.
+                self._headers[key] = header
+        return header
+
+    def _assembly(self, timestamp, arrival):
+        assembly = self._pending.get(timestamp)
+        if assembly is not None:
+            return assembly
+        self._expire(arrival)
+        if not self._free:
+            # Jitter buffer full: give up on the oldest frame.
+            oldest = min(self._pending.values(), key=lambda a: a.first_arrival)
+            self._drop(oldest)
+        assembly = self._free.pop()
+        assembly.reset(timestamp, arrival)
+        self._pending[timestamp] = assembly
+        return assembly
+
+    def _drop(self, assembly):
+        self.frames_dropped += 1
+        del self._pending[assembly.timestamp]
+        self._free.append(assembly)
+
+    def _expire(self, now):
+        for assembly in list(self._pending.values()):
+            if now - assembly.first_arrival > self.frame_timeout:
+                self._drop(assembly)
+
+    def _complete(self, assembly, arrival):
+        header = assembly.header
+        total = assembly.total
+        out = self._output
+        end = len(header) + total
+        out[:len(header)] = header
+        out[len(header):end] = assembly.view[:total]
+        if assembly.buf[total - 2:total] != EOI:
+            out[end:end + 2] = EOI
+            end += 2
+        jpeg = bytes(out[:end])
+
+        timestamp = assembly.timestamp
+        del self._pending[timestamp]
+        self._free.append(assembly)
+        # Anything older that is still incomplete will never be shown now.
+        for older in [a for a in self._pending.values() if _ts_newer(timestamp, a.timestamp)]:
+            self._drop(older)
+        self._last_completed_ts = timestamp
+
+        now = time.time()
+        self.frames += 1
+        self.reassembly_latency.record(arrival - assembly.first_arrival)
+        self._fps_window.append(now)
+        if len(self._fps_window) > 256:
+            del self._fps_window[:128]
+        with self._cond:
+            self._latest = (jpeg, timestamp, now)
+            self._cond.notify_all()
+
+
+class JpegRtpPacketizer(object):
+    """
+    Split baseline JPEG files into RFC 2435 RTP packets, like gstreamer's rtpjpegpay.
+
+    Quantization tables are sent in-band (Q=255), so any quality setting round-trips.
+    The JPEG must use the standard Huffman tables, as produced by default by libjpeg.
+
+    Args:
+        mtu (int): Largest RTP packet to produce.
+    """
+
+    def __init__(self, mtu=1400, ssrc=0x48454430):
+        self.mtu = mtu
+        self.ssrc = ssrc
+        self.seq = random.randint(0, 0xFFFF)
+
+    @staticmethod
+    def parse_jpeg(jpeg):
+        """ Return (type, width, height, dri, quant tables, scan data) for a baseline JPEG. """
+        pos = 2
+        tables = {}
+        width = height = None
+        jpeg_type = 1
+        dri = 0
+        while pos < len(jpeg):
+            if jpeg[pos] != 0xFF:
+                raise ValueError('Bad JPEG marker at {}'.format(pos))
+            marker = jpeg[pos + 1]
+            length = struct.unpack_from('!H', jpeg, pos + 2)[0]
+            segment = jpeg[pos + 4:pos + 2 + length]
+            if marker == 0xDB:
+                i = 0
+                while i < len(segment):
+                    if segment[i] >> 4:
+                        raise ValueError('16 bit quantization tables are not supported')
+                    tables[segment[i] & 0x0f] = bytes(segment[i + 1:i + 65])
+                    i += 65
+            elif marker == 0xC0:
+                height, width = struct.unpack_from('!HH', segment, 1)
+                if segment[5] != 3 or segment[7] not in (0x21, 0x22) \
+                        or segment[10] != 0x11 or segment[13] != 0x11:
+                    raise ValueError('Only 4:2:2 and 4:2:0 YCbCr JPEG can be sent over RTP')
+                jpeg_type = 0 if segment[7] == 0x21 else 1
+            elif marker == 0xDD:
+                dri = struct.unpack_from('!H', segment)[0]
+            elif marker == 0xDA:
+                scan = jpeg[pos + 2 + length:]
+                if scan.endswith(EOI):
+                    scan = scan[:-2]
+                if dri:
+                    jpeg_type += 64
+                quant = b''.join(tables[k] for k in sorted(tables))
+                return jpeg_type, width, height, dri, quant, bytes(scan)
+            elif marker in (0xC1, 0xC2, 0xC3):
+                raise ValueError('Only baseline JPEG is supported')
+            pos += 2 + length
+        raise ValueError('No scan found')
+
+    def packetize(self, jpeg, timestamp):
+        """ Return the list of RTP packets for one JPEG file. """
+        jpeg_type, width, height, dri, quant, scan = self.parse_jpeg(jpeg)
+        packets = []
+        offset = 0
+        while offset < len(scan) or not packets:
+            header = bytearray()
+            header += JPEG_HEADER.pack(0, offset >> 16, offset & 0xFFFF, jpeg_type, 255,
+                                       width // 8, height // 8)
+            if dri:
+                header += RESTART_HEADER.pack(dri, 0xFFFF)
+            if offset == 0:
+                header += QUANT_HEADER.pack(0, 0, len(quant)) + quant
+            room = self.mtu - RTP_HEADER.size - len(header)
+            chunk = scan[offset:offset + room]
+            last = offset + len(chunk) >= len(scan)
+            self.seq = (self.seq + 1) & 0xFFFF
+            rtp = RTP_HEADER.pack(RTP_VERSION << 6, (0x80 if last else 0) | RTP_PAYLOAD_JPEG,
+                                  self.seq, timestamp & 0xFFFFFFFF, self.ssrc)
+            packets.append(rtp + bytes(header) + chunk)
+            offset += len(chunk)
+        return packets
+
+
+def _huffman_codes(codelens, symbols):
+    """ Canonical Huffman (code, length) for each symbol of a DHT table. """
+    codes = {}
+    code = 0
+    index = 0
+    for length, count in enumerate(codelens, 1):
+        for _ in range(count):
+            codes[symbols[index]] = (code, length)
+            code += 1
+            index += 1
+        code <<= 1
+    return codes
+
+
+def synthetic_jpeg(width, height, level, q=50):
+    """
+    Encode a flat grey baseline JPEG without any imaging library.
+
+    Every block has only a DC coefficient, so the scan is a handful of Huffman codes per
+    block. `level` is the quantized luma DC value (-63..63); vary it to tell frames apart.
+    """
+    lum_dc = _huffman_codes(LUM_DC_CODELENS, LUM_DC_SYMBOLS)
+    lum_ac = _huffman_codes(LUM_AC_CODELENS, LUM_AC_SYMBOLS)
+    chm_dc = _huffman_codes(CHM_DC_CODELENS, CHM_DC_SYMBOLS)
+    chm_ac = _huffman_codes(CHM_AC_CODELENS, CHM_AC_SYMBOLS)
+
+    bits = []
+
+    def put(code, length):
+        bits.extend((code >> (length - 1 - i)) & 1 for i in range(length))
+
+    def put_dc(codes, value):
+        size = abs(value).bit_length()
+        put(*codes[size])
+        if size:
+            put(value if value >= 0 else value + (1 << size) - 1, size)
+
+    mcus = ((width + 15) // 16) * ((height + 15) // 16)
+    for mcu in range(mcus):
+        for block in range(4):
+            put_dc(lum_dc, level if mcu == 0 and block == 0 else 0)
+            put(*lum_ac[0x00])
+        for _ in range(2):
+            put(*chm_dc[0])
+            put(*chm_ac[0x00])
+    bits.extend([1] * (-len(bits) % 8))
+
+    scan = bytearray()
+    for i in range(0, len(bits), 8):
+        byte = 0
+        for bit in bits[i:i + 8]:
+            byte = (byte << 1) | bit
+        scan.append(byte)
+        if byte == 0xFF:
+            scan.append(0)
+    return make_jpeg_header(1, width, height, make_quant_tables(q)) + bytes(scan) + EOI
+
+
+def replay_jpeg_frames(frames, address, fps=30.0, loss=0.0, reorder=0.0, mtu=1400, seed=0):
+    """
+    Send JPEG files to a receiver as an RTP stream, optionally losing and reordering packets.
+
+    Returns:
+        int: the number of packets sent.
+    """
+    rng = random.Random(seed)
+    packetizer = JpegRtpPacketizer(mtu)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    start = time.time()
+    for index, jpeg in enumerate(frames):
+        packets = packetizer.packetize(jpeg, int(index * 90000 / fps))
+        for i in range(len(packets) - 1):
+            if rng.random() < reorder:
+                packets[i], packets[i + 1] = packets[i + 1], packets[i]
+        for packet in packets:
+            if rng.random() >= loss:
+                sock.sendto(packet, address)
+                sent += 1
+        delay = start + (index + 1) / fps - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    sock.close()
+    return sent
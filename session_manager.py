@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+"""
+Drive several glove/vehicle pairs from one process.
+
+Each GloveSession owns the whole pipeline of one pair: glove listener, gesture loop,
+command dispatcher and HTTPClient. The SessionManager reads every glove from a single
+selector thread and classifies frames right after they are decoded, so an idle session
+costs nothing and N sessions do not need N reader threads.
+
+Usage:
+    python session_manager.py /dev/rfcomm0=http://192.168.10.1 /dev/rfcomm1=http://192.168.10.2
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import selectors
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gestures import GestureLoop, GestureStateMachine
+from glove import GloveSerialListener, FRAME_ID_IMU, FRAME_ID_SENSOR
+from http_client import HTTPClient, make_dispatcher, pose_commands
+from metrics import LatencyHistogram
+from vehicle_api import PilotRefused
+
+STATUS_PERIOD = 2.0  # [s] Keep-alive status ping interval for each session.
+RECONNECT_MIN_BACKOFF = 0.5  # [s] First wait before reopening a glove that dropped out.
+RECONNECT_MAX_BACKOFF = 10.0  # [s] Longest wait between attempts to reopen it.
+
+
+class GloveSession(object):
+    """
+    One glove driving one vehicle.
+
+    Nothing runs on its own thread except the command dispatcher, whose worker is
+    parked until a gesture submits a command. Reading and classifying are done by the
+    SessionManager that owns the session.
+
+    Args:
+        name (str): Label used in reports.
+
+        device (str): Serial device of the glove.
+
+        url (str): Vehicle url.
+
+        bluetooth (bool): Ask the glove to stream over bluetooth instead of USB.
+
+        gestures (GestureStateMachine): Debouncing settings for this glove.
+
+        client_factory (callable): Creates the vehicle client from the url, defaults to a
+            pilot HTTPClient.
+    """
+
+    def __init__(self, name, device, url, bluetooth=True, gestures=None, client_factory=None):
+        self.name = name
+        self.device = device
+        self.url = url
+        self.bluetooth = bluetooth
+        self.gestures = gestures or GestureStateMachine()
+        self.client_factory = client_factory or (lambda url: HTTPClient(url, pilot=True))
+
+        self.client = None
+        self.listener = None
+        self.gesture_loop = None
+        self.dispatcher = None
+        self.commands = {}
+
+        self.connected = False
+        self.read_errors = 0
+        self.status_errors = 0
+        self.last_error = None
+        self.last_status = None
+        self.next_status = 0.0
+        self.command_latency = LatencyHistogram('command')
+        self.backoff = RECONNECT_MIN_BACKOFF
+        self.next_reconnect = None
+        self._report_time = None
+        self._report_frames = 0
+
+    def connect(self):
+        """ Authenticate with the vehicle and open the glove. Blocks, so run sessions in parallel. """
+        # Open the glove first, so a missing glove fails before authenticating. The manager
+        # does the reading, and reopening (see SessionManager.reconnect_due_sessions).
+        self.listener = GloveSerialListener(self.device, bluetooth=self.bluetooth, reconnect=False)
+        self.client = self.client_factory(self.url)
+        self.commands = pose_commands(self.client)
+        self.gesture_loop = GestureLoop(self.listener.rings[FRAME_ID_SENSOR], self.dispatch_pose,
+                                        gestures=self.gestures)
+        self.dispatcher = make_dispatcher(on_phase=self.report_phase, on_done=self.report_done)
+        self.dispatcher.start()
+        self.client.register_metrics(session=self.name)
+        self.listener.register_metrics(session=self.name, device=self.device)
+        self.gesture_loop.register_metrics(session=self.name)
+        self.listener.start_streaming()
+        self.connected = True
+        self._report_time = time.monotonic()
+        return self
+
+    def fileno(self):
+        return self.listener.glove.fileno()
+
+    def read(self):
+        """ Decode the bytes waiting on the glove and classify the finger frames among them. """
+        self.listener.read_available()
+        self.gesture_loop.poll()
+
+    def disconnect(self, error):
+        """ Close the glove after a read error and schedule reopening it. """
+        self.read_errors += 1
+        self.retry_later(error)
+
+    def retry_later(self, error):
+        """ Close the glove and reopen it after the backoff, which doubles every time. """
+        self.last_error = error
+        self.connected = False
+        try:
+            self.listener.glove.close()
+        except (IOError, OSError):
+            pass
+        self.next_reconnect = time.monotonic() + self.backoff
+        self.backoff = min(self.backoff * 2, RECONNECT_MAX_BACKOFF)
+
+    def reconnect(self):
+        """ Reopen the glove and ask it to stream again. Runs on the manager's pool. """
+        self.listener.open()
+        self.listener.start_streaming()
+        self.connected = True
+
+    def dispatch_pose(self, pose):
+        print("{}: {}".format(self.name, pose))
+        if pose in self.commands:
+            name, command = self.commands[pose]
+            self.dispatcher.submit(name, command)
+
+    def report_phase(self, command, phase):
+        print("{}: {}: flight phase {}".format(self.name, command.name, phase))
+
+    def report_done(self, command):
+        if not command.future.cancelled() and not command.future.exception():
+            self.command_latency.record(time.time() - command.submitted)
+
+    def ping_status(self):
+        """ Keep the pilot session alive. Runs on the manager's status pool. """
+        try:
+            self.client.get_status(max_age=STATUS_PERIOD)
+            self.last_status = time.monotonic()
+        except Exception as error:  # pylint: disable=broad-except
+            self.status_errors += 1
+            self.last_error = error
+
+    def close(self):
+        self.connected = False
+        if self.dispatcher:
+            self.dispatcher.stop(timeout=1)
+        if self.listener:
+            self.listener.close()
+
+    @property
+    def frames(self):
+        return sum(ring.seq for ring in self.listener.rings.values()) if self.listener else 0
+
+    def health(self):
+        """ Counters and latencies of this session. Frame rate is measured since the previous call. """
+        now = time.monotonic()
+        frames = self.frames
+        rate = 0.0
+        if self._report_time is not None and now > self._report_time:
+            rate = (frames - self._report_frames) / (now - self._report_time)
+        self._report_time = now
+        self._report_frames = frames
+
+        health = {
+            'name': self.name,
+            'connected': self.connected,
+            'frames': frames,
+            'frames_per_second': rate,
+            'read_errors': self.read_errors,
+            'status_errors': self.status_errors,
+            'last_error': str(self.last_error) if self.last_error else None,
+        }
+        if self.listener:
+            sensor = self.listener.rings[FRAME_ID_SENSOR].latest()
+            health['last_frame_age'] = now - sensor[2] if sensor else None
+            health['dropped'] = sum(ring.dropped for ring in self.listener.rings.values())
+            health['imu_frames'] = self.listener.rings[FRAME_ID_IMU].seq
+        if self.last_status is not None:
+            health['last_status_age'] = now - self.last_status
+        if self.gesture_loop:
+            health['classify'] = self.gesture_loop.classify_latency.summary()
+            health['dispatch'] = self.gesture_loop.dispatch_latency.summary()
+            health['gestures'] = dict(self.gestures.dispatched)
+            health['overruns'] = self.gesture_loop.overruns
+        if self.dispatcher:
+            health['commands'] = dict(self.dispatcher.submitted)
+        health['command_latency'] = self.command_latency.summary()
+        if self.client:
+            health['endpoints'] = dict((name, histogram.summary())
+                                       for name, histogram in self.client.latency.items())
+        return health
+
+    def format(self):
+        health = self.health()
+        lines = ['{name}: connected={connected} frames={frames} ({frames_per_second:.0f}/s) '
+                 'read_errors={read_errors} status_errors={status_errors}'.format(**health)]
+        if self.gesture_loop:
+            lines.append('  ' + self.gesture_loop.classify_latency.format())
+            lines.append('  ' + self.gesture_loop.dispatch_latency.format())
+            lines.append('  ' + self.gestures.format())
+        lines.append('  ' + self.command_latency.format())
+        if self.client:
+            lines += ['  ' + line for line in self.client.latency_report().splitlines()]
+        return '\n'.join(lines)
+
+
+class SessionManager(object):
+    """
+    Read every session's glove from one selector thread.
+
+    The thread sleeps in select() until a glove has bytes or a status ping is due. Status
+    pings, connecting and reopening gloves that dropped out go through a small thread
+    pool, since HTTPClient and opening a port block.
+
+    Args:
+        sessions (list): GloveSession objects to run.
+
+        status_workers (int): Threads for concurrent status pings, defaults to one per session.
+    """
+
+    def __init__(self, sessions, status_workers=None):
+        self.sessions = list(sessions)
+        self.selector = selectors.DefaultSelector()
+        self.pool = ThreadPoolExecutor(max_workers=status_workers or max(1, len(self.sessions)))
+        self._pinging = set()
+        self._reconnecting = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.wakeups = 0
+        self.loop_latency = LatencyHistogram('read and classify')
+
+    def connect(self):
+        """ Connect every session in parallel. Sessions that fail are reported and left out. """
+        futures = dict((self.pool.submit(session.connect), session) for session in self.sessions)
+        for future, session in futures.items():
+            try:
+                future.result()
+            except PilotRefused as error:
+                session.last_error = error
+                session.close()
+                print("{}: vehicle refused pilot access, leaving it out".format(session.name))
+                continue
+            except Exception as error:  # pylint: disable=broad-except
+                session.last_error = error
+                session.close()
+                print("{}: failed to connect: {}".format(session.name, error))
+                continue
+            self.selector.register(session.fileno(), selectors.EVENT_READ, session)
+
+    def start(self):
+        self.connect()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        for session in self.sessions:
+            session.close()
+        self.pool.shutdown(wait=False)
+
+    def run(self):
+        while not self._stop.is_set():
+            timeout = min(self.ping_due_sessions(), self.reconnect_due_sessions())
+            for key, _ in self.selector.select(min(timeout, 0.5)):
+                session = key.data
+                start = time.monotonic()
+                try:
+                    session.read()
+                except (IOError, OSError) as error:
+                    self.selector.unregister(key.fileobj)
+                    session.disconnect(error)
+                    print("{}: glove disconnected: {}".format(session.name, error))
+                    continue
+                # Only a glove that delivers data has recovered.
+                session.backoff = RECONNECT_MIN_BACKOFF
+                self.wakeups += 1
+                self.loop_latency.record(time.monotonic() - start)
+
+    def ping_due_sessions(self):
+        """ Start the status pings that are due. Returns seconds until the next one. """
+        now = time.monotonic()
+        next_due = now + STATUS_PERIOD
+        for session in self.sessions:
+            if not session.connected:
+                continue
+            if session.next_status <= now and session not in self._pinging:
+                session.next_status = now + STATUS_PERIOD
+                self._pinging.add(session)
+                future = self.pool.submit(session.ping_status)
+                future.add_done_callback(lambda _, session=session: self._pinging.discard(session))
+            next_due = min(next_due, session.next_status)
+        return max(0.0, next_due - now)
+
+    def reconnect_due_sessions(self):
+        """
+        Reopen the gloves that dropped out once their backoff is over. Returns seconds
+        until the next attempt is due.
+        """
+        now = time.monotonic()
+        for session, future in list(self._reconnecting.items()):
+            if not future.done():
+                continue
+            del self._reconnecting[session]
+            error = future.exception()
+            if error is None:
+                self.selector.register(session.fileno(), selectors.EVENT_READ, session)
+                print("{}: glove reconnected".format(session.name))
+            else:
+                session.retry_later(error)
+
+        next_due = now + STATUS_PERIOD
+        for session in self.sessions:
+            if session.next_reconnect is None:
+                continue
+            if session.next_reconnect <= now:
+                session.next_reconnect = None
+                self._reconnecting[session] = self.pool.submit(session.reconnect)
+            else:
+                next_due = min(next_due, session.next_reconnect)
+        return max(0.0, next_due - now)
+
+    def health(self):
+        return [session.health() for session in self.sessions]
+
+    def report(self):
+        lines = ['manager: sessions={} wakeups={}'.format(len(self.sessions), self.wakeups),
+                 self.loop_latency.format()]
+        lines += [session.format() for session in self.sessions]
+        return '\n'.join(lines)
+
+
+def parse_pair(text):
+    device, _, url = text.partition('=')
+    if not url:
+        raise argparse.ArgumentTypeError('expected DEVICE=URL, got {}'.format(text))
+    return device, url
+
+
+def run_sessions(pairs, bluetooth=True, report_period=10.0):
+    """ Run a session for each (device, url) pair and print reports until interrupted. """
+    sessions = [GloveSession('glove{}'.format(index), device, url, bluetooth=bluetooth)
+                for index, (device, url) in enumerate(pairs)]
+    manager = SessionManager(sessions).start()
+    try:
+        while True:
+            time.sleep(report_period)
+            print(manager.report())
+    except KeyboardInterrupt:
+        manager.stop()
+        print(manager.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('pairs', nargs='+', type=parse_pair, metavar='DEVICE=URL',
+                        help='glove serial device and the vehicle it controls')
+    parser.add_argument('--usb', action='store_true', help='gloves are connected over USB')
+    parser.add_argument('--report-period', type=float, default=10.0,
+                        help='seconds between health reports')
+    args = parser.parse_args()
+    run_sessions(args.pairs, bluetooth=not args.usb, report_period=args.report_period)
+
+
+if __name__ == '__main__':
+    main()
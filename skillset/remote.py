@@ -1,35 +1,188 @@
 from __future__ import absolute_import
 from __future__ import print_function
 import json
+import socket
+import struct
+import time
+import zlib
 import numpy as np
 
 from vehicle.skills.skills import Skill
 
 
 class MotionCommand(object):
+    """ The current motion command. Updated in place so no tick allocates a new one. """
+    __slots__ = ('utime', 'vel_body', 'yaw_rate', 'pitch_rate')
 
-    def __init__(self, utime, data):
-        self.utime = utime
+    def __init__(self):
+        self.utime = None
+        self.vel_body = np.zeros(3)
+        self.yaw_rate = 0.0
+        self.pitch_rate = 0.0
 
-        velx, vely, velz, yaw_rate, pitch_rate = data
-        vel_body = np.array([velx, vely, velz])
-        self.vel_body = vel_body
+    def update(self, utime, data):
+        # Check the whole command before touching any of it, so a malformed one leaves the
+        # previous command intact, and only mark it current once it is all in place.
+        vx, vy, vz, yaw_rate, pitch_rate = map(float, data)
+        vel_body = self.vel_body
+        vel_body[0], vel_body[1], vel_body[2] = vx, vy, vz
         self.yaw_rate = yaw_rate
         self.pitch_rate = pitch_rate
+        self.utime = utime
+
+
+class TickProfile(object):
+    """ Running statistics of a duration, such as how long each update() takes, compared to a budget. """
+    __slots__ = ('budget', 'ticks', 'total', 'max', 'over_budget', 'hook')
+
+    def __init__(self, budget, hook=None):
+        self.budget = budget
+        self.ticks = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.over_budget = 0
+        # Optionally called with the duration of every tick.
+        self.hook = hook
+
+    def record(self, seconds):
+        self.ticks += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds > self.budget:
+            self.over_budget += 1
+        if self.hook:
+            self.hook(seconds)
+
+    def as_dict(self):
+        return {
+            'count': self.ticks,
+            'mean_ms': round(1000 * self.total / self.ticks, 3) if self.ticks else None,
+            'max_ms': round(1000 * self.max, 3),
+            'over_budget': self.over_budget,
+        }
 
 
 COMMAND_TIMEOUT = 1.0  # [s] Number of seconds to keep executing a command.
 # This prevents the vehicle from continuing to fly after WiFi loss
 
+STATUS_PERIOD = 0.5  # [s] Minimum time between status messages to the phone.
+STATUS_PRECISION = 2  # Decimal places kept when checking whether the status changed.
+TICK_BUDGET = 0.005  # [s] Time update() should stay within.
+COMMAND_AGE_BUDGET = 0.1  # [s] Age by which a command should have been applied.
+CLOCK_DRIFT = 1e-3  # Rate at which the clock offset baseline creeps up, to follow drift between the clocks.
+STALE_RESYNC = 10  # Stale motion datagrams in a row after which the clock offset is measured afresh.
+
+ZERO_VEL = np.zeros(3)
+
+# Binary motion datagrams, must match udp_control.py on the client:
+# magic, version, flags, sender session, sequence number, sender monotonic time [us],
+# velx, vely, velz, yaw_rate, pitch_rate
+MOTION_DATAGRAM = struct.Struct('<2sBBHIQ5f')
+MOTION_MAGIC = b'RC'
+MOTION_VERSION = 1
+MOTION_UDP_PORT = 55010
+
+# Batches of custom_comms messages, must match comms_batch.py on the client:
+# magic, version, flags, message count, then each message as a uint32 length and its bytes.
+BATCH_HEADER = struct.Struct('<2sBBH')
+BATCH_LENGTH = struct.Struct('<I')
+BATCH_MAGIC = b'CB'
+BATCH_VERSION = 1
+BATCH_FLAG_ZLIB = 1
+
+
+def unpack_batch(message):
+    """ Return the messages in a batch, or None if it is malformed. """
+    if len(message) < BATCH_HEADER.size:
+        return None
+    magic, version, flags, count = BATCH_HEADER.unpack_from(message)
+    if magic != BATCH_MAGIC or version != BATCH_VERSION:
+        return None
+    body = message[BATCH_HEADER.size:]
+    if flags & BATCH_FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            return None
+    messages = []
+    pos = 0
+    for _ in range(count):
+        if pos + BATCH_LENGTH.size > len(body):
+            return None
+        length, = BATCH_LENGTH.unpack_from(body, pos)
+        pos += BATCH_LENGTH.size
+        if pos + length > len(body):
+            return None
+        messages.append(body[pos:pos + length])
+        pos += length
+    return messages
+
+
+def pack_batch(messages):
+    parts = [BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, 0, len(messages))]
+    for message in messages:
+        parts.append(BATCH_LENGTH.pack(len(message)))
+        parts.append(message)
+    return b''.join(parts)
+
 
 class RemoteControl(Skill):
     """ Control the vehicle from an separate computer via WiFi or USB ethernet. """
 
-    def __init__(self):
+    def __init__(self, status_period=STATUS_PERIOD):
         super(RemoteControl, self).__init__()
-        self.command = None
+        self.command = MotionCommand()
+
+        self.status_period = status_period
+        self.last_status_utime = None
+        self.last_status = None
+        self.tick_profile = TickProfile(TICK_BUDGET)
+
+        # Ordering and staleness tracking for binary motion commands.
+        self.sender_session = None
+        self.last_seq = None
+        self.min_clock_offset = None
+        self.clock_offset_utime = None
+        self.stale_in_a_row = 0
+        self.dropped_stale = 0
+        self.dropped_out_of_order = 0
+
+        # custom_comms batches received, and messages in them that could not be parsed.
+        self.batches = 0
+        self.dropped_malformed = 0
+
+        # Latest battery and link quality snapshot from the glove (see link_telemetry.py).
+        self.glove_telemetry = None
+
+        # Time from a command being sent to it first being applied, as far as the
+        # unsynchronized clocks allow (see handle_motion_datagram).
+        self.command_age = TickProfile(COMMAND_AGE_BUDGET)
+        self.command_applied = True
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.sock.bind(('', MOTION_UDP_PORT))
+            self.sock.setblocking(False)
+        except socket.error:
+            # Fall back to custom_comms only.
+            self.close_motion_socket()
+
+    def exit(self, api):
+        """ Called when the skill exits: free the motion port for the next skill. """
+        self.close_motion_socket()
+
+    def close_motion_socket(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
 
     def update(self, api):
+        start = time.time()
+        self.tick(api)
+        self.tick_profile.record(time.time() - start)
+
+    def tick(self, api):
         # Don't allow subject tracking in this mode.
         api.subject.cancel_subject_tracking(api.utime)
 
@@ -39,23 +192,26 @@ class RemoteControl(Skill):
         # Set the upper-limit for vehicle speed
         api.movement.set_max_speed(12.0)
 
+        # Pick up any motion datagrams that arrived since the last tick.
+        self.poll_motion_socket(api)
+
         # Publish a status message to the phone with some data in it.
-        status = {}
-        status['speed'] = api.vehicle.get_speed()
-        status['position'] = list(api.vehicle.get_position())
-        api.custom_comms.publish_status(json.dumps(status))
+        self.publish_status(api)
 
-        if not self.command:
+        if self.command.utime is None:
             # Nothing to do
             return
 
         elapsed_seconds = (api.utime - self.command.utime) / 1e6
         if elapsed_seconds > COMMAND_TIMEOUT:
             # The command has expired. Stop the vehicle.
-            api.movement.set_desired_vel_body(np.array([0, 0, 0]))
+            api.movement.set_desired_vel_body(ZERO_VEL)
             api.movement.set_heading_rate(0)
         else:
             # Keep applying the current command.
+            if not self.command_applied:
+                self.command_applied = True
+                self.command_age.record(elapsed_seconds)
             api.movement.set_desired_vel_body(self.command.vel_body)
             api.movement.set_heading_rate(self.command.yaw_rate)
 
@@ -64,9 +220,135 @@ class RemoteControl(Skill):
             pitch = api.vehicle.get_gimbal_pitch()
             api.movement.set_gimbal_pitch(pitch + self.command.pitch_rate)
 
+    def publish_status(self, api):
+        """
+        Send speed, position and the glove's battery and link state to the phone, at most
+        every status_period and only when they change.
+        """
+        if self.last_status_utime is not None and \
+                api.utime - self.last_status_utime < self.status_period * 1e6:
+            return
+        self.last_status_utime = api.utime
+
+        position = api.vehicle.get_position()
+        status = (round(api.vehicle.get_speed(), STATUS_PRECISION),
+                  round(position[0], STATUS_PRECISION),
+                  round(position[1], STATUS_PRECISION),
+                  round(position[2], STATUS_PRECISION),
+                  self.glove_telemetry.get('battery') if self.glove_telemetry else None,
+                  self.glove_telemetry.get('state') if self.glove_telemetry else None)
+        if status == self.last_status:
+            return
+        self.last_status = status
+        api.custom_comms.publish_status(json.dumps({
+            'speed': status[0],
+            'position': status[1:4],
+            'glove': {'battery': status[4], 'link': status[5]},
+        }))
+
+    def poll_motion_socket(self, api):
+        if not self.sock:
+            return
+        while True:
+            try:
+                datagram = self.sock.recv(MOTION_DATAGRAM.size + 1)
+            except socket.error:
+                return
+            self.handle_motion_datagram(api, datagram)
+
+    def handle_motion_datagram(self, api, datagram):
+        """ Apply a binary motion command unless it is out of order or stale. """
+        if len(datagram) != MOTION_DATAGRAM.size:
+            return
+        fields = MOTION_DATAGRAM.unpack(datagram)
+        magic, version, _, session, seq, sent_utime = fields[:6]
+        if magic != MOTION_MAGIC or version != MOTION_VERSION:
+            return
+
+        if session != self.sender_session:
+            # A new sender, forget the old sequence and clock.
+            self.sender_session = session
+            self.last_seq = None
+            self.min_clock_offset = None
+            self.stale_in_a_row = 0
+        if self.last_seq is not None:
+            ahead = (seq - self.last_seq) & 0xFFFFFFFF
+            if ahead == 0 or ahead >= 0x80000000:
+                self.dropped_out_of_order += 1
+                return
+
+        # The clocks are not synchronized, so measure age against the fastest delivery seen.
+        # That baseline creeps up slowly to follow drift, and is measured afresh after a run
+        # of stale datagrams, so neither drift nor a step of either clock can reject every
+        # command for good.
+        offset = api.utime - sent_utime
+        if self.min_clock_offset is not None:
+            self.min_clock_offset += (api.utime - self.clock_offset_utime) * CLOCK_DRIFT
+        self.clock_offset_utime = api.utime
+        if self.min_clock_offset is None or offset < self.min_clock_offset or \
+                self.stale_in_a_row >= STALE_RESYNC:
+            self.min_clock_offset = offset
+            self.stale_in_a_row = 0
+        age = offset - self.min_clock_offset
+        if age > COMMAND_TIMEOUT * 1e6:
+            self.dropped_stale += 1
+            self.stale_in_a_row += 1
+            return
+        self.stale_in_a_row = 0
+
+        self.last_seq = seq
+        self.command.update(api.utime - age, fields[6:])
+        self.command_applied = False
+
     def handle_rpc(self, api, message):
         """ Process an incoming request and extract the motion command. """
-        # Assume json encoding.
+        if message[:2] == MOTION_MAGIC:
+            self.handle_motion_datagram(api, message)
+            return
+        if message[:2] == BATCH_MAGIC:
+            return self.handle_batch(api, message)
+
+        # Otherwise assume json encoding.
         data = json.loads(message)
+        if not isinstance(data, dict):
+            raise ValueError('expected a JSON object')
         if 'move' in data:
-            self.command = MotionCommand(api.utime, data['move'])
+            self.command.update(api.utime, data['move'])
+            self.command_applied = False
+        if 'telemetry' in data:
+            self.glove_telemetry = data['telemetry']
+        if data.get('stats'):
+            return json.dumps(self.stats())
+
+    def handle_batch(self, api, message):
+        """ Handle each message of a batch in order and answer with a batch of their responses. """
+        messages = unpack_batch(message)
+        if messages is None:
+            return
+        self.batches += 1
+        responses = []
+        for item in messages:
+            try:
+                response = self.handle_rpc(api, item)
+            except (ValueError, TypeError, KeyError):
+                # A bad message must not cost the others their responses.
+                self.dropped_malformed += 1
+                response = None
+            if response is None:
+                response = b''
+            elif not isinstance(response, bytes):
+                response = response.encode('utf-8')
+            responses.append(response)
+        return pack_batch(responses)
+
+    def stats(self):
+        """ Command delivery and tick timing, for measuring a control link from the client. """
+        return {
+            'command_age': self.command_age.as_dict(),
+            'dropped_stale': self.dropped_stale,
+            'dropped_out_of_order': self.dropped_out_of_order,
+            'batches': self.batches,
+            'dropped_malformed': self.dropped_malformed,
+            'glove': self.glove_telemetry,
+            'tick': self.tick_profile.as_dict(),
+        }
@@ -0,0 +1,43 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from async_client import AsyncHTTPClient
+from fake_vehicle import FakeVehicle
+
+# Exercise AsyncHTTPClient against the local stand-in vehicle.
+# Pass a vehicle url (e.g. http://192.168.10.1) to run against a real drone instead.
+
+async def main(url):
+    client = await AsyncHTTPClient.connect(url, pilot=True)
+    try:
+        await client.update_pilot_status()
+        version_ok, udp_link, _ = await asyncio.gather(
+            client.check_min_api_version(),
+            client.get_udp_link_address(),
+            client.disable_faults())
+        print("API version ok:", version_ok)
+        print("UDP link:", udp_link)
+
+        await client.takeoff(poll_period=0.1)
+        print("Flying")
+        await client.set_skill("pano")
+        reply = await client.send_custom_comms("remote.RemoteControl", b'{"move": [0, 0, 0, 0, 0]}')
+        print("custom_comms reply:", reply)
+        await client.land(poll_period=0.1)
+        print("Landed")
+
+        # Many status pings in flight at once.
+        await asyncio.gather(*[client.update_pilot_status() for _ in range(100)])
+        print(client.latency_report())
+    finally:
+        await client.close()
+
+if len(sys.argv) > 1:
+    asyncio.run(main(sys.argv[1]))
+else:
+    vehicle = FakeVehicle().start()
+    asyncio.run(main(vehicle.url))
+    print("Requests served:", dict(vehicle.requests))
+    vehicle.stop()
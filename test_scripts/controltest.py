@@ -0,0 +1,48 @@
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import GloveSerialListener, FRAME_ID_IMU, FRAME_ID_SENSOR
+from http_client import HTTPClient
+from imu import OrientationStream
+from motion_control import ContinuousControl
+from udp_control import MotionCommandSender
+
+# Fly the RemoteControl skill by tilting the glove. Hold the hand in a comfortable
+# position when starting: that pose is hover. Ctrl-C stops the vehicle and exits.
+
+#Rename to correct serial port
+device = '/dev/rfcomm0'
+vehicle_url = 'http://192.168.10.1'
+skill_key = 'remote.RemoteControl'
+
+def main():
+    client = HTTPClient(vehicle_url, pilot=True)
+    client.set_skill(skill_key)
+
+    glove = GloveSerialListener(device)
+    glove.setDaemon(True)
+    glove.start()
+    control = ContinuousControl(MotionCommandSender.for_vehicle(client),
+                                OrientationStream(glove.rings[FRAME_ID_IMU]),
+                                glove.rings[FRAME_ID_SENSOR], rate=30.0)
+    control_thread = threading.Thread(target=control.run)
+    control_thread.start()
+    try:
+        while True:
+            time.sleep(2)
+            client.get_status(max_age=2)
+            print(control.report())
+            print("command:", [round(value, 2) for value in control.last_sent])
+            # Age of each command when the skill applied it.
+            reply = client.send_custom_comms(skill_key, json.dumps({'stats': True}).encode('utf-8'))
+            if reply and reply.get('data'):
+                print("skill:", reply['data'])
+    except KeyboardInterrupt:
+        control.stop()
+        control_thread.join()
+
+main()
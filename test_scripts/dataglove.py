@@ -1,128 +1,60 @@
-import serial
+import os
 import time
 import sys
-import threading
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import GloveSerialListener, FRAME_ID_SENSOR
+from poses import PoseClassifier
+
 #Rename to correct serial port
 device = '/dev/rfcomm0'
 #Make False for USB serial port
 bluetoothmode = True
 
 # © 2019 BeBop Sensors, Inc.
-data = []
-
-class GloveSerialListener(threading.Thread):
-    def __init__(self, port):
-        threading.Thread.__init__(self)
-
-        self.glove = serial.Serial()
-        self.glove.baudrate = 460800
-        self.glove.port = device
-        self.glove.timeout = 1
-        self.glove.open()
-
-        self.data = []
-        self.data_shared = []
-
-    def parse(self, byte_to_parse):
-        global data
-
-        b = int.from_bytes(byte_to_parse, byteorder='big')
-        #print(b)
-        if b == 240:
-            self.data = []
-        elif b == 247:
-            self.data.append(b)
-
-            #might need some thread saftey here
-            if (self.data[0] == 1):
-                data = self.data
-
-        else:
-            self.data.append(b)
-
-    def run(self):
-
-        global data
-
-        if self.glove.is_open:
-            # data on
-            self.glove.write(bytearray([176, 115, 1]))
-
-            if (bluetoothmode != True):
-                self.glove.write(bytearray([176, 118, 1]))
-            elif (bluetoothmode == True):
-                self.glove.write(bytearray([176, 118, 2]))
-            else:
-                print("ERROR! bluetooth mode not set!")
-
-            while True:
-                self.parse(self.glove.read())
-
-        else:
-            self.close()
 
 def main():
-    data_glove_thread = GloveSerialListener(device)
+    data_glove_thread = GloveSerialListener(device, bluetooth=bluetoothmode)
     data_glove_thread.start()
+    frames = data_glove_thread.rings[FRAME_ID_SENSOR]
+    classifier = PoseClassifier.from_file()
 
-    #Wait for data
-    if not data:
-        while True:
+    try:
+        #Wait for data
+        while frames.latest() is None:
             print("Waiting for data...")
             time.sleep(2)
-            if data:
-                break
 
+        while True:
 
-    while True:
-
-        time.sleep(1)
-        if (data[0] == 1 and data[1] == 11):
-            #Finger Data
             time.sleep(1)
-            thumb = (data[2] + data[3])
-            index = (data[4] + data[5])
-            middle = (data[6] + data[7])
-            ring = (data[8] + data[9])
-            pinky = (data[10] + data[11])
-            fingers = [thumb,index,middle,ring,pinky]
-            hand = sum([data[2], data[3], data[4], data[5], data[6], data[7], data[8], data[9], data[10], data[11]])
-            #print(dtype,fingers,hand)
-            print(fingers)
-            #Defines current pose
-            pose = "ofnen"
-
-            if (hand >= 600 and thumb >= 30):
-                print("Fist")
-                pose = "fist"
-            if (hand <= 500 and thumb >= 180):
-                print("Four")
-                pose = "four"
-            if (thumb <= 20 and index >= 140 and middle >= 140 and ring >= 100 and pinky >= 120):
-                print("Thumbs Up")
-                pose = "thumbsup"
-            if (thumb >= 20 and index <= 20 and middle <= 20 and ring >= 120 and pinky >= 120):
-                print("Peace")
-                pose = "peace"
-            if (index <= 20 and middle >= 140 and ring >= 140 and pinky <= 20):
-                print("Hook'em")
-                pose = "hookem"
-            else:
-                pose = "ofnen"
-
-        elif (data[0] == 2 and data[1] == 12):
-            #Accelerometer Data
-            print(data[0])
-    data_glove_thread.close()
+            _, data, _ = frames.latest()
+            if (data[0] == 1 and data[1] == 11):
+                #Finger Data
+                time.sleep(1)
+                thumb = (data[2] + data[3])
+                index = (data[4] + data[5])
+                middle = (data[6] + data[7])
+                ring = (data[8] + data[9])
+                pinky = (data[10] + data[11])
+                fingers = [thumb,index,middle,ring,pinky]
+                hand = sum([data[2], data[3], data[4], data[5], data[6], data[7], data[8], data[9], data[10], data[11]])
+                #print(dtype,fingers,hand)
+                print(fingers)
+                #Defines current pose, see poses.json for the thresholds
+                pose = classifier.classify(data) or "ofnen"
+                print(pose)
+
+            elif (data[0] == 2 and data[1] == 12):
+                #Accelerometer Data
+                print(data[0])
+    finally:
+        data_glove_thread.close()
 
 #MainLoop
-while True:
-    try:
-        main()
-    except(OSError):
-        print("Failed to connect to glove. Retrying...")
-        time.sleep(1)
-    except(KeyboardInterrupt):
-        exit()
\ No newline at end of file
+# The listener keeps reconnecting to the glove with backoff, so no retry loop is needed here.
+try:
+    main()
+except(KeyboardInterrupt):
+    exit()
@@ -0,0 +1,67 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import FrameDecoder
+from glove_emulator import finger_frame, imu_frame
+
+# Feed the same corrupt streams to FrameDecoder whole, a byte at a time and in random
+# chunks. The frames and the valid, corrupt and resync counts must not depend on how the
+# stream was split into reads.
+
+
+def decode(stream, chunk_sizes):
+    decoder = FrameDecoder()
+    frames = []
+    pos = 0
+    while pos < len(stream):
+        size = next(chunk_sizes)
+        frames += decoder.feed(stream[pos:pos + size])
+        pos += size
+    return frames, (decoder.valid, decoder.corrupt, decoder.resyncs)
+
+
+def constant(size):
+    while True:
+        yield size
+
+
+def random_sizes(seed):
+    rng = random.Random(seed)
+    while True:
+        yield rng.randint(1, 40)
+
+
+finger = finger_frame('fist')
+imu = imu_frame()
+rng = random.Random(0)
+fuzz = bytearray()
+for _ in range(5000):
+    frame = bytearray(rng.choice((finger, imu)))
+    if rng.random() < 0.05:
+        del frame[rng.randrange(len(frame))]
+    fuzz += frame
+    if rng.random() < 0.05:
+        fuzz += bytearray(rng.getrandbits(8) for _ in range(rng.randint(1, 30)))
+
+streams = {
+    'noise between frames': finger + b'\x01\x02\x03' + imu,
+    'lost end byte': finger[:-1] + imu + finger,
+    'fuzz': bytes(fuzz),
+}
+
+failed = False
+for name, stream in sorted(streams.items()):
+    whole, counts = decode(stream, constant(len(stream)))
+    for chunks, sizes in (('1 byte', constant(1)), ('4096 bytes', constant(4096)),
+                          ('random', random_sizes(1))):
+        frames, chunk_counts = decode(stream, sizes)
+        ok = frames == whole and chunk_counts == counts
+        failed |= not ok
+        print("{}, {} reads: valid/corrupt/resyncs {} vs {} whole: {}".format(
+            name, chunks, chunk_counts, counts, 'ok' if ok else 'MISMATCH'))
+
+assert decode(streams['noise between frames'], constant(1))[1] == (2, 0, 1)
+assert not failed
+print("ok")
@@ -1,89 +1,47 @@
-import serial
+import os
 import time
 import sys
-import threading
 import numpy as np
 
-# © 2019 BeBop Sensors, Inc.
-data = []
-
-class GloveSerialListener(threading.Thread):
-    def __init__(self, port):
-        threading.Thread.__init__(self)
-
-        self.glove = serial.Serial()
-        self.glove.baudrate = 460800
-        self.glove.port = '/dev/rfcomm0'
-        self.glove.timeout = 1
-        self.glove.open()
-
-        self.data = []
-        self.data_shared = []
-
-    def parse(self, byte_to_parse):
-        global data
-
-        b = int.from_bytes(byte_to_parse, byteorder='big')
-        #print(b)
-        if b == 240:
-            self.data = []
-        elif b == 247:
-            self.data.append(b)
-
-            #might need some thread saftey here
-            if (self.data[0] == 2):
-                data = self.data
-
-        else:
-            self.data.append(b)
-
-    def run(self):
-
-        global data
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from glove import GloveSerialListener, FRAME_ID_IMU
+from imu import OrientationStream
 
-        if self.glove.is_open:
-            # data on
-            self.glove.write(bytearray([176, 115, 1]))
-
-            # usb mode
-            #self.glove.write(bytearray([176, 118, 1]))
-
-            # bluetooth mode
-            self.glove.write(bytearray([176, 118, 2]))
-
-            while True:
-                self.parse(self.glove.read())
-
-        else:
-            self.close()
+# © 2019 BeBop Sensors, Inc.
 
 def main():
     data_glove_thread = GloveSerialListener('/dev/rfcomm0')
     data_glove_thread.start()
+    frames = data_glove_thread.rings[FRAME_ID_IMU]
+    orientation = OrientationStream(frames)
 
-    #Wait for data
-    if not data:
-        while True:
+    try:
+        #Wait for data
+        while frames.latest() is None:
             print("Waiting for data...")
             time.sleep(2)
-            if data:
-                break
-
 
-    while True:
+        while True:
 
-        time.sleep(1)
-        if (data[0] == 2 and data[1] == 12):
-            #Accelerometer Data
-            print(data)
-    data_glove_thread.close()
+            time.sleep(1)
+            _, data, _ = frames.latest()
+            if (data[0] == 2 and data[1] == 12):
+                #Accelerometer Data
+                print(list(data))
+                #Orientation, decoded from every frame since the last print
+                orientation.poll()
+                latest = orientation.latest()
+                if latest is not None:
+                    _, quaternion, euler, rate = latest
+                    print("quaternion", np.round(quaternion, 3))
+                    print("roll/pitch/yaw", np.round(np.degrees(euler), 1), "deg")
+                    print("angular rate", np.round(np.degrees(rate), 1), "deg/s")
+    finally:
+        data_glove_thread.close()
 
 #MainLoop
-while True:
-    try:
-        main()
-    except(OSError):
-        print("Failed to connect to glove. Retrying...")
-        time.sleep(1)
-    except(KeyboardInterrupt):
-        exit()
\ No newline at end of file
+# The listener keeps reconnecting to the glove with backoff, so no retry loop is needed here.
+try:
+    main()
+except(KeyboardInterrupt):
+    exit()
@@ -0,0 +1,55 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from rtp_receiver import JpegRtpPacketizer, RtpJpegReceiver, replay_jpeg_frames, synthetic_jpeg
+
+# Replay synthetic JPEG frames over RTP to the receiver, losing and reordering packets.
+# Pass 'listen' to receive the vehicle's stream (stream_settings port 55004) instead.
+
+if len(sys.argv) > 1 and sys.argv[1] == 'listen':
+    receiver = RtpJpegReceiver().start()
+    try:
+        while True:
+            time.sleep(1)
+            print(receiver.stats())
+    except KeyboardInterrupt:
+        receiver.stop()
+    sys.exit(0)
+
+# A packet repeated mid-frame and a single packet with a far off sequence number must
+# neither count as a sender restart nor cost the frame they arrived in.
+receiver = RtpJpegReceiver(port=0)
+packetizer = JpegRtpPacketizer(mtu=200)
+for index in range(3):
+    packets = packetizer.packetize(synthetic_jpeg(320, 240, index), index * 3000)
+    middle = len(packets) // 2
+    stray = bytearray(packets[middle])
+    stray[2:4] = bytearray([(stray[2] + 0x80) & 0xFF, stray[3]])
+    for packet in packets[:middle + 1] + [packets[middle], bytes(stray)] + packets[middle + 1:]:
+        receiver.handle_packet(memoryview(packet), time.time())
+stats = receiver.stats()
+print("duplicate and stray packets: frames={frames} duplicates={duplicates} restarts={restarts} "
+      "dropped={frames_dropped}".format(**stats))
+assert (stats['frames'], stats['duplicates'], stats['restarts'], stats['frames_dropped']) == (3, 3, 0, 0)
+
+receiver = RtpJpegReceiver(port=0).start()
+frames = [synthetic_jpeg(1280, 720, (i % 120) - 60) for i in range(300)]
+sender = threading.Thread(target=replay_jpeg_frames, args=(frames, ('127.0.0.1', receiver.port)),
+                          kwargs={'fps': 60.0, 'loss': 0.002, 'reorder': 0.05, 'mtu': 200})
+sender.start()
+last = None
+while sender.is_alive():
+    frame = receiver.wait_frame(after=last, timeout=0.5)
+    if frame is not None:
+        last = frame[2]
+sender.join()
+time.sleep(0.1)
+receiver.stop()
+
+jpeg, timestamp, _ = receiver.latest()
+print("Latest frame: {} bytes, rtp timestamp {}".format(len(jpeg), timestamp))
+for key, value in sorted(receiver.stats().items()):
+    print("{}: {}".format(key, value))
@@ -0,0 +1,61 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_ring import FrameRing
+from glove_emulator import finger_frame
+from imu import OrientationStream
+from motion_control import ContinuousControl
+
+# Fly the controller on a simulated glove: tilt the hand for 2s, then let the glove go
+# silent for 10s. Once the frames stop, one zero command must go out and nothing after it.
+
+
+class RecordingSender(object):
+    def __init__(self):
+        self.commands = []
+
+    def send(self, *command):
+        self.commands.append(command)
+
+
+def tilted(angle):
+    """ Quaternion of the hand pitched by angle radians. """
+    return np.array([[math.cos(angle / 2), 0.0, math.sin(angle / 2), 0.0]])
+
+
+sender = RecordingSender()
+fingers = FrameRing()
+orientation = OrientationStream()
+control = ContinuousControl(sender, orientation, fingers, rate=30.0)
+finger = finger_frame(None)[1:-1]
+
+now = 0.0
+while now < 2.0:
+    # Level for the first tick, so that is the neutral pose, then tilted forward.
+    orientation.update_quaternions(tilted(0.0 if now == 0.0 else 0.5), [now])
+    fingers.publish(finger, now)
+    control.tick(now)
+    now += control.period
+flying = list(control.last_sent)
+silent_since = now - control.period
+sent_while_flying = len(sender.commands)
+
+last_send = None
+while now < 12.0:
+    if control.tick(now):
+        last_send = now
+    now += control.period
+after = sender.commands[sent_while_flying:]
+
+print("command while flying:", [round(float(value), 2) for value in flying])
+print("sent after the glove went silent:", [[round(value, 2) for value in command] for command in after])
+print(control.report().splitlines()[0])
+assert any(flying), "the tilted hand should fly the vehicle"
+assert after and not any(after[-1]), "expected the vehicle to be stopped"
+assert last_send - silent_since <= control.input_timeout + control.period, "sends went on after the timeout"
+assert control.input_timeouts == 1
+print("ok")
@@ -0,0 +1,71 @@
+"""
+Binary UDP motion commands for the RemoteControl skill.
+
+Each datagram is one fixed-layout struct (see MOTION_DATAGRAM) instead of the
+JSON -> base64 -> JSON round trip of an HTTP custom_comms request. The layout must
+match MOTION_DATAGRAM in skillset/remote.py, which is deployed to the vehicle separately.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import socket
+import struct
+import time
+
+# magic, version, flags, sender session, sequence number, sender monotonic time [us],
+# velx, vely, velz, yaw_rate, pitch_rate
+MOTION_DATAGRAM = struct.Struct('<2sBBHIQ5f')
+MOTION_MAGIC = b'RC'
+MOTION_VERSION = 1
+
+# Port the RemoteControl skill listens on for motion datagrams.
+MOTION_UDP_PORT = 55010
+
+
+def unpack_motion_command(datagram):
+    """ Return (session, seq, utime, move) for a motion datagram, or None if it isn't one. """
+    if len(datagram) != MOTION_DATAGRAM.size or datagram[:2] != MOTION_MAGIC:
+        return None
+    fields = MOTION_DATAGRAM.unpack(datagram)
+    if fields[1] != MOTION_VERSION:
+        return None
+    return fields[3], fields[4], fields[5], fields[6:]
+
+
+class MotionCommandSender(object):
+    """
+    Send RemoteControl motion commands as UDP datagrams.
+
+    Args:
+        address (tuple): (host, port) of the RemoteControl skill's motion socket.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(address)
+        self.session = struct.unpack('<H', os.urandom(2))[0]
+        self.seq = 0
+        self.sent = 0
+        self._buf = bytearray(MOTION_DATAGRAM.size)
+
+    @classmethod
+    def for_vehicle(cls, client, port=MOTION_UDP_PORT):
+        """ Create a sender for the vehicle an HTTPClient is connected to. """
+        host, _ = client.get_udp_link_address()
+        return cls((host, port))
+
+    def send(self, velx, vely, velz, yaw_rate, pitch_rate):
+        """ Send one command. Returns its sequence number. """
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        MOTION_DATAGRAM.pack_into(self._buf, 0, MOTION_MAGIC, MOTION_VERSION, 0, self.session,
+                                  self.seq, int(time.monotonic() * 1e6),
+                                  velx, vely, velz, yaw_rate, pitch_rate)
+        self.sock.send(self._buf)
+        self.sent += 1
+        return self.seq
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,178 @@
+"""
+Request bodies and response helpers shared by the vehicle HTTP clients.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import base64
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    # Python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # Python 2
+    from urlparse import urlparse
+
+
+# Seconds to wait for each endpoint, keyed by the first component of its path.
+DEFAULT_TIMEOUT = 20
+ENDPOINT_TIMEOUTS = {
+    'status': 3,
+    'async_command': 3,
+    'custom_comms': 2,
+    'set_skill': 5,
+    'active_faults': 5,
+    'set_fault_override': 5,
+}
+
+# These faults occur if phone isn't connected via UDP
+PHONE_COMMS_FAULTS = {
+    'LOST_PHONE_COMMS_SHORT': 2,
+    'LOST_PHONE_COMMS_LONG': 3,
+}
+FAULT_OVERRIDE_OFF = {'override_on': True, 'fault_active': False}
+
+
+class PilotRefused(RuntimeError):
+    """ The vehicle did not grant pilot access, e.g. because another client is flying it. """
+
+
+def endpoint_name(endpoint):
+    """ The part of an endpoint path used to look up timeouts and stats, e.g. set_skill. """
+    return endpoint.split('/', 1)[0]
+
+
+def authentication_request(client_id, pilot=False, credentials=None):
+    request = {
+        'client_id': client_id,
+        'requested_level': (8 if pilot else 4),
+        'commandeer': True,
+    }
+    if credentials:
+        request['credentials'] = credentials.strip()
+    return request
+
+
+def pilot_status_request(session_id=None, stream_settings=None):
+    """ Arguments for the status endpoint that keep a pilot session alive. """
+    args = {
+        'inForeground': True,
+        'mediaMode': 'FLIGHT_CONTROL',
+        'recordingMode': 'VIDEO_4K_30FPS',
+        'takeoffType': 'GROUND_TAKEOFF',
+        'wouldAcceptPilot': True,
+    }
+    if session_id:
+        args['sessionId'] = session_id
+    if stream_settings:
+        args['streamSettings'] = stream_settings
+    return args
+
+
+def custom_comms_request(skill_key, data, no_response=False):
+    """ Body of a custom_comms request carrying `data` (bytes) to a skill. """
+    return {
+        'data': base64.b64encode(data).decode('ascii'),
+        'skill_key': skill_key,
+        'no_response': no_response,  # this key is option and defaults to False
+    }
+
+
+def api_version_at_least(config, major, minor):
+    info = config['deployInfo']
+    return info.get('api_version_major') >= major and info.get('api_version_minor') >= minor
+
+
+def udp_link_address(config, baseurl):
+    """ Get the dynamic port and hostname for the udp link from a status config. """
+    udp_hostname = config.get('lcmProxyUdpHostname')
+    if not udp_hostname:
+        udp_hostname = urlparse(baseurl).netloc.split(':')[0]
+    udp_port = config.get('lcmProxyUdpPort')
+    return (udp_hostname, udp_port)
+
+
+class StatusCache(object):
+    """
+    The latest status response, shared by everything that needs the vehicle's status.
+
+    A response younger than the requested age is returned without a request, and callers
+    that miss while a request is already in flight wait for that request instead of
+    sending their own. Subscribers are told about every flight phase change.
+
+    Args:
+        fetch (callable): Performs the status request and returns the response.
+
+        max_age (float): Default number of seconds a response stays fresh.
+    """
+
+    def __init__(self, fetch, max_age=1.0):
+        self.fetch = fetch
+        self.max_age = max_age
+
+        self.response = None
+        self.updated = None
+        self.flight_phase = None
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._subscribers = []
+
+        # Answered from the cache, sent to the vehicle, and merged into an in-flight request.
+        self.hits = 0
+        self.fetches = 0
+        self.merged = 0
+
+    def get(self, max_age=None):
+        """ Return a status response no older than max_age seconds. """
+        if max_age is None:
+            max_age = self.max_age
+        leader = False
+        with self._lock:
+            if self.response is not None and time.monotonic() - self.updated <= max_age:
+                self.hits += 1
+                return self.response
+            inflight = self._inflight
+            if inflight is not None:
+                self.merged += 1
+            else:
+                inflight = self._inflight = Future()
+                self.fetches += 1
+                leader = True
+        if not leader:
+            return inflight.result()
+
+        try:
+            response = self.fetch()
+        except BaseException as error:
+            with self._lock:
+                self._inflight = None
+            inflight.set_exception(error)
+            raise
+        self.store(response)
+        with self._lock:
+            self._inflight = None
+        inflight.set_result(response)
+        return response
+
+    def store(self, response):
+        """ Record a status response obtained elsewhere and notify flight phase subscribers. """
+        with self._lock:
+            self.response = response
+            self.updated = time.monotonic()
+            phase = response.get('flightPhase') or self.flight_phase
+            changed = phase != self.flight_phase
+            self.flight_phase = phase
+            subscribers = list(self._subscribers)
+        if changed:
+            for callback in subscribers:
+                callback(phase)
+
+    def subscribe(self, callback):
+        """ Call `callback(phase)` on every flight phase change. Returns an unsubscribe function. """
+        with self._lock:
+            self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)